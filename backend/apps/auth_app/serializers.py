@@ -5,15 +5,16 @@ Sérialiseurs pour l'authentification et gestion des utilisateurs.
 from rest_framework import serializers
 from django.contrib.auth import authenticate
 from apps.auth_app.models import CustomUser, Role
+from apps.core.serializers import DynamicFieldsMixin
 
 
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Role
         fields = ['id', 'name', 'description']
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     role_name = serializers.CharField(source='role.name', read_only=True)
     
     class Meta:
@@ -23,6 +24,9 @@ class UserSerializer(serializers.ModelSerializer):
             'role', 'role_name', 'is_active', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        field_relations = {
+            'role_name': {'select_related': ['role']},
+        }
 
 
 class UserCreateSerializer(serializers.ModelSerializer):
@@ -16,9 +16,10 @@ from apps.auth_app.serializers import (
     RoleSerializer
 )
 from apps.auth_app.jwt_serializers import get_tokens_for_user
+from apps.core.mixins import SparseFieldsMixin
 
 
-class RoleViewSet(viewsets.ReadOnlyModelViewSet):
+class RoleViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les rôles."""
     queryset = Role.objects.all()
     serializer_class = RoleSerializer
@@ -112,7 +113,7 @@ class AuthViewSet(viewsets.ViewSet):
             )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet pour la gestion des utilisateurs."""
     queryset = CustomUser.objects.all()
     serializer_class = UserSerializer
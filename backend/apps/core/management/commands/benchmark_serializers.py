@@ -0,0 +1,119 @@
+"""
+Benchmark des sérialiseurs de liste: DRF vs `.values()`.
+"""
+
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from apps.auth_app.models import Role, CustomUser
+from apps.sites.models import Site
+from apps.courts.models import Court
+from apps.courts.serializers import CourtListSerializer, CourtListValuesSerializer
+from apps.reservations.models import Reservation
+from apps.reservations.serializers import ReservationListSerializer, ReservationListValuesSerializer
+
+
+class Rollback(Exception):
+    """Annule les données générées pour le benchmark."""
+
+
+class Command(BaseCommand):
+    help = 'Compare les sérialiseurs DRF et `.values()` sur des listes volumineuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, rows, repeat):
+        courts, reservations = self.populate(rows)
+        context = {'request': RequestFactory().get('/api/courts/courts/')}
+
+        self.compare(
+            'Terrains',
+            lambda: CourtListSerializer(courts, many=True, context=context).data,
+            lambda: CourtListValuesSerializer(context=context).serialize(
+                CourtListValuesSerializer().prepare(courts)
+            ),
+            repeat
+        )
+        self.compare(
+            'Réservations',
+            lambda: ReservationListSerializer(reservations, many=True, context=context).data,
+            lambda: ReservationListValuesSerializer(context=context).serialize(
+                ReservationListValuesSerializer().prepare(reservations)
+            ),
+            repeat
+        )
+
+    def populate(self, rows):
+        role, _ = Role.objects.get_or_create(name='MANAGER')
+        client_role, _ = Role.objects.get_or_create(name='CLIENT')
+        manager = CustomUser.objects.create_user(
+            username='bench-manager', email='bench-manager@example.com',
+            password='password', role=role
+        )
+        client = CustomUser.objects.create_user(
+            username='bench-client', email='bench-client@example.com',
+            password='password', role=client_role
+        )
+        site = Site.objects.create(
+            name='Site benchmark', address='1 rue du Test', city='Paris',
+            postal_code='75001', latitude=48.8566, longitude=2.3522, manager=manager
+        )
+        sport_types = [code for code, _ in Court.SPORT_TYPES]
+        Court.objects.bulk_create([
+            Court(
+                name=f'Terrain {i}', sport_type=sport_types[i % len(sport_types)],
+                site=site, price_per_hour=Decimal('25.00')
+            )
+            for i in range(rows)
+        ])
+        courts = Court.objects.filter(site=site).order_by('name')
+
+        court = courts.first()
+        start = timezone.now()
+        statuses = [code for code, _ in Reservation.STATUS_CHOICES]
+        Reservation.objects.bulk_create([
+            Reservation(
+                user=client, court=court,
+                start_datetime=start + timedelta(hours=i),
+                end_datetime=start + timedelta(hours=i + 1),
+                price_per_hour=Decimal('25.00'), total_amount=Decimal('25.00'),
+                status=statuses[i % len(statuses)]
+            )
+            for i in range(rows)
+        ])
+        reservations = Reservation.objects.filter(user=client).order_by('-start_datetime')
+        return courts, reservations
+
+    def compare(self, label, drf, values, repeat):
+        drf_time = self.measure(drf, repeat)
+        values_time = self.measure(values, repeat)
+        self.stdout.write(
+            f'{label}: DRF {drf_time * 1000:.0f} ms, '
+            f'.values() {values_time * 1000:.0f} ms '
+            f'(x{drf_time / values_time:.1f})'
+        )
+
+    def measure(self, func, repeat):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,91 @@
+"""
+Mixins partagés par les ViewSets de l'API.
+"""
+
+from rest_framework.response import Response
+
+from apps.core.streaming import StreamingJSONResponse, iter_chunks
+
+
+class SparseFieldsMixin:
+    """
+    Adapter `select_related`/`prefetch_related` aux champs réellement rendus
+    (`?fields=` / `?expand=`, voir `DynamicFieldsMixin`).
+    """
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if not hasattr(serializer_class, 'get_relations'):
+            return queryset
+        
+        serializer = serializer_class(context=self.get_serializer_context())
+        select, prefetch = serializer_class.get_relations(serializer.fields.keys())
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+
+class StreamingListMixin:
+    """
+    Action `list` qui, lorsque la pagination est désactivée, envoie les
+    lignes en flux depuis `QuerySet.iterator()` au lieu de tout sérialiser
+    en mémoire.
+    """
+    
+    stream_chunk_size = 500
+    
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
+        return self.streaming_response(
+            queryset,
+            lambda chunk: self.get_serializer(chunk, many=True).data
+        )
+    
+    def streaming_response(self, queryset, serialize):
+        """Sérialiser `queryset` par lots et l'envoyer en flux."""
+        renderer = getattr(self.request, 'accepted_renderer', None)
+        if renderer is not None and renderer.format != 'json':
+            # Le flux n'existe qu'en JSON (MessagePack, API navigable...)
+            return Response(serialize(queryset))
+        
+        batches = (serialize(chunk) for chunk in iter_chunks(queryset, self.stream_chunk_size))
+        return StreamingJSONResponse(batches)
+
+
+class ValuesListMixin(StreamingListMixin):
+    """
+    Servir l'action `list` avec un `ValuesSerializer` plutôt qu'un
+    `ModelSerializer`, en conservant filtres, tri et pagination.
+    """
+    
+    values_serializer_class = None
+    
+    def get_values_serializer(self, serializer_class=None):
+        serializer_class = serializer_class or self.values_serializer_class
+        return serializer_class(context=self.get_serializer_context())
+    
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.values_response(queryset)
+    
+    def values_response(self, queryset, serializer_class=None):
+        """Paginer puis sérialiser `queryset` via `.values()`."""
+        serializer = self.get_values_serializer(serializer_class)
+        queryset = serializer.prepare(queryset)
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        
+        return self.streaming_response(queryset, serializer.serialize)
@@ -0,0 +1,48 @@
+"""
+Parsers de l'API.
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from apps.core.renderers import FastJSONRenderer, MessagePackRenderer, use_orjson, orjson, msgpack
+
+
+class FastJSONParser(JSONParser):
+    """`JSONParser` accéléré par orjson, avec repli sur DRF."""
+    
+    renderer_class = FastJSONRenderer
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        
+        # orjson ne lit que de l'UTF-8
+        if not use_orjson() or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """
+    Lecture des corps MessagePack.
+    
+    Les dates peuvent être envoyées en chaîne ISO 8601 ou avec l'extension
+    Timestamp de MessagePack, convertie en `datetime` UTC.
+    """
+    
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+    
+    def parse(self, stream, media_type=None, parser_context=None):
+        if msgpack is None:
+            raise ImproperlyConfigured('MessagePackParser requiert le paquet msgpack.')
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
@@ -0,0 +1,181 @@
+"""
+Renderers de l'API.
+
+`MessagePackRenderer` propose une alternative binaire et compacte au JSON,
+choisie par le client avec l'en-tête `Accept: application/msgpack`.
+
+`FastJSONRenderer` encode les réponses avec orjson lorsqu'il est installé
+et sélectionné (`API_JSON_BACKEND = 'orjson'`), sinon il se comporte
+exactement comme le `JSONRenderer` de DRF. Les types non gérés nativement
+par orjson (`Decimal`, chaînes de traduction paresseuses, QuerySet...) sont
+délégués à l'encodeur de DRF pour garder un JSON identique.
+"""
+
+import datetime
+import json
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+
+_drf_default = encoders.JSONEncoder().default
+
+
+def use_orjson():
+    """orjson est-il installé et sélectionné dans les settings ?"""
+    return orjson is not None and getattr(settings, 'API_JSON_BACKEND', 'orjson') == 'orjson'
+
+
+def orjson_options(indent=None):
+    # OPT_UTC_Z: "Z" au lieu de "+00:00", comme l'encodeur de DRF
+    options = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+    if indent:
+        options |= orjson.OPT_INDENT_2
+    return options
+
+
+def encode_json(data, indent=None):
+    """Encoder `data` en JSON UTF-8 avec le backend configuré."""
+    if use_orjson():
+        ret = orjson.dumps(data, default=_drf_default, option=orjson_options(indent))
+        # Sortie sous-ensemble strict de JavaScript, comme DRF
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    separators = (',', ':') if indent is None else (',', ': ')
+    ret = json.dumps(
+        data, cls=encoders.JSONEncoder, indent=indent,
+        ensure_ascii=False, allow_nan=False, separators=separators
+    )
+    return ret.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """`JSONRenderer` accéléré par orjson, avec repli sur DRF."""
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not use_orjson():
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+        
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        return encode_json(data, indent=indent)
+
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    msgpack = None
+
+
+def _native_fields(serializer):
+    """Champs date/décimal d'un sérialiseur: {nom: (type, décimales, champ)}."""
+    from rest_framework import serializers as drf_serializers
+    from apps.core.serializers import ValuesSerializer
+
+    serializer = getattr(serializer, 'child', serializer)
+    if isinstance(serializer, ValuesSerializer):
+        return {
+            name: (
+                getattr(field, 'native_type', None),
+                getattr(field, 'decimal_places', None),
+                getattr(field, 'serializer', None)
+            )
+            for name, field in serializer.bound_fields
+        }
+
+    spec = {}
+    for name, field in getattr(serializer, 'fields', {}).items():
+        if isinstance(field, drf_serializers.DateTimeField):
+            spec[name] = ('datetime', None, None)
+        elif isinstance(field, drf_serializers.DecimalField):
+            spec[name] = ('decimal', field.decimal_places, None)
+        elif isinstance(field, drf_serializers.BaseSerializer):
+            spec[name] = ('nested', None, field)
+    return spec
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Rendu MessagePack pour les clients mobiles.
+
+    Les dates/heures sont encodées en secondes depuis l'epoch et les
+    décimaux en entiers mis à l'échelle (`valeur * 10**décimales`, soit des
+    centimes pour les montants). Avec un sérialiseur attaché aux données
+    (`ReturnDict`/`ReturnList`), les champs sont reconnus par leur type
+    déclaré, y compris sous forme de chaîne. Sans sérialiseur (dictionnaire
+    construit par une `@action`), la conversion se fait sur le type Python
+    des valeurs: la vue doit donc renvoyer des `datetime` et des `Decimal`,
+    jamais des chaînes ISO ou des flottants déjà formatés.
+    """
+    
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if msgpack is None:
+            raise ImproperlyConfigured('MessagePackRenderer requiert le paquet msgpack.')
+        return msgpack.packb(self.convert(data), default=self.default, use_bin_type=True)
+    
+    def default(self, obj):
+        value = self.convert_value(obj, None)
+        if value is obj:
+            return _drf_default(obj)
+        return value
+    
+    def convert(self, data, spec=None):
+        serializer = getattr(data, 'serializer', None)
+        if serializer is not None:
+            spec = _native_fields(serializer)
+        
+        if isinstance(data, dict):
+            if not spec:
+                return {key: self.convert(value) for key, value in data.items()}
+            converted = {}
+            for key, value in data.items():
+                kind, places, field = spec.get(key, (None, None, None))
+                if kind == 'nested':
+                    converted[key] = self.convert(value, _native_fields(field))
+                elif kind is not None:
+                    converted[key] = self.convert_value(value, kind, places)
+                else:
+                    converted[key] = self.convert(value)
+            return converted
+        if isinstance(data, (list, tuple)):
+            return [self.convert(item, spec) for item in data]
+        return self.convert_value(data, None)
+    
+    def convert_value(self, value, kind, places=None):
+        if value is None or value == '':
+            return None if kind else value
+        if isinstance(value, datetime.datetime) or (kind == 'datetime' and isinstance(value, str)):
+            if isinstance(value, str):
+                parsed = parse_datetime(value)
+                if parsed is None:
+                    return value
+                value = parsed
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            return int(value.timestamp())
+        if isinstance(value, Decimal) or (kind == 'decimal' and isinstance(value, str)):
+            if places is None:
+                places = getattr(settings, 'MSGPACK_DECIMAL_PLACES', 2)
+            return int(Decimal(value).scaleb(places).to_integral_value(rounding=ROUND_HALF_UP))
+        if isinstance(value, Promise):
+            return str(value)
+        return value
@@ -0,0 +1,222 @@
+"""
+Sérialiseurs partagés de l'API.
+
+`DynamicFieldsMixin` ajoute aux `ModelSerializer` la sélection de champs
+(`?fields=`) et l'expansion à la demande des champs imbriqués (`?expand=`).
+
+Les `ModelSerializer` de DRF instancient un modèle par ligne puis
+introspectent chaque champ, ce qui domine le temps CPU des listes volumineuses.
+Les `ValuesSerializer` déclarent leurs champs une seule fois, lisent les
+lignes avec `.values()` et produisent exactement le même JSON que leur
+équivalent DRF.
+"""
+
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.utils.serializer_helpers import ReturnList
+
+
+def parse_field_list(request, param):
+    """Lire une liste de champs séparés par des virgules (`?fields=id,status`)."""
+    if request is None:
+        return None
+    value = getattr(request, 'query_params', request.GET).get(param)
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class DynamicFieldsMixin:
+    """
+    Sélection de champs et expansion pour les `ModelSerializer`.
+    
+    - `?fields=a,b` ne conserve que les champs listés (lecture seulement);
+    - les champs de `Meta.expandable_fields` ne sont rendus qu'avec
+      `?expand=<champ>`;
+    - `Meta.field_relations` associe un champ aux relations à charger
+      (`select_related`/`prefetch_related`) lorsqu'il est rendu.
+    
+    Un champ retiré n'est ni calculé ni chargé. Seul le sérialiseur racine
+    de la requête est concerné, pas les sérialiseurs imbriqués.
+    """
+    
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_root():
+            return fields
+        
+        expand = parse_field_list(request, 'expand') or set()
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+        
+        only = parse_field_list(request, 'fields')
+        if only and request.method in SAFE_METHODS:
+            for name in list(fields):
+                if name not in only and name not in expand:
+                    fields.pop(name)
+        return fields
+    
+    def _is_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+    
+    @classmethod
+    def get_relations(cls, field_names):
+        """Relations à charger pour les champs effectivement rendus."""
+        select, prefetch = [], []
+        relations = getattr(cls.Meta, 'field_relations', {})
+        for name in field_names:
+            relation = relations.get(name, {})
+            select.extend(relation.get('select_related', ()))
+            prefetch.extend(relation.get('prefetch_related', ()))
+        return select, prefetch
+
+
+class ValueField:
+    """Champ recopié tel quel depuis la colonne `source`."""
+
+    def __init__(self, source=None):
+        self.source = source
+        self.name = None
+
+    def bind(self, name):
+        self.name = name
+        if self.source is None:
+            self.source = name
+
+    @property
+    def sources(self):
+        return (self.source,)
+
+    def to_representation(self, row, context):
+        return row[self.source]
+
+
+class ChoiceDisplayField(ValueField):
+    """Équivalent de `get_<champ>_display` via un dictionnaire précalculé."""
+
+    def __init__(self, source, choices):
+        super().__init__(source)
+        self.labels = {key: str(label) for key, label in choices}
+
+    def to_representation(self, row, context):
+        value = row[self.source]
+        return self.labels.get(value, value)
+
+
+class DecimalValueField(ValueField):
+    """Décimal rendu en chaîne, comme `COERCE_DECIMAL_TO_STRING` de DRF."""
+
+    native_type = 'decimal'
+
+    def __init__(self, source=None, decimal_places=2):
+        super().__init__(source)
+        self.decimal_places = decimal_places
+        self.quantum = Decimal(1).scaleb(-decimal_places)
+
+    def to_representation(self, row, context):
+        value = row[self.source]
+        if value is None:
+            return ''
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value))
+        return f'{value.quantize(self.quantum):f}'
+
+
+class DateTimeValueField(ValueField):
+    """Date/heure au format ISO 8601 dans le fuseau courant, comme DRF."""
+
+    native_type = 'datetime'
+
+    def to_representation(self, row, context):
+        value = row[self.source]
+        if not value:
+            return None
+        if timezone.is_aware(value):
+            value = timezone.localtime(value, context['timezone'])
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+
+class FileUrlField(ValueField):
+    """URL d'un fichier stocké, absolue si la requête est disponible."""
+
+    def to_representation(self, row, context):
+        name = row[self.source]
+        if not name:
+            return None
+        url = default_storage.url(name)
+        request = context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
+class ValuesSerializer:
+    """
+    Sérialiseur de lecture seule travaillant sur des dictionnaires.
+
+    Les sous-classes déclarent `model` et `fields`, une liste de couples
+    `(nom, champ)` dans l'ordre de sortie. Les colonnes nécessaires sont
+    calculées une fois pour toutes et lues par `prepare()` avec `.values()`.
+    Le hook `extend()` permet de compléter un lot de lignes avec une requête
+    groupée (images, relations inverses...).
+    """
+
+    model = None
+    fields = ()
+
+    def __init__(self, context=None):
+        self.context = dict(context or {})
+        self.context.setdefault('timezone', timezone.get_current_timezone())
+        only = parse_field_list(self.context.get('request'), 'fields')
+        self.bound_fields = []
+        for name, field in self.fields:
+            if only and name not in only:
+                continue
+            if isinstance(field, str):
+                field = ValueField(field)
+            field.bind(name)
+            self.bound_fields.append((name, field))
+    
+    def has_field(self, name):
+        return any(bound_name == name for bound_name, _ in self.bound_fields)
+
+    @property
+    def columns(self):
+        columns = []
+        for _, field in self.bound_fields:
+            for source in field.sources:
+                if source not in columns:
+                    columns.append(source)
+        return columns
+
+    def prepare(self, queryset):
+        """Restreindre le queryset aux seules colonnes utiles."""
+        return queryset.prefetch_related(None).values(*self.columns)
+
+    def extend(self, rows):
+        """Hook pour charger des données complémentaires par lot."""
+        return {}
+
+    def serialize(self, rows):
+        rows = list(rows)
+        context = dict(self.context, **self.extend(rows))
+        bound_fields = self.bound_fields
+        return ReturnList(
+            [
+                {name: field.to_representation(row, context) for name, field in bound_fields}
+                for row in rows
+            ],
+            serializer=self
+        )
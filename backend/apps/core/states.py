@@ -0,0 +1,77 @@
+"""
+Machine à états des modèles à statut.
+
+Chaque modèle déclare ses transitions (`TRANSITIONS = {nom: (états de
+départ, état d'arrivée)}`). Une transition est appliquée par une seule
+requête conditionnelle `UPDATE ... WHERE id = ? AND status IN (départs)`:
+pas de `save()` complet ni de `full_clean()`, et deux requêtes concurrentes
+ne peuvent pas appliquer la même transition deux fois. Le signal
+`transition_done` est envoyé après chaque transition appliquée, dans la
+même transaction: ses récepteurs y tiennent à jour les données dérivées.
+"""
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+# Arguments: sender (classe du modèle), name, source, target, instance
+# (None pour une transition groupée) et pks
+transition_done = Signal()
+
+
+class StateMachineMixin:
+    """Transitions d'état atomiques pour un modèle à champ `status`."""
+
+    TRANSITIONS = {}
+
+    def can_transition(self, name):
+        sources, _ = self.TRANSITIONS[name]
+        return self.status in sources
+
+    @classmethod
+    def _transition_values(cls, target, fields):
+        values = {'status': target, **fields}
+        if any(field.name == 'updated_at' for field in cls._meta.concrete_fields):
+            values.setdefault('updated_at', timezone.now())
+        return values
+
+    def transition(self, name, **fields):
+        """
+        Appliquer la transition `name` (et les champs `fields`) en une requête.
+
+        Retourne False si l'état courant ne la permet pas, y compris quand
+        il a été modifié entre-temps par une autre requête.
+        """
+        sources, target = self.TRANSITIONS[name]
+        source = self.status
+        if source not in sources:
+            return False
+        values = self._transition_values(target, fields)
+        with transaction.atomic():
+            updated = type(self)._default_manager.filter(pk=self.pk, status__in=sources).update(**values)
+            if not updated:
+                return False
+            for field, value in values.items():
+                setattr(self, field, value)
+            transition_done.send(
+                sender=type(self), name=name, source=source, target=target,
+                instance=self, pks=[self.pk]
+            )
+        return True
+
+    @classmethod
+    def bulk_transition(cls, name, queryset, **fields):
+        """Appliquer `name` aux lignes de `queryset` qui le permettent (une requête)."""
+        sources, target = cls.TRANSITIONS[name]
+        queryset = queryset.filter(status__in=sources)
+        with transaction.atomic():
+            pks = None
+            if transition_done.has_listeners(cls):
+                pks = list(queryset.select_for_update().values_list('pk', flat=True))
+                queryset = cls._default_manager.filter(pk__in=pks, status__in=sources)
+            updated = queryset.update(**cls._transition_values(target, fields))
+            if updated and pks is not None:
+                transition_done.send(
+                    sender=cls, name=name, source=None, target=target, instance=None, pks=pks
+                )
+        return updated
@@ -0,0 +1,44 @@
+"""
+Réponses JSON en flux pour les listes non paginées.
+
+Plutôt que de construire toute la liste en mémoire avant le rendu, les
+lignes sont lues par lots depuis `QuerySet.iterator()` puis encodées et
+envoyées au fur et à mesure sous forme d'un tableau JSON.
+"""
+
+from django.http import StreamingHttpResponse
+
+from apps.core.renderers import encode_json
+
+
+def iter_chunks(queryset, chunk_size):
+    """Découper `queryset.iterator()` en listes de `chunk_size` lignes."""
+    chunk = []
+    for row in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_json_array(batches):
+    """Produire un tableau JSON à partir de lots d'éléments déjà sérialisés."""
+    yield b'['
+    separator = b''
+    for batch in batches:
+        if not batch:
+            continue
+        # Un seul envoi par lot plutôt qu'un par élément
+        yield separator + b','.join(encode_json(item) for item in batch)
+        separator = b','
+    yield b']'
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """Tableau JSON envoyé au fil de l'eau."""
+
+    def __init__(self, batches, status=200, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(iter_json_array(batches), status=status, **kwargs)
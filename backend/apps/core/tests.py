@@ -0,0 +1,87 @@
+"""
+Tests pour les utilitaires partagés de l'API.
+"""
+
+import io
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from unittest import skipUnless
+
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from apps.core.parsers import FastJSONParser, MessagePackParser
+from apps.core.renderers import FastJSONRenderer, MessagePackRenderer, msgpack
+
+
+class FastJSONTestCase(TestCase):
+    def setUp(self):
+        self.data = {
+            'price_per_hour': Decimal('25.00'),
+            'amount': Decimal('12.5'),
+            'created_at': datetime(2026, 3, 1, 10, 30, tzinfo=dt_timezone.utc),
+            'label': gettext_lazy('Tennis'),
+            'items': [1, 'deux', None, True],
+            'separator': '\u2028',
+        }
+    
+    def test_render_matches_drf(self):
+        """Tester que le rendu orjson est identique à celui de DRF."""
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+    
+    @override_settings(API_JSON_BACKEND='stdlib')
+    def test_render_fallback(self):
+        """Tester le repli sur l'encodeur de DRF."""
+        expected = JSONRenderer().render(self.data)
+        self.assertEqual(FastJSONRenderer().render(self.data), expected)
+    
+    def test_parse(self):
+        """Tester la lecture d'un corps JSON."""
+        parser = FastJSONParser()
+        data = parser.parse(io.BytesIO('{"court": 1, "notes": "été"}'.encode()))
+        self.assertEqual(data, {'court': 1, 'notes': 'été'})
+        
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"court": '))
+
+
+class SlotSerializer(serializers.Serializer):
+    start_datetime = serializers.DateTimeField()
+    price_per_hour = serializers.DecimalField(max_digits=10, decimal_places=2)
+    label = serializers.CharField()
+
+
+@skipUnless(msgpack, 'msgpack non installé')
+class MessagePackTestCase(TestCase):
+    def test_render_native_types(self):
+        """Tester l'encodage des dates en epoch et des décimaux en entiers."""
+        start = datetime(2026, 3, 1, 10, 30, tzinfo=dt_timezone.utc)
+        slot = {'start_datetime': start, 'price_per_hour': Decimal('25.50'), 'label': '25.50'}
+        data = {
+            'results': SlotSerializer([slot], many=True).data,
+            'total': Decimal('12.5'),
+            'checked_at': start,
+        }
+        
+        content = MessagePackRenderer().render(data)
+        decoded = msgpack.unpackb(content, raw=False)
+        
+        self.assertEqual(decoded['results'], [
+            {'start_datetime': int(start.timestamp()), 'price_per_hour': 2550, 'label': '25.50'}
+        ])
+        self.assertEqual(decoded['total'], 1250)
+        self.assertEqual(decoded['checked_at'], int(start.timestamp()))
+    
+    def test_parse(self):
+        """Tester la lecture d'un corps MessagePack."""
+        body = msgpack.packb({'court': 1, 'start': '2026-03-01T10:00:00Z'})
+        data = MessagePackParser().parse(io.BytesIO(body))
+        self.assertEqual(data, {'court': 1, 'start': '2026-03-01T10:00:00Z'})
+        
+        with self.assertRaises(ParseError):
+            MessagePackParser().parse(io.BytesIO(b'\xc1'))
@@ -3,8 +3,24 @@ Utilitaires pour l'API.
 """
 
 from datetime import datetime, timedelta
-from apps.courts.models import Court
-from apps.reservations.models import Reservation
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from apps.courts.models import Court, Occupancy
+from apps.courts.recurrence import court_recurring_blocks
+
+
+def parse_aware_datetime(value):
+    """
+    Date/heure ISO 8601 d'un paramètre de requête, rendue aware (fuseau
+    courant si aucun décalage n'est indiqué). Retourne None si invalide.
+    """
+    try:
+        parsed = parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
 
 
 def get_court_availability(court: Court, start_date: datetime, end_date: datetime):
@@ -45,30 +61,27 @@ def get_court_availability(court: Court, start_date: datetime, end_date: datetim
             second=0
         )
         
-        # Vérifier les chevauchements avec les réservations
-        overlapping_reservations = Reservation.objects.filter(
-            court=court,
-            status__in=['CONFIRMED', 'PENDING'],
-            start_datetime__lt=slot_end,
-            end_datetime__gt=slot_start
-        ).order_by('start_datetime')
+        # Réservations, périodes bloquées et holds (une requête)
+        occupied = Occupancy.objects.overlapping(court, slot_start, slot_end).values_list(
+            'start_datetime', 'end_datetime'
+        )
         
-        # Vérifier les périodes bloquées
-        blocked_periods = court.blocked_periods.filter(
-            start_datetime__lt=slot_end,
-            end_datetime__gt=slot_start
-        ).order_by('start_datetime')
+        # Blocages récurrents, développés pour la journée seulement
+        recurring = [
+            (start, end) for start, end, _ in court_recurring_blocks(court, slot_start, slot_end)
+        ]
+        busy = sorted([*occupied, *recurring])
         
         # Construire les créneaux disponibles
         current_slot = max(slot_start, current)
         
-        for reservation in overlapping_reservations:
-            if current_slot < reservation.start_datetime:
+        for busy_start, busy_end in busy:
+            if current_slot < busy_start:
                 available_slots.append({
                     'start': current_slot,
-                    'end': reservation.start_datetime
+                    'end': busy_start
                 })
-            current_slot = reservation.end_datetime
+            current_slot = max(current_slot, busy_end)
         
         if current_slot < slot_end:
             available_slots.append({
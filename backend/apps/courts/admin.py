@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Court, CourtImage, Equipment, BlockedPeriod
+from .models import Court, CourtImage, Equipment, BlockedPeriod, RecurringBlock, Closure
 
 @admin.register(Equipment)
 class EquipmentAdmin(admin.ModelAdmin):
@@ -32,3 +32,17 @@ class BlockedPeriodAdmin(admin.ModelAdmin):
     list_display = ['court', 'start_datetime', 'end_datetime', 'reason']
     list_filter = ['court', 'start_datetime']
     search_fields = ['court__name', 'reason']
+
+@admin.register(RecurringBlock)
+class RecurringBlockAdmin(admin.ModelAdmin):
+    list_display = ['court', 'site', 'day_of_week', 'start_time', 'end_time', 'interval_weeks', 'is_active']
+    list_filter = ['day_of_week', 'is_active', 'site']
+    search_fields = ['court__name', 'site__name', 'reason']
+    readonly_fields = ['version', 'created_at', 'updated_at']
+
+@admin.register(Closure)
+class ClosureAdmin(admin.ModelAdmin):
+    list_display = ['court', 'start_datetime', 'end_datetime', 'reservations_cancelled', 'created_by', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['court__name', 'reason']
+    readonly_fields = ['blocked_period', 'reservations_cancelled', 'created_by', 'created_at']
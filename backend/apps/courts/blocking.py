@@ -0,0 +1,219 @@
+"""
+Création groupée de périodes bloquées.
+
+Tout le lot est validé en mémoire avant d'écrire quoi que ce soit: les
+terrains sont verrouillés en une requête, les chevauchements à l'intérieur
+du lot sont détectés par un tri par terrain, et les conflits avec
+l'existant (table `Occupancy`: réservations actives, périodes bloquées,
+holds) par une seule requête de plage, couvrant pour chaque terrain
+l'intervalle `[premier début, dernière fin[` de ses périodes. Si aucune
+période n'est rejetée, le lot est inséré en une seule requête; sinon rien
+n'est écrit.
+
+La fermeture d'un terrain (`close_court`) bloque au contraire la période
+quoi qu'il arrive: les réservations touchées sont annulées en une requête
+et leurs paiements mis en file de remboursement.
+"""
+
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.courts.models import Court, BlockedPeriod, Closure, Occupancy
+from apps.reservations.models import Reservation, SharedSession
+
+ACTIVE_RESERVATION_STATUSES = ('PENDING', 'CONFIRMED')
+CONFLICT_TYPES = {
+    'RESERVATION': 'reservation', 'BLOCKED': 'blocked_period', 'HOLD': 'hold', 'SESSION': 'session',
+}
+
+
+def _court_windows(periods):
+    """Intervalle couvrant les périodes de chaque terrain."""
+    windows = {}
+    for period in periods:
+        start, end = windows.get(period['court'], (period['start_datetime'], period['end_datetime']))
+        windows[period['court']] = (
+            min(start, period['start_datetime']), max(end, period['end_datetime'])
+        )
+    return windows
+
+
+def _existing(windows):
+    """Occupations recoupant les intervalles, en une requête."""
+    if not windows:
+        return defaultdict(list)
+    condition = reduce(or_, (
+        Q(court_id=court_id, start_datetime__lt=end, end_datetime__gt=start)
+        for court_id, (start, end) in windows.items()
+    ))
+    rows = defaultdict(list)
+    occupancies = Occupancy.objects.active().filter(condition)
+    for row in occupancies.values_list('court_id', 'start_datetime', 'end_datetime', 'source_type', 'source_id'):
+        rows[row[0]].append(row)
+    return rows
+
+
+def find_conflicts(periods):
+    """
+    Conflits de chaque période validée, indexés par position dans le lot.
+
+    `periods` est une liste de dicts (`court`, `start_datetime`,
+    `end_datetime`); chaque conflit est un dict décrivant la ressource
+    concurrente.
+    """
+    conflicts = defaultdict(list)
+
+    # Chevauchements à l'intérieur du lot
+    by_court = defaultdict(list)
+    for index, period in enumerate(periods):
+        by_court[period['court']].append((period['start_datetime'], period['end_datetime'], index))
+    for items in by_court.values():
+        items.sort()
+        latest_end, latest_index = None, None
+        for start, end, index in items:
+            if latest_end is not None and start < latest_end:
+                conflicts[index].append({'type': 'batch', 'index': latest_index})
+            if latest_end is None or end > latest_end:
+                latest_end, latest_index = end, index
+
+    # Chevauchements avec l'existant
+    existing = _existing(_court_windows(periods))
+    for index, period in enumerate(periods):
+        start, end = period['start_datetime'], period['end_datetime']
+        for _, other_start, other_end, source_type, source_id in existing[period['court']]:
+            if other_start < end and other_end > start:
+                conflicts[index].append({'type': CONFLICT_TYPES[source_type], 'id': source_id})
+    return conflicts
+
+
+def create_blocked_periods(items, courts):
+    """
+    Créer un lot de périodes bloquées, tout ou rien.
+
+    `items` est la liste `(données validées ou None, erreurs)` du lot, dans
+    l'ordre reçu; `courts` le queryset des terrains que l'utilisateur peut
+    bloquer. Les terrains concernés sont verrouillés (par id croissant)
+    pendant la vérification et l'insertion. Retourne `(created, report)`:
+    les périodes créées (liste vide en cas de rejet) et un compte rendu par
+    élément.
+    """
+    report = [
+        {'index': index, 'status': 'invalid', 'errors': errors} if errors
+        else {'index': index, 'status': 'valid'}
+        for index, (_, errors) in enumerate(items)
+    ]
+    court_ids = {data['court'] for data, _ in items if data is not None}
+
+    with transaction.atomic():
+        allowed = set(
+            courts.select_for_update().filter(id__in=court_ids)
+            .order_by('id').values_list('id', flat=True)
+        )
+        valid = []
+        for index, (data, _) in enumerate(items):
+            if data is None:
+                continue
+            if data['court'] not in allowed:
+                report[index] = {
+                    'index': index, 'status': 'invalid',
+                    'errors': {'court': ['Terrain introuvable.']},
+                }
+            else:
+                valid.append((index, data))
+
+        conflicts = find_conflicts([data for _, data in valid])
+        for position, (index, _) in enumerate(valid):
+            if conflicts.get(position):
+                report[index] = {
+                    'index': index,
+                    'status': 'conflict',
+                    'conflicts': [
+                        dict(conflict, index=valid[conflict['index']][0])
+                        if conflict['type'] == 'batch' else conflict
+                        for conflict in conflicts[position]
+                    ],
+                }
+
+        if any(entry['status'] != 'valid' for entry in report):
+            return [], report
+
+        created = BlockedPeriod.objects.bulk_create([
+            BlockedPeriod(
+                court_id=data['court'],
+                start_datetime=data['start_datetime'],
+                end_datetime=data['end_datetime'],
+                reason=data.get('reason', ''),
+            )
+            for _, data in valid
+        ])
+        Occupancy.objects.bulk_create([
+            Occupancy(
+                court_id=period.court_id,
+                start_datetime=period.start_datetime,
+                end_datetime=period.end_datetime,
+                source_type='BLOCKED',
+                source_id=period.pk,
+            )
+            for period in created
+        ])
+    for entry, period in zip(report, created):
+        entry.update(status='created', id=period.id)
+    return created, report
+
+
+def close_court(court, start, end, reason='', user=None):
+    """
+    Fermer un terrain sur `[start, end[`.
+
+    Crée la période bloquée, annule les réservations actives qui la
+    recoupent (une seule mise à jour, sans `save()` par réservation), ferme
+    les sessions partagées concernées et met les paiements réussis en file
+    de remboursement. Retourne la
+    `Closure`, dont l'avancement se suit par ses tâches de remboursement.
+    """
+    from apps.payments.models import Payment, RefundTask
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Sérialiser avec les réservations et blocages concurrents du terrain
+        list(Court.objects.select_for_update().filter(pk=court.pk).values_list('id'))
+        blocked_period = BlockedPeriod.objects.create(
+            court=court, start_datetime=start, end_datetime=end, reason=reason
+        )
+        reservation_ids = list(
+            Reservation.objects.filter(
+                court=court,
+                status__in=ACTIVE_RESERVATION_STATUSES,
+                start_datetime__lt=end,
+                end_datetime__gt=start,
+            ).values_list('id', flat=True)
+        )
+        Reservation.bulk_transition(
+            'cancel', Reservation.objects.filter(id__in=reservation_ids),
+            cancelled_at=now, updated_at=now
+        )
+        # Places de session annulées ci-dessus: la session ne doit plus en proposer
+        SharedSession.close(list(
+            SharedSession.objects.filter(court=court, start_datetime__lt=end, end_datetime__gt=start)
+            .values_list('id', flat=True)
+        ))
+        closure = Closure.objects.create(
+            court=court,
+            blocked_period=blocked_period,
+            start_datetime=start,
+            end_datetime=end,
+            reason=reason,
+            created_by=user,
+            reservations_cancelled=len(reservation_ids),
+        )
+        RefundTask.enqueue(
+            Payment.objects.filter(reservation_id__in=reservation_ids, status='SUCCESS')
+            .values_list('id', flat=True),
+            closure
+        )
+    return closure
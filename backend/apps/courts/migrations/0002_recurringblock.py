@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:22
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0003_alter_openinghours_options_siteimage_description'),
+        ('courts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.IntegerField(choices=[(0, 'Lundi'), (1, 'Mardi'), (2, 'Mercredi'), (3, 'Jeudi'), (4, 'Vendredi'), (5, 'Samedi'), (6, 'Dimanche')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('interval_weeks', models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)])),
+                ('starts_on', models.DateField()),
+                ('ends_on', models.DateField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('is_active', models.BooleanField(default=True)),
+                ('version', models.PositiveIntegerField(default=1, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('court', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recurring_blocks', to='courts.court')),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recurring_blocks', to='sites.site')),
+            ],
+            options={
+                'verbose_name': 'Blocage récurrent',
+                'verbose_name_plural': 'Blocages récurrents',
+                'ordering': ['day_of_week', 'start_time'],
+                'indexes': [models.Index(fields=['court', 'is_active'], name='courts_recu_court_i_26ca76_idx'), models.Index(fields=['site', 'is_active'], name='courts_recu_site_id_b01142_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recurringblock',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('court__isnull', False), ('site__isnull', True)), models.Q(('court__isnull', True), ('site__isnull', False)), _connector='OR'), name='recurring_block_court_or_site'),
+        ),
+    ]
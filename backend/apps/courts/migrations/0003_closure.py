@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0001_initial'),
+        ('courts', '0002_recurringblock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Closure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('reason', models.CharField(blank=True, max_length=255)),
+                ('reservations_cancelled', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blocked_period', models.OneToOneField(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closure', to='courts.blockedperiod')),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='closures', to='courts.court')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='closures', to='auth_app.customuser')),
+            ],
+            options={
+                'verbose_name': 'Fermeture',
+                'verbose_name_plural': 'Fermetures',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
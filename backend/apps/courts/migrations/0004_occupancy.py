@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_occupancy(apps, schema_editor):
+    """Reprendre les réservations actives et les périodes bloquées existantes."""
+    Occupancy = apps.get_model('courts', 'Occupancy')
+    BlockedPeriod = apps.get_model('courts', 'BlockedPeriod')
+    Reservation = apps.get_model('reservations', 'Reservation')
+    sources = (
+        ('RESERVATION', Reservation.objects.exclude(status='CANCELLED')),
+        ('BLOCKED', BlockedPeriod.objects.all()),
+    )
+    for source_type, queryset in sources:
+        rows = queryset.values_list('id', 'court_id', 'start_datetime', 'end_datetime')
+        Occupancy.objects.bulk_create(
+            (
+                Occupancy(
+                    source_type=source_type, source_id=source_id, court_id=court_id,
+                    start_datetime=start, end_datetime=end
+                )
+                for source_id, court_id, start, end in rows.iterator()
+            ),
+            batch_size=1000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courts', '0003_closure'),
+        ('reservations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Occupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('source_type', models.CharField(choices=[('RESERVATION', 'Réservation'), ('BLOCKED', 'Période bloquée'), ('HOLD', 'Créneau retenu')], max_length=20)),
+                ('source_id', models.PositiveBigIntegerField()),
+                ('expires_at', models.DateTimeField(blank=True, null=True)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancies', to='courts.court')),
+            ],
+            options={
+                'verbose_name': 'Occupation',
+                'verbose_name_plural': 'Occupations',
+                'indexes': [models.Index(fields=['court', 'start_datetime', 'end_datetime'], name='courts_occu_court_i_8569ee_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='occupancy',
+            constraint=models.UniqueConstraint(fields=('source_type', 'source_id'), name='unique_occupancy_source'),
+        ),
+        migrations.RunPython(fill_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courts', '0004_occupancy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='occupancy',
+            name='source_type',
+            field=models.CharField(choices=[('RESERVATION', 'Réservation'), ('BLOCKED', 'Période bloquée'), ('HOLD', 'Créneau retenu'), ('SESSION', 'Session partagée')], max_length=20),
+        ),
+    ]
@@ -2,9 +2,12 @@
 Models pour la gestion des terrains et équipements.
 """
 
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from apps.sites.models import Site
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from apps.sites.models import Site, OpeningHours
 
 
 class Equipment(models.Model):
@@ -128,3 +131,216 @@ class BlockedPeriod(models.Model):
         from django.core.exceptions import ValidationError
         if self.start_datetime >= self.end_datetime:
             raise ValidationError("La date de début doit être antérieure à la date de fin.")
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Occupancy.occupy('BLOCKED', self.pk, self.court_id, self.start_datetime, self.end_datetime)
+
+
+class OccupancyQuerySet(models.QuerySet):
+    def active(self):
+        """Occupations en vigueur (holds expirés exclus)."""
+        return self.filter(models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now()))
+    
+    def overlapping(self, court, start, end):
+        """Occupations du terrain qui recoupent `[start, end[`."""
+        return self.active().filter(court=court, start_datetime__lt=end, end_datetime__gt=start)
+
+
+class Occupancy(models.Model):
+    """
+    Occupation d'un créneau de terrain, quelle qu'en soit l'origine.
+    
+    Une ligne par réservation active, période bloquée, hold en cours ou
+    session partagée, tenue à jour dans la même transaction que sa source.
+    Toutes les vérifications de conflit se font par une seule requête de
+    plage sur l'index `(court, start_datetime, end_datetime)`.
+    """
+    
+    SOURCE_CHOICES = (
+        ('RESERVATION', 'Réservation'),
+        ('BLOCKED', 'Période bloquée'),
+        ('HOLD', 'Créneau retenu'),
+        ('SESSION', 'Session partagée'),
+    )
+    
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='occupancies')
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    source_id = models.PositiveBigIntegerField()
+    # Fin de validité (holds uniquement)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = OccupancyQuerySet.as_manager()
+    
+    class Meta:
+        verbose_name = 'Occupation'
+        verbose_name_plural = 'Occupations'
+        constraints = [
+            models.UniqueConstraint(fields=['source_type', 'source_id'], name='unique_occupancy_source'),
+        ]
+        indexes = [
+            models.Index(fields=['court', 'start_datetime', 'end_datetime']),
+        ]
+    
+    def __str__(self):
+        return f"{self.source_type} {self.source_id}: {self.court_id} ({self.start_datetime} - {self.end_datetime})"
+    
+    @classmethod
+    def occupy(cls, source_type, source_id, court_id, start, end, expires_at=None):
+        """Créer ou mettre à jour l'occupation d'une source."""
+        cls.objects.update_or_create(
+            source_type=source_type,
+            source_id=source_id,
+            defaults={
+                'court_id': court_id,
+                'start_datetime': start,
+                'end_datetime': end,
+                'expires_at': expires_at,
+            }
+        )
+    
+    @classmethod
+    def release(cls, source_type, source_ids):
+        """Libérer les occupations de sources (supprimées ou annulées)."""
+        return cls.objects.filter(source_type=source_type, source_id__in=source_ids).delete()
+
+
+class ClosureQuerySet(models.QuerySet):
+    def with_progress(self):
+        """Annoter l'avancement des remboursements (une seule requête)."""
+        return self.annotate(
+            refunds_total=models.Count('refund_tasks'),
+            refunds_pending=models.Count(
+                'refund_tasks', filter=models.Q(refund_tasks__status__in=['PENDING', 'IN_PROGRESS'])
+            ),
+            refunds_done=models.Count('refund_tasks', filter=models.Q(refund_tasks__status='DONE')),
+            refunds_failed=models.Count('refund_tasks', filter=models.Q(refund_tasks__status='FAILED')),
+        )
+
+
+class Closure(models.Model):
+    """
+    Fermeture d'un terrain (tournoi, travaux).
+    
+    La période est bloquée, les réservations actives qui la recoupent sont
+    annulées et les paiements correspondants mis en file de remboursement
+    (`payments.RefundTask`); l'avancement se lit sur les tâches.
+    """
+    
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='closures')
+    blocked_period = models.OneToOneField(
+        BlockedPeriod,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='closure'
+    )
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    reason = models.CharField(max_length=255, blank=True)
+    created_by = models.ForeignKey(
+        'auth_app.CustomUser',
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='closures'
+    )
+    reservations_cancelled = models.PositiveIntegerField(default=0)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ClosureQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Fermeture'
+        verbose_name_plural = 'Fermetures'
+    
+    def __str__(self):
+        return f"Fermeture {self.court_id} ({self.start_datetime} - {self.end_datetime})"
+
+
+class RecurringBlock(models.Model):
+    """
+    Blocage récurrent (ex.: « chaque lundi 8h-10h nettoyage »).
+    
+    La règle s'applique à un terrain ou à tous les terrains d'un site. Elle
+    n'est jamais matérialisée en `BlockedPeriod`: ses occurrences sont
+    calculées à la demande pour la plage consultée (voir
+    `apps.courts.recurrence`). `version` change à chaque modification et
+    invalide les occurrences en cache.
+    """
+    
+    court = models.ForeignKey(
+        Court,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='recurring_blocks'
+    )
+    site = models.ForeignKey(
+        Site,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='recurring_blocks'
+    )
+    day_of_week = models.IntegerField(choices=OpeningHours.DAYS_OF_WEEK)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    interval_weeks = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    starts_on = models.DateField()
+    ends_on = models.DateField(null=True, blank=True)
+    reason = models.CharField(max_length=255, blank=True)
+    is_active = models.BooleanField(default=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['day_of_week', 'start_time']
+        verbose_name = 'Blocage récurrent'
+        verbose_name_plural = 'Blocages récurrents'
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(court__isnull=False, site__isnull=True)
+                    | models.Q(court__isnull=True, site__isnull=False)
+                ),
+                name='recurring_block_court_or_site',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['court', 'is_active']),
+            models.Index(fields=['site', 'is_active']),
+        ]
+    
+    def __str__(self):
+        target = self.court or self.site
+        return f"{target} - {self.get_day_of_week_display()} {self.start_time}-{self.end_time}"
+    
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if (self.court_id is None) == (self.site_id is None):
+            raise ValidationError("La règle doit porter sur un terrain ou sur un site.")
+        if self.start_time >= self.end_time:
+            raise ValidationError("L'heure de début doit être antérieure à l'heure de fin.")
+        if self.ends_on and self.ends_on < self.starts_on:
+            raise ValidationError("La date de fin doit être postérieure à la date de début.")
+    
+    def save(self, *args, **kwargs):
+        # Toute modification invalide les occurrences en cache
+        if self.pk is not None:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
+
+
+@receiver(post_delete, sender=BlockedPeriod)
+def release_blocked_period(sender, instance, **kwargs):
+    Occupancy.release('BLOCKED', [instance.pk])
@@ -0,0 +1,102 @@
+"""
+Expansion paresseuse des blocages récurrents.
+
+Une règle (`RecurringBlock`) n'est développée que pour la plage consultée,
+mois par mois. Les occurrences d'un mois sont mises en cache sous une clé
+qui contient la version de la règle: modifier la règle change la clé, donc
+aucune invalidation explicite n'est nécessaire. Un planning sur plusieurs
+années ne coûte rien tant qu'il n'est pas lu.
+"""
+
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.courts.models import RecurringBlock
+
+CACHE_PREFIX = 'courts:recurring:'
+
+
+def cache_key(rule, year, month):
+    return f'{CACHE_PREFIX}{rule.id}:{rule.version}:{year}-{month:02d}'
+
+
+def month_occurrences(rule, year, month):
+    """Occurrences `(début, fin)` de la règle pendant un mois."""
+    first = date(year, month, 1)
+    last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+    # Première occurrence de la règle: sert de référence pour l'intervalle
+    anchor = rule.starts_on + timedelta(days=(rule.day_of_week - rule.starts_on.weekday()) % 7)
+    day = max(first, anchor)
+    day += timedelta(days=(rule.day_of_week - day.weekday()) % 7)
+
+    occurrences = []
+    while day <= last and (rule.ends_on is None or day <= rule.ends_on):
+        if (day - anchor).days // 7 % rule.interval_weeks == 0:
+            occurrences.append((
+                timezone.make_aware(datetime.combine(day, rule.start_time)),
+                timezone.make_aware(datetime.combine(day, rule.end_time)),
+            ))
+        day += timedelta(days=7)
+    return occurrences
+
+
+def _months(start, end):
+    """Mois (année, mois) couverts par `[start, end[` en heure locale."""
+    current = timezone.localtime(start).date().replace(day=1)
+    last = timezone.localtime(end - timedelta(microseconds=1)).date()
+    months = []
+    while current <= last:
+        months.append((current.year, current.month))
+        current = date(current.year + current.month // 12, current.month % 12 + 1, 1)
+    return months
+
+
+def active_rules(court_ids, site_ids, start, end):
+    """Règles actives des terrains ou sites qui peuvent recouper la plage."""
+    return RecurringBlock.objects.filter(
+        Q(court_id__in=court_ids) | Q(site_id__in=site_ids),
+        Q(ends_on__isnull=True) | Q(ends_on__gte=timezone.localtime(start).date()),
+        is_active=True,
+        starts_on__lte=timezone.localtime(end).date(),
+    )
+
+
+def expand(rules, start, end):
+    """
+    Occurrences `(début, fin, règle)` des règles qui recoupent `[start, end[`,
+    triées par début.
+    """
+    keys = {
+        cache_key(rule, year, month): (rule, year, month)
+        for rule in rules
+        for year, month in _months(start, end)
+    }
+    if not keys:
+        return []
+    expansions = cache.get_many(keys)
+    missing = {
+        key: month_occurrences(rule, year, month)
+        for key, (rule, year, month) in keys.items()
+        if key not in expansions
+    }
+    if missing:
+        cache.set_many(missing, settings.RECURRING_BLOCK_CACHE_TTL)
+        expansions.update(missing)
+
+    occurrences = [
+        (occurrence_start, occurrence_end, rule)
+        for key, (rule, _, _) in keys.items()
+        for occurrence_start, occurrence_end in expansions[key]
+        if occurrence_start < end and occurrence_end > start
+    ]
+    occurrences.sort(key=lambda occurrence: occurrence[:2])
+    return occurrences
+
+
+def court_recurring_blocks(court, start, end):
+    """Occurrences des blocages récurrents d'un terrain (et de son site)."""
+    return expand(active_rules([court.id], [court.site_id], start, end), start, end)
@@ -3,23 +3,32 @@ Sérialiseurs pour la gestion des terrains.
 """
 
 from rest_framework import serializers
-from apps.courts.models import Court, Equipment, CourtImage, BlockedPeriod
+from apps.courts.models import Court, Equipment, CourtImage, BlockedPeriod, RecurringBlock, Closure
 from apps.sites.models import Site
+from apps.core.serializers import (
+    DynamicFieldsMixin,
+    ValuesSerializer,
+    ValueField,
+    ChoiceDisplayField,
+    DecimalValueField,
+    DateTimeValueField,
+    FileUrlField,
+)
 
 
-class EquipmentSerializer(serializers.ModelSerializer):
+class EquipmentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Equipment
         fields = ['id', 'name', 'description', 'icon']
 
 
-class CourtImageSerializer(serializers.ModelSerializer):
+class CourtImageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CourtImage
         fields = ['id', 'image', 'title', 'is_primary', 'uploaded_at']
 
 
-class CourtSerializer(serializers.ModelSerializer):
+class CourtSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     sport_type_name = serializers.CharField(source='get_sport_type_display', read_only=True)
     equipments = EquipmentSerializer(many=True, read_only=True)
     images = CourtImageSerializer(many=True, read_only=True)
@@ -33,9 +42,14 @@ class CourtSerializer(serializers.ModelSerializer):
             'capacity', 'images', 'created_at'
         ]
         read_only_fields = ['id', 'created_at']
+        field_relations = {
+            'site_name': {'select_related': ['site']},
+            'equipments': {'prefetch_related': ['equipments']},
+            'images': {'prefetch_related': ['images']},
+        }
 
 
-class CourtDetailSerializer(serializers.ModelSerializer):
+class CourtDetailSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     sport_type_name = serializers.CharField(source='get_sport_type_display', read_only=True)
     equipments = EquipmentSerializer(many=True, read_only=True)
     images = CourtImageSerializer(many=True, read_only=True)
@@ -48,13 +62,18 @@ class CourtDetailSerializer(serializers.ModelSerializer):
             'site', 'price_per_hour', 'equipments', 'is_active', 'capacity',
             'images', 'created_at'
         ]
+        field_relations = {
+            'site': {'select_related': ['site__manager']},
+            'equipments': {'prefetch_related': ['equipments']},
+            'images': {'prefetch_related': ['images']},
+        }
     
     def get_site(self, obj):
         from apps.sites.serializers import SiteListSerializer
         return SiteListSerializer(obj.site).data
 
 
-class CourtListSerializer(serializers.ModelSerializer):
+class CourtListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     sport_type_name = serializers.CharField(source='get_sport_type_display', read_only=True)
     site_name = serializers.CharField(source='site.name', read_only=True)
     main_image = serializers.SerializerMethodField()
@@ -65,15 +84,78 @@ class CourtListSerializer(serializers.ModelSerializer):
             'id', 'name', 'sport_type', 'sport_type_name', 'site_name',
             'price_per_hour', 'capacity', 'main_image'
         ]
+        field_relations = {
+            'site_name': {'select_related': ['site']},
+            'main_image': {'prefetch_related': ['images']},
+        }
     
     def get_main_image(self, obj):
-        image = obj.images.filter(is_primary=True).first()
-        if not image:
-            image = obj.images.first()
+        # Les images sont triées image principale d'abord (CourtImage.Meta.ordering);
+        # `images.all()` profite du prefetch éventuel
+        image = next(iter(obj.images.all()), None)
         return CourtImageSerializer(image).data if image else None
 
 
-class BlockedPeriodSerializer(serializers.ModelSerializer):
+class CourtImageValuesSerializer(ValuesSerializer):
+    model = CourtImage
+    fields = (
+        ('id', 'id'),
+        ('image', FileUrlField()),
+        ('title', 'title'),
+        ('is_primary', 'is_primary'),
+        ('uploaded_at', DateTimeValueField()),
+    )
+
+
+class CourtMainImageField(ValueField):
+    """Image principale chargée par lot dans `CourtListValuesSerializer.extend`."""
+    
+    native_type = 'nested'
+    
+    def __init__(self):
+        super().__init__('id')
+        self.serializer = CourtImageValuesSerializer()
+    
+    def to_representation(self, row, context):
+        return context['main_images'].get(row['id'])
+
+
+class CourtListValuesSerializer(ValuesSerializer):
+    """Version `.values()` de `CourtListSerializer` pour les listes."""
+    
+    model = Court
+    fields = (
+        ('id', 'id'),
+        ('name', 'name'),
+        ('sport_type', 'sport_type'),
+        ('sport_type_name', ChoiceDisplayField('sport_type', Court.SPORT_TYPES)),
+        ('site_name', 'site__name'),
+        ('price_per_hour', DecimalValueField()),
+        ('capacity', 'capacity'),
+        ('main_image', CourtMainImageField()),
+    )
+    
+    def extend(self, rows):
+        # Une seule requête pour les images de tout le lot
+        court_ids = [row['id'] for row in rows]
+        if not court_ids or not self.has_field('main_image'):
+            return {'main_images': {}}
+        # Comme `CourtListSerializer.get_main_image`: pas de requête, URL relative
+        image_serializer = CourtImageValuesSerializer(context={'timezone': self.context['timezone']})
+        images = CourtImage.objects.filter(court_id__in=court_ids).order_by(
+            'court_id', '-is_primary', '-uploaded_at'
+        ).values('court_id', *image_serializer.columns)
+        main_images = {}
+        for image in images:
+            if image['court_id'] not in main_images:
+                main_images[image['court_id']] = image
+        serialized = image_serializer.serialize(main_images.values())
+        return {
+            'main_images': dict(zip(main_images.keys(), serialized))
+        }
+
+
+class BlockedPeriodSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = BlockedPeriod
         fields = ['id', 'court', 'start_datetime', 'end_datetime', 'reason', 'created_at']
@@ -83,3 +165,96 @@ class BlockedPeriodCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = BlockedPeriod
         fields = ['court', 'start_datetime', 'end_datetime', 'reason']
+
+
+class BlockedPeriodBulkItemSerializer(serializers.Serializer):
+    """Élément d'un lot de périodes bloquées (validé sans requête)."""
+    
+    court = serializers.IntegerField()
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField()
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    
+    def validate(self, attrs):
+        if attrs['start_datetime'] >= attrs['end_datetime']:
+            raise serializers.ValidationError(
+                "La date de début doit être antérieure à la date de fin."
+            )
+        return attrs
+
+
+class RecurringBlockSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    day_of_week_display = serializers.CharField(source='get_day_of_week_display', read_only=True)
+    
+    class Meta:
+        model = RecurringBlock
+        fields = [
+            'id', 'court', 'site', 'day_of_week', 'day_of_week_display', 'start_time',
+            'end_time', 'interval_weeks', 'starts_on', 'ends_on', 'reason', 'is_active',
+            'version', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['version', 'created_at', 'updated_at']
+    
+    def validate(self, data):
+        court = data.get('court', getattr(self.instance, 'court', None))
+        site = data.get('site', getattr(self.instance, 'site', None))
+        if (court is None) == (site is None):
+            raise serializers.ValidationError("Indiquer un terrain ou un site (pas les deux).")
+        
+        start_time = data.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = data.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time >= end_time:
+            raise serializers.ValidationError("L'heure de début doit être antérieure à l'heure de fin.")
+        
+        starts_on = data.get('starts_on', getattr(self.instance, 'starts_on', None))
+        ends_on = data.get('ends_on', getattr(self.instance, 'ends_on', None))
+        if ends_on and ends_on < starts_on:
+            raise serializers.ValidationError("La date de fin doit être postérieure à la date de début.")
+        
+        user = self.context['request'].user
+        if user.role.name == 'MANAGER':
+            manager_id = court.site.manager_id if court else site.manager_id
+            if manager_id != user.id:
+                raise serializers.ValidationError("Ce terrain ou ce site ne vous appartient pas.")
+        return data
+
+
+class ClosureCreateSerializer(serializers.Serializer):
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField()
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    
+    def validate(self, attrs):
+        if attrs['start_datetime'] >= attrs['end_datetime']:
+            raise serializers.ValidationError(
+                "La date de début doit être antérieure à la date de fin."
+            )
+        return attrs
+
+
+class ClosureSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    """Fermeture et avancement de ses remboursements."""
+    
+    refunds = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Closure
+        fields = [
+            'id', 'court', 'blocked_period', 'start_datetime', 'end_datetime', 'reason',
+            'created_by', 'reservations_cancelled', 'refunds', 'status', 'created_at'
+        ]
+        read_only_fields = fields
+    
+    def get_refunds(self, obj):
+        return {
+            'total': obj.refunds_total,
+            'pending': obj.refunds_pending,
+            'done': obj.refunds_done,
+            'failed': obj.refunds_failed,
+        }
+    
+    def get_status(self, obj):
+        if obj.refunds_pending:
+            return 'RUNNING'
+        return 'FAILED' if obj.refunds_failed else 'DONE'
@@ -2,10 +2,18 @@
 Tests pour les modèles de terrains.
 """
 
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, RequestFactory, override_settings
+
 from apps.auth_app.models import Role, CustomUser
 from apps.sites.models import Site
-from apps.courts.models import Court, Equipment
+from apps.courts.models import Court, Equipment, CourtImage
+from apps.courts.serializers import CourtListSerializer, CourtListValuesSerializer
+from apps.courts.views import CourtViewSet, EquipmentViewSet
 
 
 class CourtTestCase(TestCase):
@@ -53,3 +61,157 @@ class CourtTestCase(TestCase):
     def test_court_string_representation(self):
         """Tester la représentation en string du terrain."""
         self.assertEqual(str(self.court), 'Terrain 1 (Tennis)')
+    
+    def test_values_serializer_matches_list_serializer(self):
+        """Tester que le sérialiseur `.values()` produit le même JSON."""
+        Court.objects.create(
+            name='Terrain 2',
+            sport_type='PADEL',
+            site=self.site,
+            price_per_hour=30.50
+        )
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        with override_settings(MEDIA_ROOT=media_root):
+            CourtImage.objects.create(
+                court=self.court,
+                image=SimpleUploadedFile('court.jpg', b'image', content_type='image/jpeg'),
+                is_primary=True
+            )
+        context = {'request': RequestFactory().get('/api/courts/courts/')}
+        courts = Court.objects.order_by('name')
+        
+        expected = CourtListSerializer(courts, many=True, context=context).data
+        serializer = CourtListValuesSerializer(context=context)
+        data = serializer.serialize(serializer.prepare(courts))
+        
+        self.assertEqual(data, [dict(item) for item in expected])
+        self.assertIsNotNone(data[0]['main_image'])
+        self.assertIsNone(data[1]['main_image'])
+    
+    def test_unpaginated_lists_are_streamed(self):
+        """Tester l'envoi en flux des listes lorsque la pagination est désactivée."""
+        Equipment.objects.create(name='Douches')
+        Equipment.objects.create(name='Vestiaires')
+        request = RequestFactory().get('/api/courts/equipments/')
+        
+        view = EquipmentViewSet.as_view({'get': 'list'}, pagination_class=None, stream_chunk_size=1)
+        response = view(request)
+        self.assertTrue(response.streaming)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['name'] for item in data], ['Douches', 'Vestiaires'])
+        
+        view = CourtViewSet.as_view({'get': 'list'}, pagination_class=None)
+        response = view(request)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['name'] for item in data], ['Terrain 1'])
+        self.assertEqual(data[0]['price_per_hour'], '25.00')
+    
+    def test_create_multiple_blocked_periods(self):
+        """Tester la création groupée (tout ou rien) de périodes bloquées."""
+        from datetime import timedelta
+        from django.utils import timezone
+        from rest_framework.test import APIClient
+        from apps.courts.models import BlockedPeriod
+        from apps.reservations.models import Reservation
+        
+        other = Court.objects.create(
+            name='Terrain 2', sport_type='TENNIS', site=self.site, price_per_hour=25.00
+        )
+        client = CustomUser.objects.create_user(
+            username='client', email='client@example.com', password='password',
+            role=Role.objects.create(name='CLIENT')
+        )
+        start = (timezone.now() + timedelta(days=1)).replace(microsecond=0)
+        reservation = Reservation.objects.create(
+            user=client, court=other,
+            start_datetime=start + timedelta(hours=2), end_datetime=start + timedelta(hours=3),
+            price_per_hour=25.00, total_amount=25.00, status='CONFIRMED'
+        )
+        api = APIClient()
+        api.force_authenticate(self.manager)
+        url = '/api/courts/blocked-periods/create_multiple/'
+        
+        def period(court, hours_from, hours_to):
+            return {
+                'court': court.id,
+                'start_datetime': (start + timedelta(hours=hours_from)).isoformat(),
+                'end_datetime': (start + timedelta(hours=hours_to)).isoformat(),
+                'reason': 'Maintenance',
+            }
+        
+        # Conflits: chevauchement dans le lot, réservation existante, dates inversées
+        response = api.post(url, [
+            period(self.court, 0, 2),
+            period(self.court, 1, 3),
+            period(other, 0, 4),
+            period(other, 5, 4),
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        results = response.json()['results']
+        self.assertEqual([item['status'] for item in results], ['valid', 'conflict', 'conflict', 'invalid'])
+        self.assertEqual(results[1]['conflicts'], [{'type': 'batch', 'index': 0}])
+        self.assertEqual(results[2]['conflicts'][0]['id'], reservation.id)
+        self.assertFalse(BlockedPeriod.objects.exists())
+        
+        # Lot valide: verrou, deux requêtes de conflits, insertion (+ savepoint)
+        with self.assertNumQueries(6):
+            response = api.post(url, [
+                period(self.court, 0, 2), period(self.court, 2, 3), period(other, 4, 6),
+            ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual(BlockedPeriod.objects.count(), 3)
+        
+        response = api.post(url, [period(other, 5, 7)], format='json')
+        self.assertEqual(response.json()['results'][0]['conflicts'][0]['type'], 'blocked_period')
+    
+    def test_recurring_block_expansion(self):
+        """Tester l'expansion paresseuse et mise en cache des blocages récurrents."""
+        from datetime import date, datetime, time, timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        from apps.courts.models import RecurringBlock
+        from apps.courts.recurrence import court_recurring_blocks, cache_key
+        
+        cache.clear()
+        # Un lundi sur deux, 8h-10h, sur tout le site
+        rule = RecurringBlock.objects.create(
+            site=self.site, day_of_week=0, start_time=time(8), end_time=time(10),
+            interval_weeks=2, starts_on=date(2030, 1, 1), reason='Nettoyage'
+        )
+        start = timezone.make_aware(datetime(2030, 1, 1))
+        end = timezone.make_aware(datetime(2030, 2, 1))
+        occurrences = court_recurring_blocks(self.court, start, end)
+        self.assertEqual(
+            [timezone.localtime(occurrence[0]).date() for occurrence in occurrences],
+            [date(2030, 1, 7), date(2030, 1, 21)]
+        )
+        self.assertIsNotNone(cache.get(cache_key(rule, 2030, 1)))
+        # Seul le mois consulté est développé
+        self.assertIsNone(cache.get(cache_key(rule, 2030, 2)))
+        
+        # Une règle modifiée change de version, donc de clé de cache
+        rule.start_time = time(9)
+        rule.save()
+        occurrences = court_recurring_blocks(self.court, start, end)
+        self.assertEqual(timezone.localtime(occurrences[0][0]).time(), time(9))
+        
+        monday = timezone.make_aware(datetime(2030, 1, 21, 9, 30))
+        response = self.client.get(
+            f'/api/courts/courts/{self.court.id}/availability/',
+            {'start': monday.isoformat(), 'end': (monday + timedelta(hours=1)).isoformat()}
+        )
+        self.assertFalse(response.json()['is_available'])
+        
+        # Dates sans décalage (format documenté): heure locale
+        response = self.client.get(
+            f'/api/courts/courts/{self.court.id}/availability/',
+            {'start': '2030-01-21T09:30:00', 'end': '2030-01-21T10:30:00'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['is_available'])
+        response = self.client.get(
+            f'/api/courts/courts/{self.court.id}/availability/', {'start': 'demain', 'end': '2030-01-21T10:30:00'}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -4,12 +4,17 @@ URLs pour la gestion des terrains.
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CourtViewSet, EquipmentViewSet, BlockedPeriodViewSet
+from .views import (
+    CourtViewSet, EquipmentViewSet, BlockedPeriodViewSet, RecurringBlockViewSet,
+    ClosureViewSet
+)
 
 router = DefaultRouter()
 router.register(r'courts', CourtViewSet, basename='court')
 router.register(r'equipments', EquipmentViewSet, basename='equipment')
 router.register(r'blocked-periods', BlockedPeriodViewSet, basename='blocked-period')
+router.register(r'recurring-blocks', RecurringBlockViewSet, basename='recurring-block')
+router.register(r'closures', ClosureViewSet, basename='closure')
 
 app_name = 'courts'
 
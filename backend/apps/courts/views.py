@@ -9,28 +9,40 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 
-from apps.courts.models import Court, Equipment, BlockedPeriod
+from django.db.models import Q
+
+from apps.courts.models import Court, Equipment, BlockedPeriod, RecurringBlock, Closure, Occupancy
 from apps.courts.serializers import (
     CourtSerializer,
     CourtDetailSerializer,
     CourtListSerializer,
+    CourtListValuesSerializer,
     EquipmentSerializer,
     BlockedPeriodSerializer,
-    BlockedPeriodCreateSerializer
+    BlockedPeriodCreateSerializer,
+    BlockedPeriodBulkItemSerializer,
+    RecurringBlockSerializer,
+    ClosureSerializer,
+    ClosureCreateSerializer
 )
+from apps.courts.blocking import create_blocked_periods, close_court
+from apps.courts.recurrence import court_recurring_blocks
+from apps.reservations.models import SharedSession
 from apps.core.permissions import IsManager, IsAdmin, IsSiteManager
+from apps.core.mixins import SparseFieldsMixin, ValuesListMixin, StreamingListMixin
 
 
-class EquipmentViewSet(viewsets.ReadOnlyModelViewSet):
+class EquipmentViewSet(SparseFieldsMixin, StreamingListMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les équipements."""
     queryset = Equipment.objects.all()
     serializer_class = EquipmentSerializer
     permission_classes = [AllowAny]
 
 
-class CourtViewSet(viewsets.ModelViewSet):
+class CourtViewSet(SparseFieldsMixin, ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet pour la gestion des terrains."""
     
+    values_serializer_class = CourtListValuesSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['sport_type', 'site', 'is_active']
     search_fields = ['name', 'description', 'site__name']
@@ -78,37 +90,61 @@ class CourtViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from django.utils.dateparse import parse_datetime
-        from apps.reservations.models import Reservation
-        
-        start_dt = parse_datetime(start)
-        end_dt = parse_datetime(end)
-        
-        # Vérifier les réservations qui se chevauchent
-        overlapping = Reservation.objects.filter(
-            court=court,
-            status__in=['CONFIRMED', 'PENDING'],
-            start_datetime__lt=end_dt,
-            end_datetime__gt=start_dt
-        ).exists()
+        from apps.core.utils import parse_aware_datetime
         
-        # Vérifier les périodes bloquées
-        blocked = court.blocked_periods.filter(
-            start_datetime__lt=end_dt,
-            end_datetime__gt=start_dt
-        ).exists()
+        start_dt = parse_aware_datetime(start)
+        end_dt = parse_aware_datetime(end)
+        if start_dt is None or end_dt is None:
+            return Response(
+                {'error': 'start et end doivent être des dates ISO 8601'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        is_available = not (overlapping or blocked)
+        # Réservations, périodes bloquées et holds: une seule requête de plage
+        sources = set(
+            Occupancy.objects.overlapping(court, start_dt, end_dt).values_list('source_type', flat=True)
+        )
         
-        return Response({
+        # Blocages récurrents, développés pour cette plage seulement
+        is_available = not (sources or court_recurring_blocks(court, start_dt, end_dt))
+        response = {
             'court_id': court.id,
             'is_available': is_available,
             'start': start,
             'end': end
-        })
+        }
+        
+        # Sessions partagées du créneau qui ont encore des places (compteurs)
+        if 'SESSION' in sources:
+            response['sessions'] = [
+                {'id': session_id, 'start': session_start, 'end': session_end, 'spots_left': spots_left}
+                for session_id, session_start, session_end, spots_left in SharedSession.objects.open_spots(
+                    court, start_dt, end_dt
+                )
+            ]
+        
+        return Response(response)
 
+    
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsManager | IsAdmin])
+    def close(self, request, pk=None):
+        """
+        Fermer le terrain sur une période: blocage, annulation des
+        réservations touchées et remboursements mis en file.
+        """
+        court = self.get_object()
+        serializer = ClosureCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        closure = close_court(
+            court, data['start_datetime'], data['end_datetime'], data['reason'], request.user
+        )
+        return Response(
+            ClosureSerializer(Closure.objects.with_progress().get(pk=closure.pk)).data,
+            status=status.HTTP_201_CREATED
+        )
 
-class BlockedPeriodViewSet(viewsets.ModelViewSet):
+class BlockedPeriodViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet pour les périodes bloquées."""
     
     filter_backends = [DjangoFilterBackend]
@@ -130,18 +166,73 @@ class BlockedPeriodViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def create_multiple(self, request):
-        """Créer plusieurs périodes bloquées à la fois."""
-        periods = request.data
-        created = []
+        """
+        Créer plusieurs périodes bloquées à la fois (tout ou rien).
         
-        for period_data in periods:
-            serializer = BlockedPeriodCreateSerializer(data=period_data)
+        Retourne un compte rendu par élément; si un élément est invalide ou
+        en conflit, aucune période n'est créée.
+        """
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {'error': 'Une liste de périodes est attendue'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        items = []
+        for period_data in request.data:
+            serializer = BlockedPeriodBulkItemSerializer(data=period_data)
             if serializer.is_valid():
-                created.append(serializer.save())
+                items.append((serializer.validated_data, None))
             else:
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+                items.append((None, serializer.errors))
         
+        user = request.user
+        if user.role.name == 'MANAGER':
+            courts = Court.objects.filter(site__manager=user)
+        elif user.role.name == 'ADMIN':
+            courts = Court.objects.all()
+        else:
+            courts = Court.objects.none()
+        
+        created, report = create_blocked_periods(items, courts)
         return Response(
-            BlockedPeriodSerializer(created, many=True).data,
-            status=status.HTTP_201_CREATED
+            {'created': len(created), 'results': report},
+            status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST
         )
+
+
+class RecurringBlockViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
+    """ViewSet pour les blocages récurrents d'un terrain ou d'un site."""
+    
+    serializer_class = RecurringBlockSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['court', 'site', 'day_of_week', 'is_active']
+    permission_classes = [IsAuthenticated, IsManager | IsAdmin]
+    
+    def get_queryset(self):
+        user = self.request.user
+        if user.role.name == 'MANAGER':
+            return RecurringBlock.objects.filter(
+                Q(court__site__manager=user) | Q(site__manager=user)
+            )
+        elif user.role.name == 'ADMIN':
+            return RecurringBlock.objects.all()
+        return RecurringBlock.objects.none()
+
+
+class ClosureViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """Fermetures de terrains et suivi de leurs remboursements."""
+    
+    serializer_class = ClosureSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['court']
+    permission_classes = [IsAuthenticated, IsManager | IsAdmin]
+    
+    def get_queryset(self):
+        user = self.request.user
+        queryset = Closure.objects.with_progress()
+        if user.role.name == 'MANAGER':
+            return queryset.filter(court__site__manager=user)
+        elif user.role.name == 'ADMIN':
+            return queryset
+        return queryset.none()
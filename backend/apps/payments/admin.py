@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Payment, Invoice
+from .models import (
+    Payment, Invoice, InvoiceSequence, Statement, SiteBalance, LedgerEntry, RefundTask,
+    WebhookEvent
+)
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
@@ -14,3 +17,47 @@ class InvoiceAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['invoice_number', 'payment__id']
     readonly_fields = ['invoice_number', 'created_at', 'updated_at']
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(admin.ModelAdmin):
+    list_display = ['year', 'month', 'last_number']
+    ordering = ['-year', '-month']
+
+@admin.register(Statement)
+class StatementAdmin(admin.ModelAdmin):
+    list_display = ['site', 'year', 'month', 'payment_count', 'net_amount', 'generated_at']
+    list_filter = ['year', 'month']
+    search_fields = ['site__name']
+    readonly_fields = ['generated_at']
+
+@admin.register(RefundTask)
+class RefundTaskAdmin(admin.ModelAdmin):
+    list_display = ['payment', 'closure', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['payment__id', 'error']
+    readonly_fields = ['created_at', 'processed_at']
+
+@admin.register(SiteBalance)
+class SiteBalanceAdmin(admin.ModelAdmin):
+    list_display = ['site', 'revenue', 'refunds', 'fees', 'balance', 'updated_at']
+    search_fields = ['site__name']
+    readonly_fields = ['revenue', 'refunds', 'fees', 'balance', 'entry_count', 'updated_at']
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['id', 'site', 'payment', 'entry_type', 'amount', 'balance_after', 'occurred_at']
+    list_filter = ['entry_type', 'occurred_at']
+    search_fields = ['site__name', 'payment__id']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['event_id']
+    readonly_fields = ['received_at', 'processed_at']
@@ -4,3 +4,6 @@ class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.payments'
     verbose_name = 'Paiements'
+
+    def ready(self):
+        from apps.payments import checks  # noqa: F401 (enregistrement des vérifications)
@@ -0,0 +1,299 @@
+"""
+Disjoncteur (circuit breaker) autour des appels au prestataire de paiement.
+
+Quand Stripe se dégrade, chaque requête attendrait son délai d'expiration
+et les workers seraient tous bloqués. Le disjoncteur compte les échecs de
+disponibilité (`GatewayUnavailable`: délais dépassés, erreurs réseau,
+erreurs 5xx); au-delà du seuil il s'ouvre et les appels échouent
+immédiatement (`CircuitOpenError`, réponse 503). Après le délai de
+récupération, un seul appel de test est autorisé (semi-ouvert): s'il
+réussit le disjoncteur se referme, sinon il se rouvre.
+
+Seules les réponses du prestataire comptent: une erreur fonctionnelle
+(`GatewayError`, ex. carte refusée) prouve qu'il répond et vaut un succès;
+toute autre exception (erreur de programmation, annulation) est neutre et
+libère simplement la sonde.
+
+La fenêtre n'est pas glissante: le compteur d'échecs est créé au premier
+échec avec une durée de vie de `failure_window` secondes, que les échecs
+suivants ne prolongent pas. Le disjoncteur s'ouvre donc quand le seuil est
+atteint avant l'expiration de ce compteur.
+
+L'état est conservé dans un cache partagé par tous les workers
+(`PAYMENT_BREAKER_CACHE`, alias `payments`; voir `apps.payments.checks`).
+Les compteurs reposent sur `cache.incr`, atomique sur Redis et Memcached;
+sur `DatabaseCache` ou `FileBasedCache` des incréments concurrents peuvent
+se perdre et le disjoncteur s'ouvrir un peu plus tard. Les latences des
+appels sont agrégées dans des histogrammes, également stockés dans le
+cache.
+"""
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from apps.payments.gateway import PaymentGateway, GatewayError, GatewayUnavailable
+
+CLOSED = 'CLOSED'
+OPEN = 'OPEN'
+HALF_OPEN = 'HALF_OPEN'
+
+# Bornes supérieures des seaux de l'histogramme, en millisecondes
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class CircuitOpenError(GatewayUnavailable):
+    """Appel refusé sans contacter le prestataire: disjoncteur ouvert."""
+
+    def __init__(self, retry_after):
+        super().__init__('Circuit ouvert')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Disjoncteur dont l'état est partagé via le cache."""
+
+    def __init__(self, name, failure_threshold=5, failure_window=30,
+                 recovery_timeout=30, probe_timeout=10, cache_alias='default'):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.recovery_timeout = recovery_timeout
+        self.probe_timeout = probe_timeout
+        self.cache = caches[cache_alias]
+        self.prefix = f'payments:breaker:{name}:'
+
+    @classmethod
+    def from_settings(cls, name='payment-gateway'):
+        return cls(
+            name,
+            failure_threshold=settings.PAYMENT_BREAKER_FAILURE_THRESHOLD,
+            failure_window=settings.PAYMENT_BREAKER_FAILURE_WINDOW,
+            recovery_timeout=settings.PAYMENT_BREAKER_RECOVERY_TIMEOUT,
+            probe_timeout=settings.PAYMENT_BREAKER_PROBE_TIMEOUT,
+            cache_alias=settings.PAYMENT_BREAKER_CACHE,
+        )
+
+    def _incr(self, key, delta=1, timeout=None):
+        # La durée de vie n'est fixée qu'à la création de la clé
+        try:
+            return self.cache.incr(self.prefix + key, delta)
+        except ValueError:
+            if self.cache.add(self.prefix + key, delta, timeout):
+                return delta
+            return self.cache.incr(self.prefix + key, delta)
+
+    def state(self):
+        opened_at = self.cache.get(self.prefix + 'opened_at')
+        if opened_at is None:
+            return CLOSED
+        if time.time() - opened_at < self.recovery_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def before_call(self):
+        """
+        Autoriser ou refuser un appel.
+
+        Retourne True si l'appel est la sonde du mode semi-ouvert.
+        """
+        opened_at = self.cache.get(self.prefix + 'opened_at')
+        if opened_at is None:
+            return False
+        remaining = self.recovery_timeout - (time.time() - opened_at)
+        if remaining > 0:
+            raise CircuitOpenError(int(remaining) + 1)
+        # Une seule sonde à la fois pour l'ensemble des workers
+        if not self.cache.add(self.prefix + 'probe', 1, self.probe_timeout):
+            raise CircuitOpenError(self.probe_timeout)
+        return True
+
+    def on_success(self, probe):
+        if probe:
+            self.cache.delete_many([
+                self.prefix + 'opened_at',
+                self.prefix + 'failures',
+                self.prefix + 'probe',
+            ])
+
+    def on_neutral(self, probe):
+        """Appel interrompu sans réponse du prestataire: ni succès ni échec."""
+        if probe:
+            self.cache.delete(self.prefix + 'probe')
+
+    def on_failure(self, probe):
+        if probe:
+            self.trip()
+            self.cache.delete(self.prefix + 'probe')
+            return
+        failures = self._incr('failures', timeout=self.failure_window)
+        if failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        """Ouvrir le disjoncteur."""
+        self.cache.set(self.prefix + 'opened_at', time.time(), None)
+        self.cache.delete(self.prefix + 'failures')
+        self._incr('opened_total')
+
+    def record_latency(self, operation, elapsed):
+        elapsed_ms = elapsed * 1000
+        bucket = next((str(le) for le in LATENCY_BUCKETS if elapsed_ms <= le), 'inf')
+        self._incr(f'latency:{operation}:{bucket}')
+        self._incr(f'latency:{operation}:sum_ms', int(round(elapsed_ms)))
+
+    def call(self, operation, func, *args, **kwargs):
+        probe = self.before_call()
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except GatewayUnavailable:
+            self.on_failure(probe)
+            raise
+        except GatewayError:
+            # Erreur fonctionnelle (carte refusée...): le prestataire a répondu
+            self.on_success(probe)
+            raise
+        except BaseException:
+            self.on_neutral(probe)
+            raise
+        else:
+            self.on_success(probe)
+            return result
+        finally:
+            self.record_latency(operation, time.perf_counter() - started)
+
+    async def acall(self, operation, func, *args, **kwargs):
+        probe = await sync_to_async(self.before_call)()
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except GatewayUnavailable:
+            await sync_to_async(self.on_failure)(probe)
+            raise
+        except GatewayError:
+            await sync_to_async(self.on_success)(probe)
+            raise
+        except BaseException:
+            await sync_to_async(self.on_neutral)(probe)
+            raise
+        else:
+            await sync_to_async(self.on_success)(probe)
+            return result
+        finally:
+            await sync_to_async(self.record_latency)(operation, time.perf_counter() - started)
+
+    def snapshot(self, operations=('create_intent', 'retrieve_intent', 'update_intent',
+                                'list_intents', 'refund')):
+        """État courant et histogrammes de latence (seaux cumulés)."""
+        keys = [self.prefix + key for key in ('opened_at', 'failures', 'opened_total')]
+        for operation in operations:
+            keys.extend(
+                f'{self.prefix}latency:{operation}:{bucket}'
+                for bucket in [*map(str, LATENCY_BUCKETS), 'inf', 'sum_ms']
+            )
+        values = self.cache.get_many(keys)
+
+        latency = {}
+        for operation in operations:
+            cumulative, buckets = 0, {}
+            for bucket in [*map(str, LATENCY_BUCKETS), 'inf']:
+                cumulative += values.get(f'{self.prefix}latency:{operation}:{bucket}', 0)
+                buckets[bucket] = cumulative
+            latency[operation] = {
+                'buckets': buckets,
+                'count': cumulative,
+                'sum_ms': values.get(f'{self.prefix}latency:{operation}:sum_ms', 0),
+            }
+        return {
+            'name': self.name,
+            'state': self.state(),
+            'failures': values.get(self.prefix + 'failures', 0),
+            'failure_threshold': self.failure_threshold,
+            'opened_at': values.get(self.prefix + 'opened_at'),
+            'opened_total': values.get(self.prefix + 'opened_total', 0),
+            'latency_ms': latency,
+        }
+
+
+def prometheus_metrics(snapshot):
+    """Exposition de `snapshot()` au format texte Prometheus."""
+    name = snapshot['name']
+    states = (CLOSED, HALF_OPEN, OPEN)
+    lines = [
+        '# TYPE payment_gateway_circuit_state gauge',
+        f'payment_gateway_circuit_state{{circuit="{name}"}} {states.index(snapshot["state"])}',
+        '# TYPE payment_gateway_circuit_opened_total counter',
+        f'payment_gateway_circuit_opened_total{{circuit="{name}"}} {snapshot["opened_total"]}',
+        '# TYPE payment_gateway_call_duration_seconds histogram',
+    ]
+    for operation, histogram in snapshot['latency_ms'].items():
+        labels = f'circuit="{name}",operation="{operation}"'
+        for bucket, count in histogram['buckets'].items():
+            le = '+Inf' if bucket == 'inf' else int(bucket) / 1000
+            lines.append(f'payment_gateway_call_duration_seconds_bucket{{{labels},le="{le}"}} {count}')
+        lines.append(f'payment_gateway_call_duration_seconds_sum{{{labels}}} {histogram["sum_ms"] / 1000}')
+        lines.append(f'payment_gateway_call_duration_seconds_count{{{labels}}} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class GuardedGateway(PaymentGateway):
+    """Passerelle protégée par un disjoncteur."""
+
+    def __init__(self, gateway, breaker):
+        self.gateway = gateway
+        self.breaker = breaker
+
+    def __getattr__(self, name):
+        # Méthodes propres à une passerelle (ex. `succeed` de l'émulateur)
+        return getattr(self.gateway, name)
+
+    def create_intent(self, amount, currency, description='', metadata=None):
+        return self.breaker.call(
+            'create_intent', self.gateway.create_intent,
+            amount, currency, description=description, metadata=metadata
+        )
+
+    def retrieve_intent(self, intent_id):
+        return self.breaker.call('retrieve_intent', self.gateway.retrieve_intent, intent_id)
+
+    def update_intent(self, intent_id, amount, currency):
+        return self.breaker.call(
+            'update_intent', self.gateway.update_intent, intent_id, amount, currency
+        )
+
+    def list_intents(self, created_gte, created_lt, starting_after=None, limit=100):
+        return self.breaker.call(
+            'list_intents', self.gateway.list_intents,
+            created_gte, created_lt, starting_after=starting_after, limit=limit
+        )
+
+    def refund(self, intent_id, idempotency_key=None):
+        return self.breaker.call(
+            'refund', self.gateway.refund, intent_id, idempotency_key=idempotency_key
+        )
+
+    def construct_event(self, payload, sig_header):
+        # Vérification locale de la signature, sans appel réseau
+        return self.gateway.construct_event(payload, sig_header)
+
+    async def acreate_intent(self, amount, currency, description='', metadata=None):
+        return await self.breaker.acall(
+            'create_intent', self.gateway.acreate_intent,
+            amount, currency, description=description, metadata=metadata
+        )
+
+    async def aretrieve_intent(self, intent_id):
+        return await self.breaker.acall('retrieve_intent', self.gateway.aretrieve_intent, intent_id)
+
+    async def aupdate_intent(self, intent_id, amount, currency):
+        return await self.breaker.acall(
+            'update_intent', self.gateway.aupdate_intent, intent_id, amount, currency
+        )
+
+    async def arefund(self, intent_id, idempotency_key=None):
+        return await self.breaker.acall(
+            'refund', self.gateway.arefund, intent_id, idempotency_key=idempotency_key
+        )
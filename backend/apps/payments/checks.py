@@ -0,0 +1,40 @@
+"""
+Vérifications de configuration des paiements (`manage.py check --deploy`).
+"""
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Caches propres à chaque processus: l'état du disjoncteur ne serait pas partagé
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# Caches partagés dont `incr` n'est pas atomique (lecture puis écriture)
+NON_ATOMIC_CACHE_BACKENDS = (
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_breaker_cache(app_configs, **kwargs):
+    """Le disjoncteur de paiement exige un cache partagé hors DEBUG."""
+    if settings.DEBUG:
+        return []
+    alias = settings.PAYMENT_BREAKER_CACHE
+    backend = settings.CACHES.get(alias, {}).get('BACKEND', '')
+    if backend in LOCAL_CACHE_BACKENDS:
+        return [Error(
+            f"Le cache '{alias}' du disjoncteur de paiement n'est pas partagé entre les workers ({backend}).",
+            hint="Configurer PAYMENT_CACHE_BACKEND (Redis ou Memcached).",
+            id='payments.E001',
+        )]
+    if backend in NON_ATOMIC_CACHE_BACKENDS:
+        return [Warning(
+            f"Le cache '{alias}' du disjoncteur de paiement n'a pas d'incrément atomique ({backend}): "
+            "des échecs concurrents peuvent ne pas être comptés.",
+            hint="Préférer Redis ou Memcached pour PAYMENT_CACHE_BACKEND.",
+            id='payments.W001',
+        )]
+    return []
@@ -0,0 +1,182 @@
+"""
+Émulateur Stripe en mémoire pour les tests de charge hors ligne.
+
+`EmulatedStripeGateway` implémente la même interface que `StripeGateway`
+sans aucun appel réseau. La latence et le taux d'échec sont configurables
+(`STRIPE_EMULATOR_LATENCY_MS`, `STRIPE_EMULATOR_JITTER_MS`,
+`STRIPE_EMULATOR_FAILURE_RATE`, `STRIPE_EMULATOR_TIMEOUT_RATE`) pour
+reproduire un Stripe lent ou dégradé. Les PaymentIntents sont conservés
+dans le cache Django afin d'être visibles de tous les workers lorsque le
+cache est partagé.
+
+Les webhooks sont signés comme le fait Stripe (`sign_payload`), ce qui
+permet de rejouer le parcours complet: création de l'intent, paiement
+(`succeed`), webhook et confirmation.
+"""
+
+import hashlib
+import hmac
+import json
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.payments.gateway import (
+    PaymentGateway,
+    Intent,
+    Refund,
+    GatewayError,
+    GatewayUnavailable,
+    construct_stripe_event,
+    to_minor_units,
+)
+
+CACHE_PREFIX = 'stripe-emulator:intent:'
+INDEX_KEY = 'stripe-emulator:intents'
+REFUND_KEY_PREFIX = 'stripe-emulator:refund:'
+CACHE_TIMEOUT = 24 * 3600
+
+
+class EmulatedStripeGateway(PaymentGateway):
+    """Passerelle factice à latence et pannes configurables."""
+
+    def __init__(self, latency_ms=None, jitter_ms=None, failure_rate=None,
+                 timeout_rate=None, auto_confirm=None, webhook_secret=None):
+        self.latency_ms = settings.STRIPE_EMULATOR_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = settings.STRIPE_EMULATOR_JITTER_MS if jitter_ms is None else jitter_ms
+        self.failure_rate = settings.STRIPE_EMULATOR_FAILURE_RATE if failure_rate is None else failure_rate
+        self.timeout_rate = settings.STRIPE_EMULATOR_TIMEOUT_RATE if timeout_rate is None else timeout_rate
+        self.auto_confirm = settings.STRIPE_EMULATOR_AUTO_CONFIRM if auto_confirm is None else auto_confirm
+        self.webhook_secret = webhook_secret or settings.STRIPE_WEBHOOK_SECRET
+        self.random = random.Random()
+
+    def _simulate_network(self):
+        delay = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+        draw = self.random.random()
+        if draw < self.timeout_rate:
+            # Un délai dépassé coûte le timeout de lecture complet
+            time.sleep(settings.PAYMENT_GATEWAY_READ_TIMEOUT)
+            raise GatewayUnavailable('Emulated timeout')
+        if delay:
+            time.sleep(delay / 1000)
+        if draw < self.timeout_rate + self.failure_rate:
+            raise GatewayError('Emulated API error')
+
+    def _store(self, intent):
+        cache.set(CACHE_PREFIX + intent.id, intent, CACHE_TIMEOUT)
+        index = cache.get(INDEX_KEY, [])
+        if intent.id not in index:
+            cache.set(INDEX_KEY, index + [intent.id], CACHE_TIMEOUT)
+        return intent
+
+    def _load(self, intent_id):
+        intent = cache.get(CACHE_PREFIX + intent_id)
+        if intent is None:
+            raise GatewayError(f'No such payment_intent: {intent_id}')
+        return intent
+
+    def create_intent(self, amount, currency, description='', metadata=None):
+        self._simulate_network()
+        intent_id = f'pi_emu_{uuid.uuid4().hex[:24]}'
+        return self._store(Intent(
+            id=intent_id,
+            status='succeeded' if self.auto_confirm else 'requires_payment_method',
+            amount=to_minor_units(amount),
+            currency=currency.lower(),
+            client_secret=f'{intent_id}_secret_{uuid.uuid4().hex[:16]}',
+            latest_charge=f'ch_emu_{uuid.uuid4().hex[:24]}' if self.auto_confirm else '',
+            metadata={key: str(value) for key, value in (metadata or {}).items()},
+            created=int(time.time()),
+        ))
+
+    def retrieve_intent(self, intent_id):
+        self._simulate_network()
+        return self._load(intent_id)
+
+    def list_intents(self, created_gte, created_lt, starting_after=None, limit=100):
+        self._simulate_network()
+        intents = [
+            intent for intent in cache.get_many(
+                [CACHE_PREFIX + intent_id for intent_id in cache.get(INDEX_KEY, [])]
+            ).values()
+            if created_gte <= intent.created < created_lt
+        ]
+        intents.sort(key=lambda intent: (intent.created, intent.id), reverse=True)
+        if starting_after:
+            ids = [intent.id for intent in intents]
+            intents = intents[ids.index(starting_after) + 1:] if starting_after in ids else []
+        return intents[:limit], len(intents) > limit
+
+    def update_intent(self, intent_id, amount, currency):
+        self._simulate_network()
+        intent = self._load(intent_id)
+        if intent.status not in ('requires_payment_method', 'requires_confirmation'):
+            raise GatewayError(f'PaymentIntent {intent_id} cannot be updated ({intent.status})')
+        intent.amount = to_minor_units(amount)
+        intent.currency = currency.lower()
+        return self._store(intent)
+
+    def refund(self, intent_id, idempotency_key=None):
+        self._simulate_network()
+        if idempotency_key:
+            # Même clé: même remboursement, comme chez Stripe
+            refund = cache.get(REFUND_KEY_PREFIX + idempotency_key)
+            if refund is not None:
+                return refund
+        intent = self._load(intent_id)
+        if intent.status != 'succeeded':
+            raise GatewayError(f'PaymentIntent {intent_id} has not succeeded')
+        refund = Refund(
+            id=f're_emu_{uuid.uuid4().hex[:24]}',
+            status='succeeded',
+            payment_intent=intent_id,
+            amount=intent.amount,
+        )
+        if idempotency_key:
+            cache.set(REFUND_KEY_PREFIX + idempotency_key, refund, CACHE_TIMEOUT)
+        return refund
+
+    def succeed(self, intent_id):
+        """Simuler le paiement du client et renvoyer l'événement webhook."""
+        intent = self._load(intent_id)
+        intent.status = 'succeeded'
+        intent.latest_charge = intent.latest_charge or f'ch_emu_{uuid.uuid4().hex[:24]}'
+        self._store(intent)
+        return self.build_event('payment_intent.succeeded', intent)
+
+    def build_event(self, event_type, intent):
+        return {
+            'id': f'evt_emu_{uuid.uuid4().hex[:24]}',
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'data': {'object': {
+                'id': intent.id,
+                'object': 'payment_intent',
+                'status': intent.status,
+                'amount': intent.amount,
+                'currency': intent.currency,
+                'latest_charge': intent.latest_charge,
+                'metadata': intent.metadata,
+            }},
+        }
+
+    def sign_payload(self, payload, timestamp=None):
+        """En-tête `Stripe-Signature` valide pour `payload`."""
+        if isinstance(payload, dict):
+            payload = json.dumps(payload)
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        timestamp = int(timestamp or time.time())
+        signature = hmac.new(
+            self.webhook_secret.encode('utf-8'),
+            f'{timestamp}.{payload}'.encode('utf-8'),
+            hashlib.sha256
+        ).hexdigest()
+        return f't={timestamp},v1={signature}'
+
+    def construct_event(self, payload, sig_header):
+        return construct_stripe_event(payload, sig_header, self.webhook_secret)
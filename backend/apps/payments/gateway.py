@@ -0,0 +1,297 @@
+"""
+Passerelle vers le prestataire de paiement.
+
+Les vues ne parlent plus directement au SDK Stripe: elles passent par une
+`PaymentGateway`, choisie dans les settings (`PAYMENT_GATEWAY`). La
+passerelle Stripe réutilise un pool de connexions HTTP par processus et
+impose des délais stricts à chaque appel, pour qu'une réponse lente de
+Stripe ne bloque pas un worker pendant des secondes. Chaque méthode a une
+variante asynchrone (`a<nom>`) utilisable depuis ASGI.
+
+`get_gateway()` renvoie la passerelle enveloppée dans un disjoncteur
+(voir `apps.payments.breaker`).
+"""
+
+import logging
+from dataclasses import dataclass, field
+
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """Erreur renvoyée par le prestataire de paiement."""
+
+
+class GatewayUnavailable(GatewayError):
+    """Prestataire injoignable ou délai dépassé."""
+
+
+class InvalidSignature(GatewayError):
+    """Signature de webhook invalide."""
+
+
+@dataclass
+class Intent:
+    """Vue simplifiée d'un PaymentIntent (montant en centimes)."""
+
+    id: str
+    status: str
+    amount: int
+    currency: str
+    client_secret: str = ''
+    latest_charge: str = ''
+    metadata: dict = field(default_factory=dict)
+    created: int = 0
+
+
+@dataclass
+class Refund:
+    id: str
+    status: str
+    payment_intent: str
+    amount: int = 0
+
+
+def to_minor_units(amount):
+    """Convertir un montant décimal en centimes."""
+    return int((amount * 100).to_integral_value())
+
+
+class PaymentGateway:
+    """
+    Interface commune des passerelles de paiement.
+
+    Les variantes asynchrones par défaut exécutent la méthode synchrone dans
+    un thread; les sous-classes peuvent fournir une implémentation native.
+    """
+
+    def create_intent(self, amount, currency, description='', metadata=None):
+        raise NotImplementedError
+
+    def retrieve_intent(self, intent_id):
+        raise NotImplementedError
+
+    def update_intent(self, intent_id, amount, currency):
+        raise NotImplementedError
+
+    def list_intents(self, created_gte, created_lt, starting_after=None, limit=100):
+        """
+        Une page d'intents créés dans `[created_gte, created_lt[` (timestamps),
+        du plus récent au plus ancien. Retourne `(intents, has_more)`.
+        """
+        raise NotImplementedError
+
+    def refund(self, intent_id, idempotency_key=None):
+        """
+        Rembourser un intent. Deux appels avec la même `idempotency_key`
+        ne produisent qu'un seul remboursement.
+        """
+        raise NotImplementedError
+
+    def construct_event(self, payload, sig_header):
+        raise NotImplementedError
+
+    async def acreate_intent(self, amount, currency, description='', metadata=None):
+        return await sync_to_async(self.create_intent, thread_sensitive=False)(
+            amount, currency, description=description, metadata=metadata
+        )
+
+    async def aretrieve_intent(self, intent_id):
+        return await sync_to_async(self.retrieve_intent, thread_sensitive=False)(intent_id)
+
+    async def aupdate_intent(self, intent_id, amount, currency):
+        return await sync_to_async(self.update_intent, thread_sensitive=False)(
+            intent_id, amount, currency
+        )
+
+    async def arefund(self, intent_id, idempotency_key=None):
+        return await sync_to_async(self.refund, thread_sensitive=False)(
+            intent_id, idempotency_key=idempotency_key
+        )
+
+
+def construct_stripe_event(payload, sig_header, secret):
+    """Vérifier la signature d'un webhook Stripe (HMAC local, sans réseau)."""
+    try:
+        return stripe.Webhook.construct_event(payload, sig_header, secret)
+    except ValueError as e:
+        raise GatewayError('Invalid payload') from e
+    except stripe.error.SignatureVerificationError as e:
+        raise InvalidSignature('Invalid signature') from e
+
+
+def _intent_from_stripe(intent):
+    latest_charge = intent.get('latest_charge') or ''
+    if not isinstance(latest_charge, str):
+        latest_charge = latest_charge.get('id', '')
+    return Intent(
+        id=intent['id'],
+        status=intent['status'],
+        amount=intent['amount'],
+        currency=intent['currency'],
+        client_secret=intent.get('client_secret') or '',
+        latest_charge=latest_charge,
+        metadata=dict(intent.get('metadata') or {}),
+        created=intent.get('created') or 0,
+    )
+
+
+def _refund_from_stripe(refund):
+    return Refund(
+        id=refund['id'],
+        status=refund['status'],
+        payment_intent=refund.get('payment_intent') or '',
+        amount=refund.get('amount') or 0,
+    )
+
+
+class StripeGateway(PaymentGateway):
+    """Passerelle Stripe avec connexions poolées et délais stricts."""
+
+    def __init__(self, api_key=None, webhook_secret=None, timeout=None, max_retries=None, pool_size=None):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.webhook_secret = webhook_secret or settings.STRIPE_WEBHOOK_SECRET
+        timeout = timeout or (
+            settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT,
+            settings.PAYMENT_GATEWAY_READ_TIMEOUT
+        )
+        pool_size = pool_size or settings.PAYMENT_GATEWAY_POOL_SIZE
+
+        # Un pool de connexions keep-alive par processus
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+
+        async_client = None
+        try:
+            async_client = stripe.HTTPXClient(timeout=sum(timeout))
+        except ImportError:
+            logger.info("httpx non installé: appels Stripe asynchrones exécutés dans un thread")
+
+        self.native_async = async_client is not None
+        self.client = stripe.StripeClient(
+            api_key or settings.STRIPE_SECRET_KEY,
+            max_network_retries=(
+                settings.PAYMENT_GATEWAY_MAX_RETRIES if max_retries is None else max_retries
+            ),
+            http_client=stripe.RequestsClient(
+                timeout=timeout,
+                session=session,
+                async_fallback_client=async_client
+            ),
+        )
+
+    def _call(self, func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (stripe.error.APIConnectionError, stripe.error.APIError) as e:
+            # Réseau, délai dépassé ou erreur 5xx côté Stripe
+            raise GatewayUnavailable(str(e)) from e
+        except stripe.error.StripeError as e:
+            raise GatewayError(str(e)) from e
+
+    async def _acall(self, func, *args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except (stripe.error.APIConnectionError, stripe.error.APIError) as e:
+            # Réseau, délai dépassé ou erreur 5xx côté Stripe
+            raise GatewayUnavailable(str(e)) from e
+        except stripe.error.StripeError as e:
+            raise GatewayError(str(e)) from e
+
+    def _intent_params(self, amount, currency, description, metadata):
+        return {
+            'amount': to_minor_units(amount),
+            'currency': currency.lower(),
+            'description': description,
+            'metadata': {key: str(value) for key, value in (metadata or {}).items()},
+        }
+
+    def create_intent(self, amount, currency, description='', metadata=None):
+        params = self._intent_params(amount, currency, description, metadata)
+        return _intent_from_stripe(self._call(self.client.v1.payment_intents.create, params))
+
+    def retrieve_intent(self, intent_id):
+        return _intent_from_stripe(self._call(self.client.v1.payment_intents.retrieve, intent_id))
+
+    def update_intent(self, intent_id, amount, currency):
+        params = {'amount': to_minor_units(amount), 'currency': currency.lower()}
+        return _intent_from_stripe(
+            self._call(self.client.v1.payment_intents.update, intent_id, params)
+        )
+
+    def list_intents(self, created_gte, created_lt, starting_after=None, limit=100):
+        params = {'created': {'gte': created_gte, 'lt': created_lt}, 'limit': limit}
+        if starting_after:
+            params['starting_after'] = starting_after
+        page = self._call(self.client.v1.payment_intents.list, params)
+        return [_intent_from_stripe(intent) for intent in page.data], page.has_more
+
+    def refund(self, intent_id, idempotency_key=None):
+        params = {'payment_intent': intent_id}
+        options = {'idempotency_key': idempotency_key} if idempotency_key else None
+        return _refund_from_stripe(self._call(self.client.v1.refunds.create, params, options))
+
+    def construct_event(self, payload, sig_header):
+        return construct_stripe_event(payload, sig_header, self.webhook_secret)
+
+    async def acreate_intent(self, amount, currency, description='', metadata=None):
+        if not self.native_async:
+            return await super().acreate_intent(amount, currency, description, metadata)
+        params = self._intent_params(amount, currency, description, metadata)
+        return _intent_from_stripe(
+            await self._acall(self.client.v1.payment_intents.create_async, params)
+        )
+
+    async def aretrieve_intent(self, intent_id):
+        if not self.native_async:
+            return await super().aretrieve_intent(intent_id)
+        return _intent_from_stripe(
+            await self._acall(self.client.v1.payment_intents.retrieve_async, intent_id)
+        )
+
+    async def arefund(self, intent_id, idempotency_key=None):
+        if not self.native_async:
+            return await super().arefund(intent_id, idempotency_key)
+        params = {'payment_intent': intent_id}
+        options = {'idempotency_key': idempotency_key} if idempotency_key else None
+        return _refund_from_stripe(
+            await self._acall(self.client.v1.refunds.create_async, params, options)
+        )
+
+
+_gateway = None
+
+
+def get_gateway():
+    """Passerelle configurée (`PAYMENT_GATEWAY`), une instance par processus."""
+    from apps.payments.breaker import CircuitBreaker, GuardedGateway
+    
+    global _gateway
+    if _gateway is None:
+        _gateway = GuardedGateway(
+            import_string(settings.PAYMENT_GATEWAY)(),
+            CircuitBreaker.from_settings()
+        )
+    return _gateway
+
+
+def reset_gateway():
+    """Oublier l'instance courante (changement de settings, tests)."""
+    global _gateway
+    _gateway = None
+
+
+@receiver(setting_changed)
+def _reset_on_setting_changed(setting, **kwargs):
+    if setting.startswith(('PAYMENT_GATEWAY', 'PAYMENT_BREAKER', 'STRIPE_', 'CACHES')):
+        reset_gateway()
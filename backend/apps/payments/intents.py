@@ -0,0 +1,119 @@
+"""
+Réutilisation des PaymentIntents ouverts.
+
+Un paiement en attente garde un seul PaymentIntent: à chaque rechargement
+de la page de paiement, le client secret est relu depuis le cache local
+(durée `PAYMENT_INTENT_CACHE_TTL`), puis depuis `Payment.metadata`, sans
+appel à Stripe tant que le montant et la devise sont inchangés. Si l'un
+des deux a changé, l'intent existant est mis à jour. Si la mise à jour est
+refusée, l'intent est relu chez le prestataire: un nouvel intent n'est
+créé que s'il est annulé ou sans moyen de paiement; un intent réglé est
+enregistré (paiement, réservation, facture) et un intent en cours de
+traitement est conservé, les deux signalés par `IntentConflict`.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.payments.gateway import get_gateway, to_minor_units, Intent, GatewayError, GatewayUnavailable
+from apps.payments.models import Payment
+from apps.payments.webhooks import settle_succeeded
+
+CACHE_PREFIX = 'payments:intent:'
+METADATA_KEY = 'stripe_intent'
+# Statuts pour lesquels l'intent refusé peut être remplacé par un nouveau
+REPLACEABLE_STATUSES = ('canceled', 'requires_payment_method')
+
+
+class IntentConflict(Exception):
+    """L'intent du paiement ne peut être ni modifié ni remplacé."""
+
+    def __init__(self, message, intent):
+        super().__init__(message)
+        self.intent = intent
+
+
+def _cached_intent(payment):
+    """
+    Données de l'intent ouvert connu pour ce paiement (cache puis metadata).
+
+    Le statut n'est pas conservé: seul le prestataire le connaît.
+    """
+    data = cache.get(f'{CACHE_PREFIX}{payment.id}') or (payment.metadata or {}).get(METADATA_KEY)
+    if not data or data.get('id') != payment.stripe_payment_intent_id:
+        return None
+    return data
+
+
+def _remember(payment, intent):
+    data = {
+        'id': intent.id,
+        'client_secret': intent.client_secret,
+        'amount': intent.amount,
+        'currency': intent.currency,
+    }
+    cache.set(f'{CACHE_PREFIX}{payment.id}', data, settings.PAYMENT_INTENT_CACHE_TTL)
+
+    metadata = dict(payment.metadata or {})
+    if metadata.get(METADATA_KEY) != data or payment.stripe_payment_intent_id != intent.id:
+        metadata[METADATA_KEY] = data
+        payment.metadata = metadata
+        payment.stripe_payment_intent_id = intent.id
+        payment.save(update_fields=['stripe_payment_intent_id', 'metadata', 'updated_at'])
+
+
+def open_intent(payment, description='', metadata=None):
+    """
+    PaymentIntent ouvert pour `payment`, créé ou mis à jour si nécessaire.
+
+    Retourne `(intent, created)`; l'intent relu du cache n'a pas de statut.
+    Lève `IntentConflict` si l'intent existant est réglé ou en cours.
+    """
+    gateway = get_gateway()
+    data = _cached_intent(payment)
+    if data is not None:
+        if (data['amount'] == to_minor_units(payment.amount)
+                and data['currency'] == payment.currency.lower()):
+            # Même montant: aucun appel au prestataire
+            intent = Intent(status='', **data)
+            _remember(payment, intent)
+            return intent, False
+        try:
+            updated = gateway.update_intent(data['id'], payment.amount, payment.currency)
+        except GatewayUnavailable:
+            raise
+        except GatewayError:
+            # Mise à jour refusée: l'état réel de l'intent décide de la suite
+            updated = None
+            _resolve_refused(payment, gateway.retrieve_intent(data['id']))
+        if updated is not None:
+            updated.client_secret = updated.client_secret or data['client_secret']
+            _remember(payment, updated)
+            return updated, False
+
+    intent = gateway.create_intent(
+        payment.amount,
+        payment.currency,
+        description=description,
+        metadata=metadata
+    )
+    _remember(payment, intent)
+    return intent, True
+
+
+def _resolve_refused(payment, intent):
+    """
+    Traiter un intent dont la mise à jour a été refusée.
+
+    Ne retourne que si l'intent peut être remplacé par un nouveau.
+    """
+    if intent.status in REPLACEABLE_STATUSES:
+        return
+    if intent.status == 'succeeded':
+        # Client déjà débité: enregistrer le règlement plutôt que de le refaire
+        with transaction.atomic():
+            Payment.objects.select_for_update().filter(pk=payment.pk).first()
+            settle_succeeded({intent.id: intent.latest_charge})
+        raise IntentConflict('Ce paiement a déjà été réglé', intent)
+    raise IntentConflict('Un paiement est déjà en cours pour cette réservation', intent)
@@ -0,0 +1,88 @@
+"""
+Grand livre des paiements.
+
+Les écritures sont ajoutées par lots: les soldes des sites concernés sont
+verrouillés (toujours dans le même ordre), les écritures déjà présentes
+sont écartées, puis les nouvelles sont insérées en une requête et les
+soldes mis à jour de façon incrémentale en une autre. Le solde d'un site
+se lit ainsi sur une seule ligne (`SiteBalance`), et chaque écriture
+conserve le solde après application pour l'audit.
+"""
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.payments.models import Payment, LedgerEntry, SiteBalance
+
+BALANCE_FIELDS = {'CHARGE': 'revenue', 'FEE': 'fees', 'REFUND': 'refunds'}
+
+
+def entry_amount(payment, entry_type):
+    """Montant signé d'une écriture."""
+    amount = Decimal(str(payment.amount))
+    if entry_type == 'CHARGE':
+        return amount
+    if entry_type == 'FEE':
+        return -Payment.processing_fee(amount)
+    return -amount
+
+
+def post_entries(payments, entry_types):
+    """Ajouter les écritures `entry_types` manquantes d'un lot de paiements."""
+    payments = [payment for payment in payments if payment.pk]
+    if not payments:
+        return []
+    payment_ids = [payment.pk for payment in payments]
+    now = timezone.now()
+    
+    with transaction.atomic():
+        sites = dict(
+            Payment.objects.filter(id__in=payment_ids)
+            .values_list('id', 'reservation__court__site_id')
+        )
+        site_ids = sorted(set(sites.values()))
+        SiteBalance.objects.bulk_create(
+            [SiteBalance(site_id=site_id) for site_id in site_ids],
+            ignore_conflicts=True
+        )
+        balances = {
+            balance.site_id: balance
+            for balance in SiteBalance.objects.select_for_update()
+            .filter(site_id__in=site_ids).order_by('site_id')
+        }
+        existing = set(
+            LedgerEntry.objects.filter(payment_id__in=payment_ids, entry_type__in=entry_types)
+            .values_list('payment_id', 'entry_type')
+        )
+        
+        entries, changed = [], {}
+        for payment in payments:
+            balance = balances[sites[payment.pk]]
+            for entry_type in entry_types:
+                if (payment.pk, entry_type) in existing:
+                    continue
+                amount = entry_amount(payment, entry_type)
+                field = BALANCE_FIELDS[entry_type]
+                setattr(balance, field, getattr(balance, field) + abs(amount))
+                balance.balance += amount
+                balance.entry_count += 1
+                balance.updated_at = now
+                changed[balance.site_id] = balance
+                entries.append(LedgerEntry(
+                    site_id=balance.site_id,
+                    payment=payment,
+                    entry_type=entry_type,
+                    amount=amount,
+                    currency=payment.currency,
+                    balance_after=balance.balance,
+                    occurred_at=(payment.paid_at or now) if entry_type != 'REFUND' else now,
+                ))
+        
+        LedgerEntry.objects.bulk_create(entries)
+        SiteBalance.objects.bulk_update(
+            changed.values(),
+            ['revenue', 'refunds', 'fees', 'balance', 'entry_count', 'updated_at']
+        )
+    return entries
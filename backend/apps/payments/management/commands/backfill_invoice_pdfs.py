@@ -0,0 +1,41 @@
+"""
+Génération des PDF manquants pour les factures existantes.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.payments.models import Invoice, InvoiceRenderTask
+
+
+class Command(BaseCommand):
+    help = 'Met en file les factures sans PDF puis les génère en parallèle'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        missing = Invoice.objects.filter(pdf_file='')
+        # Tâches terminées, abandonnées ou au bail expiré: les relancer. Une
+        # tâche dont le bail court est tenue par un worker: ne pas y toucher
+        expired = timezone.now() - timedelta(seconds=settings.INVOICE_RENDER_LEASE)
+        reset = InvoiceRenderTask.objects.filter(
+            Q(status__in=['DONE', 'FAILED']) | Q(status='IN_PROGRESS', claimed_at__lt=expired),
+            invoice__in=missing.values('id'),
+        ).update(status='PENDING', attempts=0, error='', claimed_at=None)
+        created = InvoiceRenderTask.enqueue(
+            missing.filter(render_task__isnull=True).values_list('id', flat=True).iterator()
+        )
+        self.stdout.write(f'{len(created) + reset} facture(s) mise(s) en file')
+
+        call_command(
+            'render_invoices', once=True,
+            processes=options['processes'], batch_size=options['batch_size'],
+            stdout=self.stdout
+        )
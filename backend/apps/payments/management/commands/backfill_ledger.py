@@ -0,0 +1,28 @@
+"""
+Reprise du grand livre à partir des paiements existants.
+"""
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.models import Payment, LedgerEntry
+
+
+class Command(BaseCommand):
+    help = 'Crée les écritures manquantes des paiements réussis ou remboursés'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = Payment.objects.filter(status__in=['SUCCESS', 'REFUNDED']).order_by('id')
+        total, last_id = 0, 0
+        while True:
+            payments = list(queryset.filter(id__gt=last_id)[:options['batch_size']])
+            if not payments:
+                break
+            last_id = payments[-1].id
+            total += len(LedgerEntry.record_charges(payments))
+            total += len(LedgerEntry.record_refunds(
+                [payment for payment in payments if payment.status == 'REFUNDED']
+            ))
+        self.stdout.write(self.style.SUCCESS(f'{total} écriture(s) créée(s)'))
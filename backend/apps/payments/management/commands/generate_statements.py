@@ -0,0 +1,50 @@
+"""
+Génération des relevés mensuels des sites.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.payments.rendering import create_pool
+from apps.payments.statements import generate_statements
+from apps.sites.models import Site
+
+
+class Command(BaseCommand):
+    help = 'Génère les relevés mensuels (paiements, remboursements, frais) de chaque site'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Mois au format AAAA-MM (mois précédent par défaut)')
+        parser.add_argument('--site', type=int, action='append', dest='sites',
+                            help='Limiter à un site (répétable)')
+        parser.add_argument('--processes', type=int, default=4,
+                            help='Processus de génération (0: dans le processus courant)')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                year, month = map(int, options['month'].split('-'))
+            except ValueError:
+                raise CommandError('Format de mois attendu: AAAA-MM')
+            if not 1 <= month <= 12 or year < 1:
+                raise CommandError(f'Mois invalide: {options["month"]}')
+        else:
+            last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+            year, month = last_month.year, last_month.month
+
+        sites = Site.objects.order_by('id')
+        if options['sites']:
+            sites = sites.filter(id__in=options['sites'])
+        site_ids = list(sites.values_list('id', flat=True))
+
+        pool = create_pool(options['processes'])
+        try:
+            statements = generate_statements(site_ids, year, month, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(statements)} relevé(s) généré(s) pour {year}-{month:02d}'
+        ))
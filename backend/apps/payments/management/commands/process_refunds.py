@@ -0,0 +1,36 @@
+"""
+Worker des remboursements en file.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.refunds import process_refunds
+
+
+class Command(BaseCommand):
+    help = 'Effectue par lots les remboursements en attente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Appels simultanés au prestataire')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Appels par seconde (PAYMENT_GATEWAY_RATE_LIMIT par défaut)')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Pause (secondes) quand la file est vide')
+        parser.add_argument('--once', action='store_true',
+                            help='Vider la file puis s\'arrêter')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = process_refunds(options['batch_size'], options['workers'], options['rate'])
+            total += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'{total} remboursement(s) traité(s)'))
@@ -0,0 +1,32 @@
+"""
+Worker de traitement des webhooks Stripe.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Traite par lots les webhooks Stripe en attente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Pause (secondes) quand la boîte est vide')
+        parser.add_argument('--once', action='store_true',
+                            help='Vider la boîte puis s\'arrêter')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            count = process_pending_events(options['batch_size'])
+            total += count
+            if count:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'{total} événement(s) traité(s)'))
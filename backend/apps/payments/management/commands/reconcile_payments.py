@@ -0,0 +1,62 @@
+"""
+Rapprochement des paiements avec le prestataire et rapport des écarts.
+"""
+
+import csv
+from collections import Counter
+from dataclasses import asdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.payments.reconciliation import reconcile, REPORT_FIELDS
+
+
+class Command(BaseCommand):
+    help = 'Rapproche les paiements PENDING/SUCCESS avec le prestataire de paiement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7,
+                            help='Paiements créés depuis N jours')
+        parser.add_argument('--page-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Appels par seconde (PAYMENT_GATEWAY_RATE_LIMIT par défaut)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Signaler les écarts sans les corriger')
+        parser.add_argument('--report', default='-',
+                            help='Fichier CSV du rapport ("-" pour la sortie standard)')
+
+    def handle(self, *args, **options):
+        mismatches, checked = reconcile(
+            timezone.now() - timedelta(days=options['days']),
+            page_size=options['page_size'],
+            workers=options['workers'],
+            rate=options['rate'],
+            dry_run=options['dry_run'],
+        )
+
+        if options['report'] == '-':
+            self.write_report(mismatches, self.stdout)
+        else:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as report:
+                self.write_report(mismatches, report)
+
+        corrected = sum(1 for mismatch in mismatches if mismatch.action)
+        summary = ', '.join(f'{kind}: {count}' for kind, count in Counter(
+            mismatch.kind for mismatch in mismatches
+        ).items())
+        self.stderr.write(
+            f'{checked} paiement(s) vérifié(s), {len(mismatches)} écart(s)'
+            + (f' ({summary})' if summary else '')
+        )
+        if corrected:
+            verb = 'à corriger' if options['dry_run'] else 'corrigé(s)'
+            self.stderr.write(self.style.SUCCESS(f'{corrected} écart(s) {verb}'))
+
+    def write_report(self, mismatches, stream):
+        writer = csv.DictWriter(stream, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for mismatch in mismatches:
+            writer.writerow(asdict(mismatch))
@@ -0,0 +1,39 @@
+"""
+Worker de rendu des factures PDF.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.payments.rendering import create_pool, render_pending
+
+
+class Command(BaseCommand):
+    help = 'Génère en arrière-plan les PDF des factures en attente'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2,
+                            help='Processus de rendu (0: dans le processus courant)')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Pause (secondes) quand la file est vide')
+        parser.add_argument('--once', action='store_true',
+                            help='Vider la file puis s\'arrêter')
+
+    def handle(self, *args, **options):
+        pool = create_pool(options['processes'])
+        total = 0
+        try:
+            while True:
+                count = render_pending(options['batch_size'], pool)
+                total += count
+                if count:
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'{total} facture(s) traitée(s)'))
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:08
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Reprendre la numérotation à partir des factures existantes."""
+    Invoice = apps.get_model('payments', 'Invoice')
+    InvoiceSequence = apps.get_model('payments', 'InvoiceSequence')
+    last_numbers = {}
+    for number in Invoice.objects.values_list('invoice_number', flat=True).iterator():
+        try:
+            _, year, month, sequence = number.split('-')
+            key = (int(year), int(month))
+            last_numbers[key] = max(last_numbers.get(key, 0), int(sequence))
+        except ValueError:
+            continue
+    InvoiceSequence.objects.bulk_create([
+        InvoiceSequence(year=year, month=month, last_number=last_number)
+        for (year, month), last_number in last_numbers.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_webhookevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('last_number', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Séquence de factures',
+                'verbose_name_plural': 'Séquences de factures',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='invoicesequence',
+            constraint=models.UniqueConstraint(fields=('year', 'month'), name='unique_invoice_sequence_month'),
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0003_alter_openinghours_options_siteimage_description'),
+        ('payments', '0004_invoicerendertask'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('file', models.FileField(blank=True, upload_to='statements/')),
+                ('payment_count', models.PositiveIntegerField(default=0)),
+                ('refund_count', models.PositiveIntegerField(default=0)),
+                ('gross_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('refund_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fee_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('net_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('generated_at', models.DateTimeField(auto_now=True)),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='sites.site')),
+            ],
+            options={
+                'verbose_name': 'Relevé mensuel',
+                'verbose_name_plural': 'Relevés mensuels',
+                'ordering': ['-year', '-month', 'site'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='statement',
+            constraint=models.UniqueConstraint(fields=('site', 'year', 'month'), name='unique_site_statement_month'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0003_alter_openinghours_options_siteimage_description'),
+        ('payments', '0005_statement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('refunds', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fees', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('site', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='balance', to='sites.site')),
+            ],
+            options={
+                'verbose_name': 'Solde de site',
+                'verbose_name_plural': 'Soldes de sites',
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('CHARGE', 'Encaissement'), ('FEE', 'Frais'), ('REFUND', 'Remboursement')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('currency', models.CharField(default='EUR', max_length=3)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('occurred_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='payments.payment')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='sites.site')),
+            ],
+            options={
+                'verbose_name': 'Écriture comptable',
+                'verbose_name_plural': 'Écritures comptables',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['site', 'occurred_at'], name='payments_le_site_id_dafa8d_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerentry',
+            constraint=models.UniqueConstraint(fields=('payment', 'entry_type'), name='unique_ledger_payment_entry'),
+        ),
+    ]
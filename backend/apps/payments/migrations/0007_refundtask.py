@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courts', '0003_closure'),
+        ('payments', '0006_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RefundTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('DONE', 'Terminé'), ('FAILED', 'Échoué')], default='PENDING', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('closure', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='refund_tasks', to='courts.closure')),
+                ('payment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='refund_task', to='payments.payment')),
+            ],
+            options={
+                'verbose_name': 'Remboursement en file',
+                'verbose_name_plural': 'Remboursements en file',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='payments_re_status_827f9a_idx')],
+            },
+        ),
+    ]
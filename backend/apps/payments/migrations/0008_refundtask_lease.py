@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0007_refundtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refundtask',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='refundtask',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'En attente'), ('IN_PROGRESS', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échoué')], default='PENDING', max_length=20),
+        ),
+    ]
@@ -2,12 +2,14 @@
 Models pour la gestion des paiements.
 """
 
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from apps.reservations.models import Reservation
+from apps.core.states import StateMachineMixin
 
 
-class Payment(models.Model):
+class Payment(StateMachineMixin, models.Model):
     """Modèle représentant un paiement."""
     
     STATUS_CHOICES = (
@@ -17,6 +19,12 @@ class Payment(models.Model):
         ('REFUNDED', 'Remboursé'),
     )
     
+    TRANSITIONS = {
+        'succeed': (('PENDING', 'FAILED'), 'SUCCESS'),
+        'fail': (('PENDING',), 'FAILED'),
+        'refund': (('SUCCESS',), 'REFUNDED'),
+    }
+    
     METHOD_CHOICES = (
         ('STRIPE', 'Stripe'),
         ('PAYPAL', 'PayPal'),
@@ -82,29 +90,30 @@ class Payment(models.Model):
     def __str__(self):
         return f"Paiement {self.id} - Réservation {self.reservation.id} ({self.status})"
     
-    def mark_as_paid(self):
-        """Marque le paiement comme réussi."""
-        if self.status == 'SUCCESS':
-            return False
-        self.status = 'SUCCESS'
-        from django.utils import timezone
-        self.paid_at = timezone.now()
-        # Valider la réservation
-        reservation = self.reservation
-        reservation.status = 'CONFIRMED'
-        reservation.save()
-        self.save()
+    def mark_as_paid(self, **fields):
+        """Marque le paiement comme réussi et confirme la réservation."""
+        with transaction.atomic():
+            if not self.transition('succeed', paid_at=timezone.now(), **fields):
+                return False
+            self.reservation.confirm()
+            LedgerEntry.record_charges([self])
         return True
     
+    @staticmethod
+    def processing_fee(amount):
+        """Frais du prestataire pour un montant (`PAYMENT_FEE_PERCENT` + `PAYMENT_FEE_FIXED`)."""
+        from decimal import Decimal, ROUND_HALF_UP
+        from django.conf import settings
+        fee = Decimal(amount) * settings.PAYMENT_FEE_PERCENT / 100 + settings.PAYMENT_FEE_FIXED
+        return fee.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
     def refund(self):
-        """Marque le paiement comme remboursé."""
-        if self.status in ['REFUNDED', 'PENDING']:
-            return False
-        self.status = 'REFUNDED'
-        self.save()
-        # Annuler la réservation
-        reservation = self.reservation
-        reservation.cancel()
+        """Marque le paiement comme remboursé et annule la réservation."""
+        with transaction.atomic():
+            if not self.transition('refund'):
+                return False
+            self.reservation.cancel()
+            LedgerEntry.record_refunds([self])
         return True
 
 
@@ -127,19 +136,351 @@ class Invoice(models.Model):
     def __str__(self):
         return f"Facture {self.invoice_number}"
     
+    @staticmethod
+    def format_number(year, month, number):
+        return f"INV-{year}-{month:02d}-{number:05d}"
+    
     def generate_invoice_number(self):
         """Génère un numéro de facture unique."""
-        from datetime import datetime
-        year = datetime.now().year
-        # Compter les factures du mois
-        month = datetime.now().month
-        count = Invoice.objects.filter(
-            created_at__year=year,
-            created_at__month=month
-        ).count() + 1
-        return f"INV-{year}-{month:02d}-{count:05d}"
+        return self.allocate_numbers(1)[0]
+    
+    @classmethod
+    def allocate_numbers(cls, count):
+        """Réserver `count` numéros consécutifs pour le mois en cours."""
+        today = timezone.localdate()
+        first = InvoiceSequence.reserve(today.year, today.month, count)
+        return [
+            cls.format_number(today.year, today.month, number)
+            for number in range(first, first + count)
+        ]
+    
+    @classmethod
+    def create_for_payments(cls, payments):
+        """Créer en une requête les factures manquantes d'un lot de paiements."""
+        with transaction.atomic():
+            existing = set(
+                cls.objects.filter(payment__in=payments).values_list('payment_id', flat=True)
+            )
+            payments = [payment for payment in payments if payment.id not in existing]
+            if not payments:
+                return []
+            numbers = cls.allocate_numbers(len(payments))
+            invoices = cls.objects.bulk_create([
+                cls(payment=payment, invoice_number=number)
+                for payment, number in zip(payments, numbers)
+            ])
+            InvoiceRenderTask.enqueue(
+                cls.objects.filter(invoice_number__in=numbers).values_list('id', flat=True)
+            )
+            return invoices
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            if not self.invoice_number:
+                self.invoice_number = self.generate_invoice_number()
+            super().save(*args, **kwargs)
+            if adding:
+                # Le PDF est rendu en arrière-plan (`render_invoices`)
+                InvoiceRenderTask.enqueue([self.id])
+
+
+class InvoiceSequence(models.Model):
+    """
+    Compteur des numéros de facture par mois.
+    
+    La ligne du mois est verrouillée (`SELECT ... FOR UPDATE`) jusqu'à la fin
+    de la transaction qui consomme les numéros: deux confirmations
+    simultanées ne peuvent pas obtenir le même numéro, et une transaction
+    annulée rend ses numéros, sans trou dans la numérotation.
+    """
+    
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    last_number = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = 'Séquence de factures'
+        verbose_name_plural = 'Séquences de factures'
+        constraints = [
+            models.UniqueConstraint(fields=['year', 'month'], name='unique_invoice_sequence_month'),
+        ]
+    
+    def __str__(self):
+        return f"{self.year}-{self.month:02d}: {self.last_number}"
+    
+    @classmethod
+    def reserve(cls, year, month, count=1):
+        """
+        Réserver un bloc de `count` numéros et retourner le premier.
+        
+        Doit être appelé dans une transaction.
+        """
+        try:
+            with transaction.atomic():
+                cls.objects.get_or_create(year=year, month=month)
+        except IntegrityError:
+            # Ligne créée au même instant par une autre transaction
+            pass
+        sequence = cls.objects.select_for_update().get(year=year, month=month)
+        first = sequence.last_number + 1
+        sequence.last_number += count
+        sequence.save(update_fields=['last_number'])
+        return first
+
+
+class InvoiceRenderTask(models.Model):
+    """
+    File d'attente des factures dont le PDF reste à générer.
+    
+    Comme pour `RefundTask`, une tâche réclamée passe `IN_PROGRESS` avec
+    l'heure de réclamation (`claimed_at`) comme bail: elle n'est reprise par
+    un autre worker qu'une fois le bail expiré.
+    """
+    
+    STATUS_CHOICES = (
+        ('PENDING', 'En attente'),
+        ('IN_PROGRESS', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échoué'),
+    )
+    
+    invoice = models.OneToOneField(Invoice, on_delete=models.CASCADE, related_name='render_task')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    rendered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Rendu de facture'
+        verbose_name_plural = 'Rendus de factures'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Rendu {self.invoice_id} ({self.status})"
+    
+    @classmethod
+    def enqueue(cls, invoice_ids):
+        """Mettre des factures en file (sans doublon)."""
+        return cls.objects.bulk_create(
+            [cls(invoice_id=invoice_id) for invoice_id in invoice_ids],
+            ignore_conflicts=True
+        )
+
+
+class RefundTask(models.Model):
+    """
+    File d'attente des remboursements à effectuer auprès du prestataire.
+    
+    Une tâche réclamée par un worker passe `IN_PROGRESS` avec l'heure de
+    réclamation (`claimed_at`), qui sert de bail: les autres workers ne la
+    reprennent qu'une fois le bail expiré (worker arrêté en cours de lot).
+    """
+    
+    STATUS_CHOICES = (
+        ('PENDING', 'En attente'),
+        ('IN_PROGRESS', 'En cours'),
+        ('DONE', 'Terminé'),
+        ('FAILED', 'Échoué'),
+    )
+    
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='refund_task')
+    closure = models.ForeignKey(
+        'courts.Closure',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='refund_tasks'
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    # Timestamps
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Remboursement en file'
+        verbose_name_plural = 'Remboursements en file'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Remboursement {self.payment_id} ({self.status})"
+    
+    @classmethod
+    def enqueue(cls, payment_ids, closure=None):
+        """Mettre des paiements en file de remboursement (sans doublon)."""
+        return cls.objects.bulk_create(
+            [cls(payment_id=payment_id, closure=closure) for payment_id in payment_ids],
+            ignore_conflicts=True
+        )
+
+
+class Statement(models.Model):
+    """Relevé mensuel d'un site: paiements, remboursements et frais."""
+    
+    site = models.ForeignKey('sites.Site', on_delete=models.CASCADE, related_name='statements')
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    file = models.FileField(upload_to='statements/', blank=True)
+    
+    # Totaux
+    payment_count = models.PositiveIntegerField(default=0)
+    refund_count = models.PositiveIntegerField(default=0)
+    gross_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    refund_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fee_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    net_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    # Timestamps
+    generated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-year', '-month', 'site']
+        verbose_name = 'Relevé mensuel'
+        verbose_name_plural = 'Relevés mensuels'
+        constraints = [
+            models.UniqueConstraint(fields=['site', 'year', 'month'], name='unique_site_statement_month'),
+        ]
+    
+    def __str__(self):
+        return f"Relevé {self.site_id} {self.year}-{self.month:02d}"
+
+
+class SiteBalance(models.Model):
+    """
+    Solde courant d'un site, tenu à jour à chaque écriture du grand livre.
+    
+    Le chiffre d'affaires, les remboursements, les frais et le montant à
+    reverser au gestionnaire se lisent sur une seule ligne, sans parcourir
+    les paiements.
+    """
+    
+    site = models.OneToOneField('sites.Site', on_delete=models.CASCADE, related_name='balance')
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    refunds = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fees = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    
+    # Timestamps
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Solde de site'
+        verbose_name_plural = 'Soldes de sites'
+    
+    def __str__(self):
+        return f"Solde {self.site_id}: {self.balance}"
+
+
+class LedgerEntry(models.Model):
+    """
+    Écriture du grand livre (ajout seulement).
+    
+    Un paiement produit au plus une écriture de chaque type: encaissement
+    (positif), frais du prestataire et remboursement (négatifs). Chaque
+    écriture porte le solde du site après son application.
+    """
+    
+    TYPE_CHOICES = (
+        ('CHARGE', 'Encaissement'),
+        ('FEE', 'Frais'),
+        ('REFUND', 'Remboursement'),
+    )
+    
+    site = models.ForeignKey('sites.Site', on_delete=models.CASCADE, related_name='ledger_entries')
+    # Un paiement comptabilisé ne peut plus être supprimé
+    payment = models.ForeignKey(
+        Payment,
+        on_delete=models.PROTECT,
+        null=True,
+        related_name='ledger_entries'
+    )
+    entry_type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default='EUR')
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2)
+    
+    # Timestamps
+    occurred_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Écriture comptable'
+        verbose_name_plural = 'Écritures comptables'
+        constraints = [
+            models.UniqueConstraint(fields=['payment', 'entry_type'], name='unique_ledger_payment_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['site', 'occurred_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} (site {self.site_id})"
     
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            self.invoice_number = self.generate_invoice_number()
+        if self.pk is not None:
+            raise ValueError("Les écritures du grand livre ne sont pas modifiables")
         super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        raise ValueError("Les écritures du grand livre ne sont pas supprimables")
+    
+    @classmethod
+    def record_charges(cls, payments):
+        """Écritures d'encaissement et de frais d'un lot de paiements réussis."""
+        from apps.payments.ledger import post_entries
+        return post_entries(payments, ('CHARGE', 'FEE'))
+    
+    @classmethod
+    def record_refunds(cls, payments):
+        """Écritures de remboursement d'un lot de paiements remboursés."""
+        from apps.payments.ledger import post_entries
+        return post_entries(payments, ('REFUND',))
+
+
+class WebhookEvent(models.Model):
+    """Boîte de réception des webhooks Stripe, traitée par lots."""
+    
+    STATUS_CHOICES = (
+        ('PENDING', 'En attente'),
+        ('PROCESSED', 'Traité'),
+        ('IGNORED', 'Ignoré'),
+        ('FAILED', 'Échoué'),
+    )
+    
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    # Timestamps
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        verbose_name = 'Événement webhook'
+        verbose_name_plural = 'Événements webhook'
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} ({self.status})"
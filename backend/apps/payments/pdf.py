@@ -0,0 +1,152 @@
+"""
+Génération minimale de PDF pour les factures.
+
+Le document est composé de pages A4 de texte à partir d'un gabarit Django
+(`payments/invoice.txt`): chaque ligne du gabarit devient une ligne du PDF,
+les lignes commençant par `# ` sont des titres en gras. Les lignes qui ne
+tiennent pas sur une page passent à la suivante; chaque page est numérotée
+quand il y en a plusieurs. Les polices sont
+les polices standard du format PDF (Helvetica, encodage WinAnsi), donc
+rien à embarquer; les objets de police et le logo (`INVOICE_LOGO`, JPEG)
+sont préparés une seule fois par processus.
+"""
+
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 en points
+MARGIN = 56
+LOGO_HEIGHT = 48
+FONT_SIZE = 10
+HEADING_SIZE = 14
+LINE_SPACING = 1.45
+
+
+def _escape(text):
+    """Chaîne PDF littérale encodée en WinAnsi (cp1252)."""
+    data = text.encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+@lru_cache(maxsize=None)
+def font_objects():
+    """Dictionnaires des polices standard, construits une fois par processus."""
+    return tuple(
+        f'<< /Type /Font /Subtype /Type1 /BaseFont /{name} /Encoding /WinAnsiEncoding >>'.encode()
+        for name in ('Helvetica', 'Helvetica-Bold')
+    )
+
+
+@lru_cache(maxsize=None)
+def load_logo(path):
+    """Logo JPEG `(données, largeur, hauteur, espace couleur)` ou None."""
+    if not path:
+        return None
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            if image.format != 'JPEG':
+                return None
+            width, height = image.size
+            colorspace = {'L': 'DeviceGray', 'CMYK': 'DeviceCMYK'}.get(image.mode, 'DeviceRGB')
+        with open(path, 'rb') as logo:
+            return logo.read(), width, height, colorspace
+    except OSError:
+        return None
+
+
+def _text(font, size, x, y, text):
+    return f'/{font} {size} Tf 1 0 0 1 {x} {y:.2f} Tm '.encode() + b'(' + _escape(text) + b') Tj'
+
+
+def _paginate(lines, logo):
+    """Répartir les lignes en pages: listes de `(police, taille, y, texte)`."""
+    top = PAGE_HEIGHT - MARGIN
+    if logo is not None:
+        top -= LOGO_HEIGHT + FONT_SIZE * LINE_SPACING
+    pages, page, y = [], [], top
+    for line in lines:
+        font, size = ('F2', HEADING_SIZE) if line.startswith('# ') else ('F1', FONT_SIZE)
+        text = line[2:] if font == 'F2' else line
+        y -= size * LINE_SPACING
+        if y < MARGIN:
+            pages.append(page)
+            page, y = [], PAGE_HEIGHT - MARGIN - size * LINE_SPACING
+        page.append((font, size, y, text))
+    pages.append(page)
+    return pages
+
+
+def _content_stream(page, number, count, logo):
+    commands = []
+    if logo is not None and number == 1:
+        _, width, height, _ = logo
+        draw_width = width * LOGO_HEIGHT / height
+        y = PAGE_HEIGHT - MARGIN - LOGO_HEIGHT
+        commands.append(f'q {draw_width:.2f} 0 0 {LOGO_HEIGHT} {MARGIN} {y} cm /Logo Do Q'.encode())
+
+    commands.append(b'BT')
+    for font, size, y, text in page:
+        commands.append(_text(font, size, MARGIN, y, text))
+    if count > 1:
+        commands.append(_text('F1', FONT_SIZE, PAGE_WIDTH - MARGIN - 40, MARGIN / 2, f'{number} / {count}'))
+    commands.append(b'ET')
+    return b'\n'.join(commands)
+
+
+def build_pdf(lines, logo=None):
+    """Document PDF (octets) à partir de lignes de texte, sur autant de pages que nécessaire."""
+    regular, bold = font_objects()
+    pages = _paginate(lines, logo)
+    resources = b'/Font << /F1 3 0 R /F2 4 0 R >>'
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # arbre des pages, complété ci-dessous
+        regular,
+        bold,
+    ]
+    if logo is not None:
+        data, width, height, colorspace = logo
+        objects.append(
+            f'<< /Type /XObject /Subtype /Image /Width {width} /Height {height} '
+            f'/ColorSpace /{colorspace} /BitsPerComponent 8 /Filter /DCTDecode '
+            f'/Length {len(data)} >>\nstream\n'.encode() + data + b'\nendstream'
+        )
+        resources += b' /XObject << /Logo 5 0 R >>'
+
+    kids = []
+    for number, page in enumerate(pages, start=1):
+        content = zlib.compress(_content_stream(page, number, len(pages), logo))
+        page_number = len(objects) + 1
+        kids.append(b'%d 0 R' % page_number)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << %s >> /Contents %d 0 R >>'
+            % (PAGE_WIDTH, PAGE_HEIGHT, resources, page_number + 1)
+        )
+        objects.append(
+            b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(content) + content + b'\nendstream'
+        )
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(pages))
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(output)
+
+
+def render_invoice_pdf(context):
+    """Rendre le gabarit de facture puis le convertir en PDF."""
+    text = render_to_string('payments/invoice.txt', context)
+    lines = [line.rstrip() for line in text.strip('\n').splitlines()]
+    return build_pdf(lines, load_logo(getattr(settings, 'INVOICE_LOGO', '')))
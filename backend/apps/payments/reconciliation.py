@@ -0,0 +1,204 @@
+"""
+Rapprochement des paiements avec le prestataire.
+
+Les paiements PENDING et SUCCESS sont parcourus par pages (pagination par
+clé). L'état côté prestataire est récupéré en masse avec l'API de liste,
+découpée en tranches de temps lues en parallèle par un pool de threads dont
+le débit est borné par un seau à jetons; seuls les intents absents des
+listes sont relus un par un. Les corrections sont appliquées page par page,
+chacune dans une transaction, avec les mises à jour groupées du traitement
+des webhooks.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.payments.gateway import get_gateway, to_minor_units, GatewayError, GatewayUnavailable
+from apps.payments.models import Payment
+from apps.payments.webhooks import settle_succeeded, settle_failed
+from apps.reservations.models import Reservation
+
+
+class RateLimiter:
+    """Seau à jetons partagé par les threads (`rate` appels par seconde)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class Mismatch:
+    payment_id: int
+    reservation_id: int
+    intent_id: str
+    kind: str
+    payment_status: str
+    provider_status: str
+    reservation_status: str
+    action: str = ''
+
+
+REPORT_FIELDS = (
+    'payment_id', 'reservation_id', 'intent_id', 'kind',
+    'payment_status', 'provider_status', 'reservation_status', 'action',
+)
+
+
+def fetch_intents(gateway, created_gte, created_lt, limiter, workers=4):
+    """Intents créés dans la période, indexés par id (listes en parallèle)."""
+    slices = workers * 4
+    step = max(1, (created_lt - created_gte + slices - 1) // slices)
+    windows = [(start, min(start + step, created_lt)) for start in range(created_gte, created_lt, step)]
+
+    def fetch_window(window):
+        intents, starting_after = [], None
+        while True:
+            limiter.acquire()
+            page, has_more = gateway.list_intents(*window, starting_after=starting_after)
+            intents.extend(page)
+            if not has_more or not page:
+                return intents
+            starting_after = page[-1].id
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return {
+            intent.id: intent
+            for intents in pool.map(fetch_window, windows)
+            for intent in intents
+        }
+
+
+def retrieve_intents(gateway, intent_ids, limiter, workers=4):
+    """Relire individuellement des intents absents des listes."""
+
+    def retrieve(intent_id):
+        limiter.acquire()
+        try:
+            return intent_id, gateway.retrieve_intent(intent_id)
+        except GatewayUnavailable:
+            raise
+        except GatewayError:
+            return intent_id, None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(retrieve, intent_ids))
+
+
+def compare(row, intent):
+    """Écart entre un paiement local et son intent, ou None."""
+    mismatch = Mismatch(
+        payment_id=row['id'],
+        reservation_id=row['reservation_id'],
+        intent_id=row['stripe_payment_intent_id'],
+        kind='',
+        payment_status=row['status'],
+        provider_status=intent.status if intent else '',
+        reservation_status=row['reservation__status'],
+    )
+    if intent is None:
+        mismatch.kind = 'missing_at_provider'
+    elif intent.amount != to_minor_units(row['amount']) or intent.currency != row['currency'].lower():
+        mismatch.kind = 'amount_mismatch'
+    elif row['status'] == 'PENDING' and intent.status == 'succeeded':
+        mismatch.kind, mismatch.action = 'pending_but_succeeded', 'mark_success'
+    elif row['status'] == 'PENDING' and intent.status == 'canceled':
+        mismatch.kind, mismatch.action = 'pending_but_canceled', 'mark_failed'
+    elif row['status'] == 'SUCCESS' and intent.status != 'succeeded':
+        mismatch.kind = 'success_not_succeeded'
+    elif row['status'] == 'SUCCESS' and row['reservation__status'] == 'PENDING':
+        mismatch.kind, mismatch.action = 'reservation_not_confirmed', 'confirm_reservation'
+    elif row['status'] == 'SUCCESS' and row['reservation__status'] == 'CANCELLED':
+        mismatch.kind = 'paid_reservation_cancelled'
+    else:
+        return None
+    return mismatch
+
+
+def apply_corrections(mismatches, intents):
+    """Appliquer les corrections d'une page dans une seule transaction."""
+    charges, failed, confirm = {}, [], []
+    for mismatch in mismatches:
+        if mismatch.action == 'mark_success':
+            charges[mismatch.intent_id] = intents[mismatch.intent_id].latest_charge
+        elif mismatch.action == 'mark_failed':
+            failed.append(mismatch.intent_id)
+        elif mismatch.action == 'confirm_reservation':
+            confirm.append(mismatch.reservation_id)
+    with transaction.atomic():
+        settle_succeeded(charges)
+        settle_failed(failed)
+        Reservation.bulk_transition('confirm', Reservation.objects.filter(id__in=confirm))
+
+
+def reconcile(since, until=None, page_size=500, workers=4, rate=None, dry_run=False):
+    """
+    Rapprocher les paiements créés depuis `since`.
+
+    Retourne `(mismatches, checked)`.
+    """
+    gateway = get_gateway()
+    until = until or timezone.now()
+    limiter = RateLimiter(rate or settings.PAYMENT_GATEWAY_RATE_LIMIT)
+
+    # Un intent est toujours créé après son paiement
+    intents = fetch_intents(
+        gateway, int(since.timestamp()), int(until.timestamp()) + 1, limiter, workers
+    )
+
+    queryset = (
+        Payment.objects.filter(status__in=['PENDING', 'SUCCESS'], created_at__gte=since)
+        .exclude(stripe_payment_intent_id='')
+        .order_by('id')
+    )
+    mismatches, checked, last_id = [], 0, 0
+    while True:
+        rows = list(
+            queryset.filter(id__gt=last_id).values(
+                'id', 'status', 'amount', 'currency', 'stripe_payment_intent_id',
+                'reservation_id', 'reservation__status'
+            )[:page_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1]['id']
+        checked += len(rows)
+
+        missing = [
+            row['stripe_payment_intent_id'] for row in rows
+            if row['stripe_payment_intent_id'] not in intents
+        ]
+        if missing:
+            intents.update(retrieve_intents(gateway, missing, limiter, workers))
+
+        page = [
+            mismatch for mismatch in (
+                compare(row, intents.get(row['stripe_payment_intent_id'])) for row in rows
+            )
+            if mismatch is not None
+        ]
+        if page and not dry_run:
+            apply_corrections(page, intents)
+        mismatches.extend(page)
+    return mismatches, checked
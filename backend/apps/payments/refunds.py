@@ -0,0 +1,129 @@
+"""
+Remboursements en file.
+
+Les remboursements décidés en masse (fermeture d'un terrain) ne sont pas
+faits pendant la requête: une tâche (`RefundTask`) est créée par paiement.
+Un worker (`process_refunds`) réclame les tâches par lots et appelle le
+prestataire en parallèle avec un pool de threads borné, dont le débit est
+limité par le seau à jetons du rapprochement. Les paiements remboursés, les
+écritures du grand livre et l'état des tâches sont ensuite enregistrés avec
+des mises à jour groupées.
+
+Une tâche réclamée passe `IN_PROGRESS` sous un bail (`REFUND_TASK_LEASE`):
+deux workers concurrents ne réclament donc pas le même lot, et un lot
+abandonné (worker arrêté) n'est repris qu'après expiration du bail. Chaque
+appel au prestataire porte la clé d'idempotence `refund-<paiement>`: un
+lot repris après un arrêt ne rembourse pas deux fois. Les résultats ne
+sont enregistrés que pour les tâches dont le worker détient encore le bail.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.payments.gateway import get_gateway, GatewayError
+from apps.payments.models import Payment, RefundTask, LedgerEntry
+from apps.payments.reconciliation import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+
+
+def claim_tasks(batch_size):
+    """
+    Réserver un lot de remboursements en attente ou au bail expiré.
+
+    Retourne `(tâches, heure de réclamation)`; l'heure identifie le bail.
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.REFUND_TASK_LEASE)
+    with transaction.atomic():
+        tasks = list(
+            RefundTask.objects.select_for_update(skip_locked=True, of=('self',))
+            .select_related('payment')
+            .filter(Q(status='PENDING') | Q(status='IN_PROGRESS', claimed_at__lt=expired))
+            .order_by('created_at')[:batch_size]
+        )
+        for task in tasks:
+            task.status, task.claimed_at = 'IN_PROGRESS', now
+            task.attempts += 1
+        RefundTask.objects.bulk_update(tasks, ['status', 'claimed_at', 'attempts'])
+    return tasks, now
+
+
+def process_refunds(batch_size=100, workers=4, rate=None):
+    """
+    Effectuer un lot de remboursements en attente.
+
+    Retourne le nombre de tâches traitées.
+    """
+    tasks, claimed_at = claim_tasks(batch_size)
+    if not tasks:
+        return 0
+
+    gateway = get_gateway()
+    limiter = RateLimiter(rate or settings.PAYMENT_GATEWAY_RATE_LIMIT)
+
+    def refund(task):
+        """`(tâche, erreur, nouvelle tentative possible)`"""
+        payment = task.payment
+        if payment.status == 'REFUNDED':
+            return task, '', False
+        if payment.status != 'SUCCESS':
+            return task, f'Paiement {payment.status}: rien à rembourser', False
+        try:
+            limiter.acquire()
+            gateway.refund(
+                payment.stripe_payment_intent_id, idempotency_key=f'refund-{payment.id}'
+            )
+        except GatewayError as e:
+            return task, f'{type(e).__name__}: {e}', True
+        except Exception as e:
+            # Issue inconnue: la clé d'idempotence rend la nouvelle tentative sûre
+            logger.exception(f"Unexpected error refunding payment {payment.id}")
+            return task, f'{type(e).__name__}: {e}', True
+        return task, '', False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(refund, tasks))
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Bail expiré et lot repris par un autre worker: ne rien écraser
+        owned = set(
+            RefundTask.objects.select_for_update()
+            .filter(id__in=[task.id for task in tasks], status='IN_PROGRESS', claimed_at=claimed_at)
+            .values_list('id', flat=True)
+        )
+        finished, refunded = [], []
+        for task, error, retry in results:
+            if task.id not in owned:
+                continue
+            if not error:
+                task.status, task.error, task.processed_at = 'DONE', '', now
+                if task.payment.status == 'SUCCESS':
+                    task.payment.status = 'REFUNDED'
+                    refunded.append(task.payment)
+            else:
+                logger.error(f"Refund of payment {task.payment_id} failed: {error}")
+                task.error = error
+                if not retry or task.attempts >= MAX_ATTEMPTS:
+                    task.status, task.processed_at = 'FAILED', now
+                else:
+                    task.status = 'PENDING'
+            task.claimed_at = None
+            finished.append(task)
+
+        Payment.bulk_transition(
+            'refund', Payment.objects.filter(id__in=[payment.id for payment in refunded]),
+            updated_at=now
+        )
+        LedgerEntry.record_refunds(refunded)
+        RefundTask.objects.bulk_update(finished, ['status', 'error', 'claimed_at', 'processed_at'])
+    return len(tasks)
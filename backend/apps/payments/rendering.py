@@ -0,0 +1,191 @@
+"""
+Rendu des factures PDF en arrière-plan.
+
+Les factures créées sont mises en file (`InvoiceRenderTask`) sans rien
+générer pendant le paiement. Un worker (`render_invoices`) réclame les
+tâches par lots (avec un bail, voir `InvoiceRenderTask`), lit les données
+de toutes les factures du lot en une requête puis confie le rendu à un
+pool de processus: chaque processus rend le gabarit, produit le PDF et
+l'enregistre par le stockage par défaut sous un nom libre. Le processus
+principal enregistre ensuite les noms et l'état des tâches avec des mises
+à jour groupées; les fichiers remplacés sont supprimés après validation.
+"""
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.payments.models import Payment, Invoice, InvoiceRenderTask
+from apps.payments.pdf import render_invoice_pdf
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TO = 'invoices'
+MAX_ATTEMPTS = 3
+
+
+def invoice_contexts(invoice_ids):
+    """Données de rendu des factures, lues en une seule requête."""
+    rows = Invoice.objects.filter(id__in=invoice_ids).values(
+        'id', 'invoice_number', 'created_at',
+        'payment__amount', 'payment__currency', 'payment__method', 'payment__paid_at',
+        'payment__reservation_id',
+        'payment__reservation__start_datetime', 'payment__reservation__end_datetime',
+        'payment__reservation__court__name',
+        'payment__reservation__court__site__name',
+        'payment__reservation__court__site__address',
+        'payment__reservation__court__site__postal_code',
+        'payment__reservation__court__site__city',
+        'payment__reservation__user__first_name',
+        'payment__reservation__user__last_name',
+        'payment__reservation__user__email',
+    )
+    methods = dict(Payment.METHOD_CHOICES)
+    return [
+        {
+            'id': row['id'],
+            'invoice_number': row['invoice_number'],
+            'created_at': row['created_at'],
+            'amount': row['payment__amount'],
+            'currency': row['payment__currency'],
+            'method': str(methods.get(row['payment__method'], row['payment__method'])),
+            'paid_at': row['payment__paid_at'],
+            'reservation_id': row['payment__reservation_id'],
+            'start_datetime': row['payment__reservation__start_datetime'],
+            'end_datetime': row['payment__reservation__end_datetime'],
+            'court_name': row['payment__reservation__court__name'],
+            'site_name': row['payment__reservation__court__site__name'],
+            'site_address': row['payment__reservation__court__site__address'],
+            'site_postal_code': row['payment__reservation__court__site__postal_code'],
+            'site_city': row['payment__reservation__court__site__city'],
+            'customer_name': ' '.join(filter(None, (
+                row['payment__reservation__user__first_name'],
+                row['payment__reservation__user__last_name'],
+            ))),
+            'customer_email': row['payment__reservation__user__email'],
+        }
+        for row in rows
+    ]
+
+
+def store_file(name, data):
+    """
+    Enregistrer `data` par le stockage par défaut et retourner le nom réel.
+
+    Un fichier existant n'est jamais écrasé: le stockage choisit un nom libre
+    (suffixe), que l'appelant enregistre en base une fois le fichier complet,
+    puis il supprime l'ancien avec `discard_files`. Un lecteur ne voit ainsi
+    jamais de fichier partiel.
+    """
+    return default_storage.save(name, ContentFile(data))
+
+
+def discard_files(names):
+    """Supprimer des fichiers remplacés, après validation de la transaction."""
+    names = [name for name in names if name]
+    if names:
+        transaction.on_commit(lambda: [default_storage.delete(name) for name in names])
+
+
+def render_one(context):
+    """Rendre et enregistrer une facture; exécuté dans un processus du pool."""
+    try:
+        name = f"{UPLOAD_TO}/{context['invoice_number']}.pdf"
+        return context['id'], store_file(name, render_invoice_pdf(context)), ''
+    except Exception as e:
+        return context['id'], '', f'{type(e).__name__}: {e}'
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def claim_tasks(batch_size):
+    """
+    Réserver un lot de tâches en attente ou au bail expiré.
+
+    Retourne `(tâches, heure de réclamation)`; l'heure identifie le bail.
+    """
+    now = timezone.now()
+    expired = now - timedelta(seconds=settings.INVOICE_RENDER_LEASE)
+    with transaction.atomic():
+        tasks = list(
+            InvoiceRenderTask.objects.select_for_update(skip_locked=True)
+            .filter(Q(status='PENDING') | Q(status='IN_PROGRESS', claimed_at__lt=expired))
+            .order_by('created_at')[:batch_size]
+        )
+        for task in tasks:
+            task.status, task.claimed_at = 'IN_PROGRESS', now
+            task.attempts += 1
+        InvoiceRenderTask.objects.bulk_update(tasks, ['status', 'claimed_at', 'attempts'])
+    return tasks, now
+
+
+def render_pending(batch_size=200, pool=None):
+    """
+    Rendre un lot de factures en attente avec `pool` (un
+    `ProcessPoolExecutor`, ou rendu dans le processus courant si None).
+
+    Retourne le nombre de tâches traitées.
+    """
+    tasks, claimed_at = claim_tasks(batch_size)
+    if not tasks:
+        return 0
+
+    contexts = invoice_contexts([task.invoice_id for task in tasks])
+    if pool is None:
+        results = map(render_one, contexts)
+    else:
+        results = pool.map(render_one, contexts, chunksize=max(1, len(contexts) // 32))
+    results = {invoice_id: (name, error) for invoice_id, name, error in results}
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Bail expiré et lot repris par un autre worker: ne rien écraser
+        owned = set(
+            InvoiceRenderTask.objects.select_for_update()
+            .filter(id__in=[task.id for task in tasks], status='IN_PROGRESS', claimed_at=claimed_at)
+            .values_list('id', flat=True)
+        )
+        previous = dict(
+            Invoice.objects.filter(id__in=[task.invoice_id for task in tasks if task.id in owned])
+            .values_list('id', 'pdf_file')
+        )
+        invoices, finished, replaced = [], [], []
+        for task in tasks:
+            name, error = results.get(task.invoice_id, ('', 'Facture introuvable'))
+            if task.id not in owned:
+                replaced.append(name)
+                continue
+            if name:
+                task.status, task.error, task.rendered_at = 'DONE', '', now
+                invoices.append(Invoice(id=task.invoice_id, pdf_file=name, updated_at=now))
+                if previous.get(task.invoice_id) != name:
+                    replaced.append(previous.get(task.invoice_id))
+            else:
+                logger.error(f"Invoice {task.invoice_id} rendering failed: {error}")
+                task.error = error
+                task.status = 'FAILED' if task.attempts >= MAX_ATTEMPTS else 'PENDING'
+            task.claimed_at = None
+            finished.append(task)
+        Invoice.objects.bulk_update(invoices, ['pdf_file', 'updated_at'])
+        InvoiceRenderTask.objects.bulk_update(finished, ['status', 'error', 'rendered_at', 'claimed_at'])
+        discard_files(replaced)
+    return len(tasks)
+
+
+def create_pool(processes):
+    """Pool de processus de rendu (None: rendu dans le processus courant)."""
+    if not processes:
+        return None
+    # Les connexions ne doivent pas être partagées avec les processus fils
+    connections.close_all()
+    return ProcessPoolExecutor(max_workers=processes, initializer=_init_worker)
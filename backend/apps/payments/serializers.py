@@ -3,11 +3,13 @@ Sérialiseurs pour la gestion des paiements.
 """
 
 from rest_framework import serializers
-from apps.payments.models import Payment, Invoice
+from apps.payments.models import Payment, Invoice, Statement, SiteBalance
+from apps.reservations.serializers import ReservationListSerializer
+from apps.core.serializers import DynamicFieldsMixin
 
 
-class PaymentSerializer(serializers.ModelSerializer):
-    reservation_details = serializers.SerializerMethodField()
+class PaymentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    reservation_details = ReservationListSerializer(source='reservation', read_only=True)
     status_name = serializers.CharField(source='get_status_display', read_only=True)
     method_name = serializers.CharField(source='get_method_display', read_only=True)
     
@@ -22,10 +24,10 @@ class PaymentSerializer(serializers.ModelSerializer):
             'id', 'amount', 'currency', 'method', 'status',
             'transaction_reference', 'created_at', 'paid_at'
         ]
-    
-    def get_reservation_details(self, obj):
-        from apps.reservations.serializers import ReservationListSerializer
-        return ReservationListSerializer(obj.reservation).data
+        expandable_fields = ['reservation_details']
+        field_relations = {
+            'reservation_details': {'select_related': ['reservation__court']},
+        }
 
 
 class PaymentCreateSerializer(serializers.ModelSerializer):
@@ -54,8 +56,38 @@ class StripePaymentIntentSerializer(serializers.Serializer):
         return value
 
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Invoice
         fields = ['id', 'invoice_number', 'pdf_file', 'created_at']
         read_only_fields = ['id', 'invoice_number', 'created_at']
+
+
+class StatementSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    site_name = serializers.CharField(source='site.name', read_only=True)
+    
+    class Meta:
+        model = Statement
+        fields = [
+            'id', 'site', 'site_name', 'year', 'month', 'payment_count', 'refund_count',
+            'gross_amount', 'refund_amount', 'fee_amount', 'net_amount', 'generated_at'
+        ]
+        read_only_fields = fields
+        field_relations = {
+            'site_name': {'select_related': ['site']},
+        }
+
+
+class SiteBalanceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    site_name = serializers.CharField(source='site.name', read_only=True)
+    
+    class Meta:
+        model = SiteBalance
+        fields = [
+            'id', 'site', 'site_name', 'revenue', 'refunds', 'fees', 'balance',
+            'entry_count', 'updated_at'
+        ]
+        read_only_fields = fields
+        field_relations = {
+            'site_name': {'select_related': ['site']},
+        }
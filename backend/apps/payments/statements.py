@@ -0,0 +1,124 @@
+"""
+Relevés mensuels des sites.
+
+Un relevé liste, pour un site et un mois, les écritures du grand livre
+(`LedgerEntry`): encaissements, frais du prestataire et remboursements,
+datés par `occurred_at`, qui ne change jamais. Les lignes sont lues en
+flux (`iterator()`) pour le fichier CSV et les totaux calculés par un seul
+agrégat. Chaque site est traité par un processus du pool de rendu; le
+fichier est enregistré par le stockage par défaut sous `statements/`, sans
+écraser le relevé précédent, supprimé une fois le nouveau enregistré.
+"""
+
+import csv
+import io
+from datetime import datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from apps.payments.models import LedgerEntry, Statement
+from apps.payments.rendering import discard_files, store_file
+
+UPLOAD_TO = 'statements'
+HEADER = ('date', 'type', 'reservation', 'terrain', 'client', 'reference', 'montant')
+ENTRY_LABELS = {'CHARGE': 'PAIEMENT', 'FEE': 'FRAIS', 'REFUND': 'REMBOURSEMENT'}
+CHUNK_SIZE = 2000
+ZERO = Decimal('0.00')
+
+
+def month_range(year, month):
+    """Bornes `[début, fin[` du mois dans le fuseau courant."""
+    start = timezone.make_aware(datetime(year, month, 1))
+    end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+    return start, end
+
+
+def month_entries(site_id, year, month):
+    """Écritures du grand livre du site pour le mois."""
+    start, end = month_range(year, month)
+    return LedgerEntry.objects.filter(site_id=site_id, occurred_at__gte=start, occurred_at__lt=end)
+
+
+def statement_rows(site_id, year, month):
+    """Lignes du site pour le mois, lues en flux dans l'ordre chronologique."""
+    return (
+        month_entries(site_id, year, month)
+        .order_by('occurred_at', 'id')
+        .values_list(
+            'occurred_at', 'entry_type', 'amount', 'payment__stripe_payment_intent_id',
+            'payment__reservation_id', 'payment__reservation__court__name',
+            'payment__reservation__user__email',
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def statement_totals(site_id, year, month):
+    """Totaux du site pour le mois (une requête)."""
+    charge, refund, fee = (Q(entry_type=entry_type) for entry_type in ('CHARGE', 'REFUND', 'FEE'))
+    return month_entries(site_id, year, month).aggregate(
+        payment_count=Count('id', filter=charge),
+        refund_count=Count('id', filter=refund),
+        gross_amount=Sum('amount', filter=charge, default=ZERO),
+        # Remboursements et frais sont des écritures négatives
+        refund_amount=Sum(-F('amount'), filter=refund, default=ZERO),
+        fee_amount=Sum(-F('amount'), filter=fee, default=ZERO),
+        net_amount=Sum('amount', default=ZERO),
+    )
+
+
+def build_statement(site_id, year, month):
+    """
+    Générer le relevé d'un site; exécuté dans un processus du pool.
+
+    Retourne `(site_id, nom du fichier, totaux)`.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    writer.writerow(HEADER)
+    local = timezone.localtime
+
+    for occurred_at, entry_type, amount, reference, reservation_id, court, email in statement_rows(
+        site_id, year, month
+    ):
+        writer.writerow((local(occurred_at).strftime('%Y-%m-%d %H:%M'), ENTRY_LABELS[entry_type],
+                         reservation_id, court, email, reference, amount))
+
+    totals = statement_totals(site_id, year, month)
+    writer.writerow(())
+    for label, key in (('Total encaissé', 'gross_amount'), ('Total remboursé', 'refund_amount'),
+                       ('Total frais', 'fee_amount'), ('Net', 'net_amount')):
+        writer.writerow((label, '', '', '', '', '', totals[key]))
+
+    name = f'{UPLOAD_TO}/site-{site_id}-{year}-{month:02d}.csv'
+    # BOM UTF-8 pour l'ouverture directe dans un tableur
+    name = store_file(name, buffer.getvalue().encode('utf-8-sig'))
+    return site_id, name, totals
+
+
+def _build(args):
+    return build_statement(*args)
+
+
+def generate_statements(site_ids, year, month, pool=None):
+    """Générer les relevés des sites (en parallèle si `pool` est fourni)."""
+    jobs = [(site_id, year, month) for site_id in site_ids]
+    results = pool.map(_build, jobs) if pool is not None else map(_build, jobs)
+    statements = []
+    for site_id, name, totals in results:
+        with transaction.atomic():
+            previous = (
+                Statement.objects.filter(site_id=site_id, year=year, month=month)
+                .values_list('file', flat=True).first()
+            )
+            statement, _ = Statement.objects.update_or_create(
+                site_id=site_id, year=year, month=month,
+                defaults=dict(totals, file=name),
+            )
+            if previous != name:
+                discard_files([previous])
+        statements.append(statement)
+    return statements
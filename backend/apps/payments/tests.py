@@ -2,14 +2,20 @@
 Tests pour les modèles de paiement.
 """
 
-from django.test import TestCase
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 from apps.auth_app.models import Role, CustomUser
 from apps.sites.models import Site
 from apps.courts.models import Court
 from apps.reservations.models import Reservation
-from apps.payments.models import Payment
+from apps.payments.models import Payment, Invoice, WebhookEvent, LedgerEntry, SiteBalance
 
 
 class PaymentTestCase(TestCase):
@@ -98,3 +104,605 @@ class PaymentTestCase(TestCase):
         # La réservation doit être confirmée
         self.reservation.refresh_from_db()
         self.assertEqual(self.reservation.status, 'CONFIRMED')
+    
+    def test_invoice_numbers(self):
+        """Tester la numérotation séquentielle et la réservation par blocs."""
+        from apps.payments.models import InvoiceSequence
+        
+        payment = Payment.objects.create(
+            reservation=self.reservation,
+            amount=25.00,
+            currency='EUR',
+            method='STRIPE',
+            status='SUCCESS'
+        )
+        first = Invoice.objects.create(payment=payment)
+        numbers = Invoice.allocate_numbers(3)
+        today = timezone.localdate()
+        prefix = f"INV-{today.year}-{today.month:02d}-"
+        self.assertEqual(first.invoice_number, prefix + '00001')
+        self.assertEqual(numbers, [prefix + f'{n:05d}' for n in (2, 3, 4)])
+        self.assertEqual(
+            InvoiceSequence.objects.get(year=today.year, month=today.month).last_number, 4
+        )
+    
+    def test_invoice_pdf_rendering(self):
+        """Tester la génération des PDF en arrière-plan."""
+        import shutil
+        import tempfile
+        from django.core.management import call_command
+        
+        payment = Payment.objects.create(
+            reservation=self.reservation,
+            amount=25.00,
+            currency='EUR',
+            method='STRIPE',
+            status='SUCCESS'
+        )
+        invoice = Invoice.objects.create(payment=payment)
+        self.assertEqual(invoice.render_task.status, 'PENDING')
+        self.assertFalse(invoice.pdf_file)
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command('render_invoices', once=True, processes=0, stdout=StringIO())
+            invoice.refresh_from_db()
+            self.assertEqual(invoice.render_task.status, 'DONE')
+            with invoice.pdf_file.open('rb') as pdf:
+                content = pdf.read()
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.rstrip().endswith(b'%%EOF'))
+        
+        # Les lignes au-delà d'une page passent sur les suivantes
+        from apps.payments.pdf import build_pdf
+        document = build_pdf([f'Ligne {i}' for i in range(120)])
+        self.assertIn(b'/Count 3', document)
+        self.assertEqual(document.count(b'/Type /Page '), 3)
+    
+    def test_invoice_rendering_pool(self):
+        """Tester le rendu par le pool de processus et la reprise d'un bail expiré."""
+        import shutil
+        import tempfile
+        from django.core.management import call_command
+        from apps.payments.models import InvoiceRenderTask
+        from apps.payments.rendering import claim_tasks
+        
+        payment = Payment.objects.create(
+            reservation=self.reservation, amount=Decimal('25.00'), currency='EUR',
+            method='STRIPE', status='SUCCESS'
+        )
+        invoice = Invoice.objects.create(payment=payment)
+        
+        # Tâche réclamée par un worker arrêté: reprise seulement après le bail
+        tasks, _ = claim_tasks(10)
+        self.assertEqual([task.invoice_id for task in tasks], [invoice.id])
+        self.assertEqual(claim_tasks(10)[0], [])
+        InvoiceRenderTask.objects.filter(invoice=invoice).update(
+            claimed_at=timezone.now() - timedelta(hours=1)
+        )
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command('render_invoices', once=True, processes=1, stdout=StringIO())
+            invoice.refresh_from_db()
+            task = invoice.render_task
+            self.assertEqual((task.status, task.attempts, task.claimed_at), ('DONE', 2, None))
+            first = invoice.pdf_file.name
+            
+            # Un nouveau rendu remplace le fichier sans l'écraser en place
+            InvoiceRenderTask.objects.filter(invoice=invoice).update(status='PENDING')
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('render_invoices', once=True, processes=1, stdout=StringIO())
+            invoice.refresh_from_db()
+            self.assertNotEqual(invoice.pdf_file.name, first)
+            self.assertFalse(invoice.pdf_file.storage.exists(first))
+            with invoice.pdf_file.open('rb') as pdf:
+                self.assertTrue(pdf.read().startswith(b'%PDF-'))
+    
+    def test_backfill_invoice_pdfs_keeps_leases(self):
+        """Tester que la reprise des PDF ne relance pas une tâche tenue par un worker."""
+        import shutil
+        import tempfile
+        from django.core.management import call_command
+        from apps.payments.models import InvoiceRenderTask
+        
+        invoices = []
+        for i in range(2):
+            start = self.reservation.start_datetime + timedelta(hours=2 * (i + 1))
+            reservation = Reservation.objects.create(
+                user=self.client, court=self.court, start_datetime=start,
+                end_datetime=start + timedelta(hours=1), price_per_hour=25.00, total_amount=25.00
+            )
+            payment = Payment.objects.create(
+                reservation=reservation, amount=Decimal('25.00'), method='STRIPE', status='SUCCESS',
+                stripe_payment_intent_id=f'pi_backfill_{i}'
+            )
+            invoices.append(Invoice.objects.create(payment=payment))
+        held, failed = invoices
+        InvoiceRenderTask.objects.filter(invoice=held).update(status='IN_PROGRESS', claimed_at=timezone.now())
+        InvoiceRenderTask.objects.filter(invoice=failed).update(status='FAILED', attempts=3)
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command('backfill_invoice_pdfs', processes=0, stdout=StringIO())
+        self.assertEqual(InvoiceRenderTask.objects.get(invoice=held).status, 'IN_PROGRESS')
+        self.assertEqual(InvoiceRenderTask.objects.get(invoice=failed).status, 'DONE')
+    
+    def test_monthly_statement(self):
+        """Tester la génération et le téléchargement d'un relevé mensuel."""
+        import shutil
+        import tempfile
+        from django.core.management import call_command
+        
+        from django.core.management.base import CommandError
+        
+        payment = Payment.objects.create(
+            reservation=self.reservation, amount=Decimal('25.00'), currency='EUR',
+            method='STRIPE', status='PENDING', stripe_payment_intent_id='pi_statement_1'
+        )
+        payment.mark_as_paid()
+        # Le remboursement est daté par son écriture, pas par `updated_at`
+        payment.refund()
+        Payment.objects.filter(pk=payment.pk).update(updated_at=timezone.now() - timedelta(days=400))
+        
+        today = timezone.localdate()
+        with self.assertRaises(CommandError):
+            call_command('generate_statements', month=f'{today.year}-13', processes=0, stdout=StringIO())
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root):
+            call_command(
+                'generate_statements', month=f'{today.year}-{today.month}',
+                processes=0, stdout=StringIO()
+            )
+            statement = self.site.statements.get()
+            fee = Payment.processing_fee(Decimal('25.00'))
+            self.assertEqual((statement.payment_count, statement.refund_count), (1, 1))
+            self.assertEqual(statement.gross_amount, Decimal('25.00'))
+            self.assertEqual(statement.refund_amount, Decimal('25.00'))
+            self.assertEqual(statement.fee_amount, fee)
+            self.assertEqual(statement.net_amount, -fee)
+            
+            api = APIClient()
+            api.force_authenticate(self.manager)
+            response = api.get(f'/api/payments/statements/{statement.id}/download/')
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertIn('PAIEMENT', content)
+        self.assertIn('REMBOURSEMENT', content)
+        self.assertIn('pi_statement_1', content)
+    
+    def test_sparse_fields_and_expand(self):
+        """Tester `?fields=` et `?expand=` sur la liste des paiements."""
+        Payment.objects.create(
+            reservation=self.reservation,
+            amount=25.00,
+            currency='EUR',
+            method='STRIPE',
+            status='PENDING'
+        )
+        api = APIClient()
+        api.force_authenticate(self.client)
+        
+        results = api.get('/api/payments/payments/').json()['results']
+        self.assertNotIn('reservation_details', results[0])
+        
+        results = api.get('/api/payments/payments/?expand=reservation_details').json()['results']
+        self.assertEqual(results[0]['reservation_details']['court_name'], 'Terrain 1')
+        
+        results = api.get('/api/payments/payments/?fields=id,status').json()['results']
+        self.assertEqual(set(results[0]), {'id', 'status'})
+    
+    def test_payment_list_queries_and_totals(self):
+        """Tester le nombre de requêtes constant et les totaux de la liste."""
+        from decimal import Decimal
+        
+        statuses = ['SUCCESS', 'SUCCESS', 'REFUNDED', 'PENDING']
+        for i, payment_status in enumerate(statuses):
+            start = self.reservation.start_datetime + timedelta(hours=2 * (i + 1))
+            reservation = Reservation.objects.create(
+                user=self.client, court=self.court, start_datetime=start,
+                end_datetime=start + timedelta(hours=1), price_per_hour=25.00,
+                total_amount=25.00, status='CONFIRMED'
+            )
+            Payment.objects.create(
+                reservation=reservation, amount=Decimal('25.00'), currency='EUR',
+                method='STRIPE', status=payment_status, stripe_payment_intent_id=f'pi_{i}'
+            )
+        api = APIClient()
+        api.force_authenticate(self.client)
+        
+        # Comptage de la pagination, totaux, page
+        with self.assertNumQueries(3):
+            data = api.get('/api/payments/payments/?expand=reservation_details').json()
+        self.assertEqual(len(data['results']), 4)
+        self.assertEqual(data['totals'], {
+            'count': 4,
+            'amount': '50.00',
+            'refunded_amount': '25.00',
+            'by_status': {'PENDING': 1, 'SUCCESS': 2, 'FAILED': 0, 'REFUNDED': 1},
+        })
+        
+        data = api.get('/api/payments/payments/?status=SUCCESS').json()
+        self.assertEqual(data['totals']['count'], 2)
+        
+        # Pagination désactivée: résultats et totaux dans la même enveloppe
+        from unittest import mock
+        from apps.payments.views import PaymentViewSet
+        with mock.patch.object(PaymentViewSet, 'pagination_class', None):
+            data = api.get('/api/payments/payments/?status=SUCCESS').json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['totals']['count'], 2)
+    
+    def test_ledger_balance(self):
+        """Test des écritures du grand livre et du solde du site"""
+        payment = Payment.objects.create(
+            reservation=self.reservation,
+            amount=25.00,
+            method='CARD',
+            status='PENDING'
+        )
+        payment.mark_as_paid()
+        payment.refund()
+        # Rejouer les écritures ne crée pas de doublon
+        LedgerEntry.record_charges([payment])
+        LedgerEntry.record_refunds([payment])
+        
+        entries = LedgerEntry.objects.filter(site=self.site)
+        self.assertEqual(
+            [(entry.entry_type, entry.amount) for entry in entries],
+            [('CHARGE', Decimal('25.00')), ('FEE', Decimal('-0.63')), ('REFUND', Decimal('-25.00'))]
+        )
+        balance = SiteBalance.objects.get(site=self.site)
+        self.assertEqual(balance.revenue, Decimal('25.00'))
+        self.assertEqual(balance.refunds, Decimal('25.00'))
+        self.assertEqual(balance.fees, Decimal('0.63'))
+        self.assertEqual(balance.balance, Decimal('-0.63'))
+        self.assertEqual(entries.last().balance_after, balance.balance)
+        with self.assertRaises(ValueError):
+            entries.first().save()
+        
+        api = APIClient()
+        api.force_authenticate(self.manager)
+        data = api.get('/api/reservations/site_stats/', {'site_id': self.site.id}).json()
+        # Chiffre d'affaires des réservations confirmées (la réservation
+        # remboursée est annulée); montants du grand livre sous leurs propres clés
+        self.assertEqual(data['total_revenue'], 0.0)
+        self.assertEqual(data['ledger_revenue'], 25.0)
+        self.assertEqual(data['ledger_refunds'], 25.0)
+        self.assertEqual(data['payout_balance'], -0.63)
+        
+        # Un paiement comptabilisé ne peut plus être supprimé
+        from django.db.models import ProtectedError
+        with self.assertRaises(ProtectedError):
+            payment.delete()
+
+
+
+EMULATOR = 'apps.payments.emulator.EmulatedStripeGateway'
+
+
+@override_settings(PAYMENT_GATEWAY=EMULATOR, STRIPE_EMULATOR_AUTO_CONFIRM=True)
+class PaymentGatewayTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        manager_role = Role.objects.create(name='MANAGER')
+        client_role = Role.objects.create(name='CLIENT')
+        manager = CustomUser.objects.create_user(
+            username='manager', email='manager@example.com',
+            password='password', role=manager_role
+        )
+        self.user = CustomUser.objects.create_user(
+            username='client', email='client@example.com',
+            password='password', role=client_role
+        )
+        site = Site.objects.create(
+            name='Centre Sportif Paris', address='123 Rue de Paris', city='Paris',
+            postal_code='75001', latitude=48.8566, longitude=2.3522, manager=manager
+        )
+        court = Court.objects.create(
+            name='Terrain 1', sport_type='TENNIS', site=site, price_per_hour=25.00
+        )
+        start = timezone.now() + timedelta(days=1)
+        self.reservation = Reservation.objects.create(
+            user=self.user, court=court, start_datetime=start,
+            end_datetime=start + timedelta(hours=1), price_per_hour=25.00,
+            total_amount=25.00, status='PENDING'
+        )
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+    
+    def test_payment_flow_with_emulator(self):
+        """Tester le parcours complet de paiement contre l'émulateur."""
+        response = self.api.post(
+            '/api/payments/payments/create_payment_intent/',
+            {'reservation_id': self.reservation.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['amount'], 25.0)
+        
+        response = self.api.post(
+            '/api/payments/payments/confirm_payment/',
+            {'payment_intent_id': response.json()['payment_intent_id']}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'SUCCESS')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'CONFIRMED')
+        self.assertTrue(Invoice.objects.filter(payment__reservation=self.reservation).exists())
+    
+    @override_settings(STRIPE_EMULATOR_FAILURE_RATE=1.0)
+    def test_gateway_error(self):
+        """Tester la réponse 400 quand le prestataire renvoie une erreur."""
+        response = self.api.post(
+            '/api/payments/payments/create_payment_intent/',
+            {'reservation_id': self.reservation.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+    
+    @override_settings(STRIPE_EMULATOR_TIMEOUT_RATE=1.0, PAYMENT_GATEWAY_READ_TIMEOUT=0)
+    def test_gateway_timeout(self):
+        """Tester la réponse 503 quand le prestataire ne répond pas à temps."""
+        response = self.api.post(
+            '/api/payments/payments/create_payment_intent/',
+            {'reservation_id': self.reservation.id}, format='json'
+        )
+        self.assertEqual(response.status_code, 503)
+    
+    def test_webhook_inbox(self):
+        """Tester la mise en file des webhooks puis leur traitement par lots."""
+        from django.core.management import call_command
+        from apps.payments.gateway import get_gateway
+        
+        response = self.api.post(
+            '/api/payments/payments/create_payment_intent/',
+            {'reservation_id': self.reservation.id}, format='json'
+        )
+        gateway = get_gateway()
+        event = gateway.succeed(response.json()['payment_intent_id'])
+        payload = json.dumps(event)
+        
+        for _ in range(2):
+            response = self.client.post(
+                '/api/payments/stripe-webhook/', payload, content_type='application/json',
+                HTTP_STRIPE_SIGNATURE=gateway.sign_payload(payload)
+            )
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'PENDING')
+        # Événement malformé dans le même lot: il ne bloque pas les autres
+        WebhookEvent.objects.create(
+            event_id='evt_malformed', event_type='payment_intent.succeeded', payload={'id': 'evt_malformed'}
+        )
+        
+        call_command('process_webhooks', once=True, stdout=StringIO())
+        
+        good = WebhookEvent.objects.get(event_id=event['id'])
+        self.assertEqual((good.status, good.attempts), ('PROCESSED', 1))
+        bad = WebhookEvent.objects.get(event_id='evt_malformed')
+        self.assertEqual((bad.status, bad.attempts), ('FAILED', 5))
+        self.assertIn('KeyError', bad.error)
+        payment = Payment.objects.get(reservation=self.reservation)
+        self.assertEqual(payment.status, 'SUCCESS')
+        self.assertTrue(payment.stripe_charge_id)
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'CONFIRMED')
+        
+        # Un règlement rejoué après remboursement ne revient pas en SUCCESS
+        from apps.payments.webhooks import settle_succeeded
+        payment.refund()
+        entries = LedgerEntry.objects.count()
+        self.assertEqual(settle_succeeded({payment.stripe_payment_intent_id: 'ch_late'}), [])
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'REFUNDED')
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+    
+    @override_settings(PAYMENT_BREAKER_FAILURE_THRESHOLD=2, PAYMENT_BREAKER_RECOVERY_TIMEOUT=60)
+    def test_circuit_breaker(self):
+        """Tester l'ouverture du disjoncteur puis la sonde semi-ouverte."""
+        from apps.payments.gateway import get_gateway
+        
+        url = '/api/payments/payments/create_payment_intent/'
+        data = {'reservation_id': self.reservation.id}
+        with override_settings(STRIPE_EMULATOR_TIMEOUT_RATE=1.0, PAYMENT_GATEWAY_READ_TIMEOUT=0):
+            for _ in range(2):
+                self.assertEqual(self.api.post(url, data, format='json').status_code, 503)
+        
+        # Disjoncteur ouvert: échec immédiat, même si Stripe est rétabli
+        response = self.api.post(url, data, format='json')
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        breaker = get_gateway().breaker
+        self.assertEqual(breaker.snapshot()['state'], 'OPEN')
+        
+        # Délai de récupération écoulé: une sonde interrompue par une erreur
+        # locale ne referme pas le circuit mais libère la place de sonde
+        breaker.recovery_timeout = 0
+        def interrupted():
+            raise RuntimeError('bug local')
+        with self.assertRaises(RuntimeError):
+            breaker.call('retrieve_intent', interrupted)
+        self.assertEqual(breaker.snapshot()['state'], 'HALF_OPEN')
+        
+        # La sonde suivante réussit et referme le circuit
+        self.assertEqual(self.api.post(url, data, format='json').status_code, 201)
+        snapshot = breaker.snapshot()
+        self.assertEqual(snapshot['state'], 'CLOSED')
+        self.assertEqual(snapshot['latency_ms']['create_intent']['count'], 3)
+    
+    def test_breaker_cache_check(self):
+        """Tester le refus d'un cache non partagé pour le disjoncteur hors DEBUG."""
+        from apps.payments.checks import check_breaker_cache
+        
+        local = {'payments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        database = {'payments': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        redis = {'payments': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://'}}
+        with override_settings(DEBUG=True, CACHES=local):
+            self.assertEqual(check_breaker_cache(None), [])
+        with override_settings(DEBUG=False, CACHES=local):
+            self.assertEqual([e.id for e in check_breaker_cache(None)], ['payments.E001'])
+        with override_settings(DEBUG=False, CACHES=database):
+            self.assertEqual([e.id for e in check_breaker_cache(None)], ['payments.W001'])
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_breaker_cache(None), [])
+    
+    def test_open_intent_is_reused(self):
+        """Tester la réutilisation du Payment Intent ouvert d'un paiement."""
+        from decimal import Decimal
+        from apps.payments.gateway import get_gateway
+        from apps.payments.intents import CACHE_PREFIX
+        
+        url = '/api/payments/payments/create_payment_intent/'
+        data = {'reservation_id': self.reservation.id}
+        with override_settings(STRIPE_EMULATOR_AUTO_CONFIRM=False):
+            first = self.api.post(url, data, format='json').json()
+            # Cache local expiré: relecture depuis Payment.metadata
+            payment = Payment.objects.get(reservation=self.reservation)
+            cache.delete(f'{CACHE_PREFIX}{payment.id}')
+            self.assertIn('stripe_intent', payment.metadata)
+            second = self.api.post(url, data, format='json').json()
+            self.assertEqual(first['payment_intent_id'], second['payment_intent_id'])
+            self.assertEqual(first['client_secret'], second['client_secret'])
+            
+            # Montant modifié: l'intent existant est mis à jour
+            Reservation.objects.filter(pk=self.reservation.pk).update(total_amount=Decimal('50.00'))
+            third = self.api.post(url, data, format='json').json()
+            self.assertEqual(third['payment_intent_id'], first['payment_intent_id'])
+            self.assertEqual(third['amount'], 50.0)
+            
+            gateway = get_gateway()
+            self.assertEqual(gateway.retrieve_intent(first['payment_intent_id']).amount, 5000)
+            latency = gateway.breaker.snapshot()['latency_ms']
+            self.assertEqual(latency['create_intent']['count'], 1)
+            self.assertEqual(latency['update_intent']['count'], 1)
+            
+            # Intent réglé entre-temps: enregistré, jamais remplacé
+            gateway.succeed(first['payment_intent_id'])
+            Reservation.objects.filter(pk=self.reservation.pk).update(total_amount=Decimal('60.00'))
+            response = self.api.post(url, data, format='json')
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['intent_status'], 'succeeded')
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, 'SUCCESS')
+            self.assertEqual(payment.stripe_payment_intent_id, first['payment_intent_id'])
+            self.assertEqual(gateway.breaker.snapshot()['latency_ms']['create_intent']['count'], 1)
+    
+    def test_open_intent_replaces_canceled(self):
+        """Tester le remplacement d'un intent annulé et la conservation d'un intent en cours."""
+        from decimal import Decimal
+        from apps.payments.gateway import get_gateway
+        from apps.payments.intents import IntentConflict, open_intent
+        
+        url = '/api/payments/payments/create_payment_intent/'
+        data = {'reservation_id': self.reservation.id}
+        with override_settings(STRIPE_EMULATOR_AUTO_CONFIRM=False):
+            first = self.api.post(url, data, format='json').json()
+            gateway = get_gateway()
+            intent = gateway.retrieve_intent(first['payment_intent_id'])
+            payment = Payment.objects.get(reservation=self.reservation)
+            
+            intent.status = 'processing'
+            gateway._store(intent)
+            payment.amount = Decimal('40.00')
+            with self.assertRaises(IntentConflict):
+                open_intent(payment)
+            
+            intent.status = 'canceled'
+            gateway._store(intent)
+            replaced, created = open_intent(payment)
+            self.assertTrue(created)
+            self.assertNotEqual(replaced.id, intent.id)
+    
+    def test_reconcile_payments(self):
+        """Tester le rapprochement des paiements avec le prestataire."""
+        from django.core.management import call_command
+        from apps.payments.gateway import get_gateway
+        
+        url = '/api/payments/payments/create_payment_intent/'
+        with override_settings(STRIPE_EMULATOR_AUTO_CONFIRM=False):
+            intent_id = self.api.post(
+                url, {'reservation_id': self.reservation.id}, format='json'
+            ).json()['payment_intent_id']
+            # Le client a payé mais n'a jamais rappelé l'API
+            get_gateway().succeed(intent_id)
+            
+            other = Reservation.objects.create(
+                user=self.user, court=self.reservation.court,
+                start_datetime=self.reservation.start_datetime + timedelta(hours=2),
+                end_datetime=self.reservation.end_datetime + timedelta(hours=2),
+                price_per_hour=25.00, total_amount=25.00, status='PENDING'
+            )
+            self.api.post(url, {'reservation_id': other.id}, format='json')
+        
+        report = StringIO()
+        call_command('reconcile_payments', dry_run=True, stdout=report, stderr=StringIO())
+        self.assertEqual(report.getvalue().count('pending_but_succeeded'), 1)
+        self.assertEqual(Payment.objects.get(reservation=self.reservation).status, 'PENDING')
+        
+        call_command('reconcile_payments', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Payment.objects.get(reservation=self.reservation).status, 'SUCCESS')
+        self.assertEqual(Payment.objects.get(reservation=other).status, 'PENDING')
+        self.reservation.refresh_from_db()
+        self.assertEqual(self.reservation.status, 'CONFIRMED')
+    
+    def test_court_closure_refunds(self):
+        """Tester la fermeture d'un terrain et les remboursements en file."""
+        from django.core.management import call_command
+        from apps.payments.models import RefundTask
+        from apps.payments.refunds import claim_tasks
+        
+        intent_id = self.api.post(
+            '/api/payments/payments/create_payment_intent/',
+            {'reservation_id': self.reservation.id}, format='json'
+        ).json()['payment_intent_id']
+        self.api.post(
+            '/api/payments/payments/confirm_payment/',
+            {'payment_intent_id': intent_id}, format='json'
+        )
+        court = self.reservation.court
+        unpaid = Reservation.objects.create(
+            user=self.user, court=court,
+            start_datetime=self.reservation.start_datetime + timedelta(hours=2),
+            end_datetime=self.reservation.end_datetime + timedelta(hours=2),
+            price_per_hour=25.00, total_amount=25.00, status='PENDING'
+        )
+        
+        manager = APIClient()
+        manager.force_authenticate(CustomUser.objects.get(username='manager'))
+        response = manager.post(f'/api/courts/courts/{court.id}/close/', {
+            'start_datetime': self.reservation.start_datetime.isoformat(),
+            'end_datetime': (unpaid.end_datetime + timedelta(hours=1)).isoformat(),
+            'reason': 'Tournoi',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        closure = response.json()
+        self.assertEqual(closure['reservations_cancelled'], 2)
+        self.assertEqual(closure['refunds'], {'total': 1, 'pending': 1, 'done': 0, 'failed': 0})
+        self.assertEqual(closure['status'], 'RUNNING')
+        self.assertEqual(
+            set(Reservation.objects.values_list('status', flat=True)), {'CANCELLED'}
+        )
+        self.assertTrue(court.blocked_periods.exists())
+        
+        # Une tâche réclamée n'est pas reprise par un autre worker avant la fin du bail
+        tasks, _ = claim_tasks(10)
+        self.assertEqual([task.status for task in tasks], ['IN_PROGRESS'])
+        self.assertEqual(claim_tasks(10)[0], [])
+        self.assertEqual(manager.get(f"/api/courts/closures/{closure['id']}/").json()['refunds']['pending'], 1)
+        
+        # Bail expiré (worker arrêté en cours de lot): la tâche est reprise
+        RefundTask.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+        call_command('process_refunds', once=True, workers=2, stdout=StringIO())
+        payment = Payment.objects.get(reservation=self.reservation)
+        self.assertEqual(payment.status, 'REFUNDED')
+        self.assertTrue(LedgerEntry.objects.filter(payment=payment, entry_type='REFUND').exists())
+        self.assertEqual(RefundTask.objects.get().status, 'DONE')
+        
+        data = manager.get(f"/api/courts/closures/{closure['id']}/").json()
+        self.assertEqual(data['status'], 'DONE')
+        self.assertEqual(data['refunds']['done'], 1)
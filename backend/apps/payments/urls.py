@@ -4,15 +4,21 @@ URLs pour la gestion des paiements.
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PaymentViewSet, InvoiceViewSet, stripe_webhook
+from .views import (
+    PaymentViewSet, InvoiceViewSet, StatementViewSet, SiteBalanceViewSet,
+    stripe_webhook, gateway_health
+)
 
 router = DefaultRouter()
 router.register(r'payments', PaymentViewSet, basename='payment')
 router.register(r'invoices', InvoiceViewSet, basename='invoice')
+router.register(r'statements', StatementViewSet, basename='statement')
+router.register(r'balances', SiteBalanceViewSet, basename='balance')
 
 app_name = 'payments'
 
 urlpatterns = [
     path('', include(router.urls)),
     path('stripe-webhook/', stripe_webhook, name='stripe-webhook'),
+    path('gateway-health/', gateway_health, name='gateway-health'),
 ]
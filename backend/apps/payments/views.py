@@ -2,36 +2,60 @@
 Vues pour la gestion des paiements.
 """
 
-import stripe
-import json
 import logging
-from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, FileResponse
 from rest_framework import viewsets, status
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
-from django.utils import timezone
+from django.db import transaction
+from django.db.models import Count, Q, Sum
 
-from apps.payments.models import Payment, Invoice
+from apps.payments.models import Payment, Invoice, Statement, SiteBalance
+from apps.payments.gateway import get_gateway, GatewayError, GatewayUnavailable, InvalidSignature
+from apps.payments.breaker import CircuitOpenError, prometheus_metrics
+from apps.payments.intents import IntentConflict, open_intent
+from apps.payments.webhooks import store_event
 from apps.payments.serializers import (
     PaymentSerializer,
     PaymentCreateSerializer,
     StripePaymentIntentSerializer,
-    InvoiceSerializer
+    InvoiceSerializer,
+    StatementSerializer,
+    SiteBalanceSerializer
 )
 from apps.reservations.models import Reservation
-from apps.core.permissions import IsClient
+from apps.core.permissions import IsClient, IsAdmin
+from apps.core.mixins import SparseFieldsMixin
 
 logger = logging.getLogger(__name__)
 
-# Configurer Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
 
+def gateway_error_response(error, message='Erreur Stripe'):
+    """Réponse d'erreur commune aux appels vers le prestataire."""
+    if isinstance(error, CircuitOpenError):
+        return Response(
+            {
+                'error': 'Service de paiement temporairement indisponible, réessayez plus tard',
+                'retry_after': error.retry_after
+            },
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(error.retry_after)}
+        )
+    if isinstance(error, GatewayUnavailable):
+        return Response(
+            {'error': 'Service de paiement temporairement indisponible'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return Response(
+        {'error': f'{message}: {str(error)}'},
+        status=status.HTTP_400_BAD_REQUEST
+    )
 
-class PaymentViewSet(viewsets.ModelViewSet):
+
+class PaymentViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet pour la gestion des paiements."""
     
     permission_classes = [AllowAny]
@@ -39,18 +63,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'method']
     
     def get_queryset(self):
-        from apps.auth_app.models import CustomUser
-        
         user = self.request.user
         user_email = self.request.query_params.get('user_email', None)
         
         # If user_email is provided, use that
         if user_email:
-            try:
-                user_obj = CustomUser.objects.get(email=user_email)
-                return Payment.objects.filter(reservation__user=user_obj)
-            except CustomUser.DoesNotExist:
-                return Payment.objects.none()
+            return Payment.objects.filter(reservation__user__email=user_email)
         
         # Otherwise use authenticated user
         if user and user.is_authenticated and hasattr(user, 'role') and user.role:
@@ -60,6 +78,37 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 return Payment.objects.filter(reservation__court__site__manager=user)
         return Payment.objects.all()
     
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+            response.data['totals'] = self.get_totals(queryset)
+            return response
+        
+        # Sans pagination, même enveloppe pour garder les totaux
+        serializer = self.get_serializer(queryset, many=True)
+        return Response({'results': serializer.data, 'totals': self.get_totals(queryset)})
+    
+    def get_totals(self, queryset):
+        """Totaux des paiements filtrés, en une seule requête d'agrégation."""
+        aggregates = {
+            'total_count': Count('id'),
+            'total_amount': Sum('amount', filter=Q(status='SUCCESS')),
+            'total_refunded': Sum('amount', filter=Q(status='REFUNDED')),
+        }
+        for code, _ in Payment.STATUS_CHOICES:
+            aggregates[f'count_{code}'] = Count('id', filter=Q(status=code))
+        values = queryset.order_by().aggregate(**aggregates)
+        return {
+            'count': values['total_count'],
+            'amount': f"{values['total_amount'] or 0:.2f}",
+            'refunded_amount': f"{values['total_refunded'] or 0:.2f}",
+            'by_status': {code: values[f'count_{code}'] for code, _ in Payment.STATUS_CHOICES},
+        }
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return PaymentCreateSerializer
@@ -97,10 +146,13 @@ class PaymentViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                # Créer le Payment Intent
-                intent = stripe.PaymentIntent.create(
-                    amount=int(float(payment.amount) * 100),  # Convertir en centimes
-                    currency=payment.currency.lower(),
+                if payment.amount != reservation.total_amount:
+                    payment.amount = reservation.total_amount
+                    payment.save(update_fields=['amount', 'updated_at'])
+                
+                # Réutiliser le Payment Intent ouvert, ou en créer un
+                intent, _ = open_intent(
+                    payment,
                     description=f'Réservation {reservation.id} - {reservation.court.name}',
                     metadata={
                         'payment_id': payment.id,
@@ -108,10 +160,6 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     }
                 )
                 
-                ## Sauvegarder l'ID du Payment Intent
-                payment.stripe_payment_intent_id = intent.id
-                payment.save()
-                
                 return Response({
                     'payment_intent_id': intent.id,
                     'client_secret': intent.client_secret,
@@ -124,12 +172,14 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     {'error': 'Réservation non trouvée'},
                     status=status.HTTP_404_NOT_FOUND
                 )
-            except stripe.error.StripeError as e:
-                logger.error(f"Stripe error: {str(e)}")
+            except IntentConflict as e:
                 return Response(
-                    {'error': f'Erreur Stripe: {str(e)}'},
-                    status=status.HTTP_400_BAD_REQUEST
+                    {'error': str(e), 'payment_intent_id': e.intent.id, 'intent_status': e.intent.status},
+                    status=status.HTTP_409_CONFLICT
                 )
+            except GatewayError as e:
+                logger.error(f"Stripe error: {str(e)}")
+                return gateway_error_response(e)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -146,7 +196,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         try:
             # Récupérer le Payment Intent Stripe
-            intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+            intent = get_gateway().retrieve_intent(payment_intent_id)
             
             if intent.status != 'succeeded':
                 return Response(
@@ -157,20 +207,15 @@ class PaymentViewSet(viewsets.ModelViewSet):
             # Récupérer le paiement
             payment = Payment.objects.get(stripe_payment_intent_id=payment_intent_id)
             
-            # Marquer le paiement comme réussi
-            payment.status = 'SUCCESS'
-            payment.stripe_charge_id = intent.latest_charge
-            payment.transaction_reference = intent.id
-            payment.paid_at = timezone.now()
-            payment.save()
-            
-            # Confirmer la réservation
-            reservation = payment.reservation
-            reservation.status = 'CONFIRMED'
-            reservation.save()
-            
-            # Créer une facture
-            Invoice.objects.get_or_create(payment=payment)
+            # Marquer le paiement comme réussi et confirmer la réservation
+            with transaction.atomic():
+                payment.mark_as_paid(
+                    stripe_charge_id=intent.latest_charge,
+                    transaction_reference=intent.id
+                )
+                
+                # Créer une facture
+                Invoice.objects.get_or_create(payment=payment)
             
             return Response(
                 PaymentSerializer(payment).data,
@@ -182,12 +227,9 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 {'error': 'Paiement non trouvé'},
                 status=status.HTTP_404_NOT_FOUND
             )
-        except stripe.error.StripeError as e:
+        except GatewayError as e:
             logger.error(f"Stripe error: {str(e)}")
-            return Response(
-                {'error': f'Erreur Stripe: {str(e)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            return gateway_error_response(e)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def refund(self, request, pk=None):
@@ -209,31 +251,24 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         try:
             # Rembourser via Stripe
-            refund = stripe.Refund.create(
-                payment_intent=payment.stripe_payment_intent_id
+            get_gateway().refund(
+                payment.stripe_payment_intent_id, idempotency_key=f'refund-{payment.id}'
             )
             
-            # Mettre à jour le paiement
-            payment.status = 'REFUNDED'
-            payment.save()
-            
-            # Annuler la réservation
-            payment.reservation.cancel()
+            # Mettre à jour le paiement et annuler la réservation
+            payment.refund()
             
             return Response(
                 PaymentSerializer(payment).data,
                 status=status.HTTP_200_OK
             )
         
-        except stripe.error.StripeError as e:
+        except GatewayError as e:
             logger.error(f"Stripe refund error: {str(e)}")
-            return Response(
-                {'error': f'Erreur lors du remboursement: {str(e)}'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+            return gateway_error_response(e, 'Erreur lors du remboursement')
 
 
-class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
+class InvoiceViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les factures."""
     
     permission_classes = [IsAuthenticated]
@@ -265,6 +300,68 @@ class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
         })
 
 
+class StatementViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """ViewSet pour les relevés mensuels des sites."""
+    
+    permission_classes = [IsAuthenticated]
+    serializer_class = StatementSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['site', 'year', 'month']
+    
+    def get_queryset(self):
+        user = self.request.user
+        if user.role.name == 'MANAGER':
+            return Statement.objects.filter(site__manager=user)
+        elif user.role.name == 'ADMIN':
+            return Statement.objects.all()
+        return Statement.objects.none()
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Télécharger un relevé (CSV envoyé en flux)."""
+        statement = self.get_object()
+        
+        if not statement.file:
+            return Response(
+                {'error': 'Relevé non disponible'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return FileResponse(
+            statement.file.open('rb'),
+            as_attachment=True,
+            filename=f'releve-{statement.site_id}-{statement.year}-{statement.month:02d}.csv',
+            content_type='text/csv; charset=utf-8'
+        )
+
+
+class SiteBalanceViewSet(SparseFieldsMixin, viewsets.ReadOnlyModelViewSet):
+    """Soldes des sites (chiffre d'affaires, remboursements, frais, à reverser)."""
+    
+    permission_classes = [IsAuthenticated]
+    serializer_class = SiteBalanceSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['site']
+    
+    def get_queryset(self):
+        user = self.request.user
+        if user.role.name == 'MANAGER':
+            return SiteBalance.objects.filter(site__manager=user)
+        elif user.role.name == 'ADMIN':
+            return SiteBalance.objects.all()
+        return SiteBalance.objects.none()
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsAdmin])
+def gateway_health(request):
+    """État du disjoncteur et histogrammes de latence de la passerelle."""
+    snapshot = get_gateway().breaker.snapshot()
+    if request.query_params.get('output') == 'prometheus':
+        return HttpResponse(prometheus_metrics(snapshot), content_type='text/plain; version=0.0.4')
+    return Response(snapshot)
+
+
 @csrf_exempt
 def stripe_webhook(request):
     """Webhook pour traiter les événements Stripe."""
@@ -272,44 +369,13 @@ def stripe_webhook(request):
     sig_header = request.META.get('HTTP_STRIPE_SIGNATURE')
     
     try:
-        event = stripe.Webhook.construct_event(
-            payload,
-            sig_header,
-            settings.STRIPE_WEBHOOK_SECRET
-        )
-    except ValueError:
-        return JsonResponse({'error': 'Invalid payload'}, status=400)
-    except stripe.error.SignatureVerificationError:
+        get_gateway().construct_event(payload, sig_header)
+    except InvalidSignature:
         return JsonResponse({'error': 'Invalid signature'}, status=400)
+    except GatewayError:
+        return JsonResponse({'error': 'Invalid payload'}, status=400)
     
-    # Traiter les événements pertinents
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        handle_payment_success(payment_intent)
-    
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        handle_payment_failed(payment_intent)
+    # Mise en file de l'événement: le traitement est fait par `process_webhooks`
+    store_event(payload)
     
     return JsonResponse({'status': 'success'})
-
-
-def handle_payment_success(payment_intent):
-    """Gérer le succès d'un paiement."""
-    try:
-        payment = Payment.objects.get(stripe_payment_intent_id=payment_intent.id)
-        payment.mark_as_paid()
-        logger.info(f"Payment {payment.id} marked as successful")
-    except Payment.DoesNotExist:
-        logger.warning(f"Payment Intent {payment_intent.id} not found in database")
-
-
-def handle_payment_failed(payment_intent):
-    """Gérer l'échec d'un paiement."""
-    try:
-        payment = Payment.objects.get(stripe_payment_intent_id=payment_intent.id)
-        payment.status = 'FAILED'
-        payment.save()
-        logger.info(f"Payment {payment.id} marked as failed")
-    except Payment.DoesNotExist:
-        logger.warning(f"Payment Intent {payment_intent.id} not found in database")
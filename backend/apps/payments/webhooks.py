@@ -0,0 +1,193 @@
+"""
+Traitement par lots de la boîte de réception des webhooks Stripe.
+
+Le webhook ne fait que vérifier la signature et insérer l'événement dans
+`WebhookEvent` (une requête, clé unique sur l'id Stripe): les renvois de
+Stripe sont donc dédupliqués dès la réception. La commande
+`process_webhooks` vide ensuite la boîte par lots et applique les
+transitions d'état avec des mises à jour groupées. Si le lot échoue, ses
+événements sont rejoués un par un: seul l'événement fautif compte une
+tentative en erreur, les autres sont appliqués normalement.
+"""
+
+import json
+import logging
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from apps.payments.models import Payment, Invoice, LedgerEntry, WebhookEvent
+from apps.reservations.models import Reservation
+
+logger = logging.getLogger(__name__)
+
+HANDLED_EVENTS = ('payment_intent.succeeded', 'payment_intent.payment_failed')
+MAX_ATTEMPTS = 5
+
+
+def store_event(payload):
+    """Enregistrer un événement vérifié; les doublons sont ignorés."""
+    event = json.loads(payload)
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event['id'], event_type=event['type'], payload=event)],
+        ignore_conflicts=True
+    )
+    return event
+
+
+def process_pending_events(batch_size=500):
+    """
+    Traiter un lot d'événements en attente.
+    
+    Retourne le nombre d'événements consommés (0 quand la boîte est vide).
+    """
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING')
+            .order_by('received_at')[:batch_size]
+        )
+        if not events:
+            return 0
+        
+        try:
+            with transaction.atomic():
+                outcome, errors = apply_events(events), {}
+        except Exception:
+            logger.exception("Webhook batch failed, retrying events one by one")
+            outcome, errors = apply_events_separately(events)
+        
+        now = timezone.now()
+        for event in events:
+            event.attempts += 1
+            if event.event_id in errors:
+                event.error = errors[event.event_id]
+                if event.attempts >= MAX_ATTEMPTS:
+                    event.status = 'FAILED'
+            else:
+                event.status = outcome.get(event.event_id, 'IGNORED')
+                event.error = ''
+                event.processed_at = now
+        WebhookEvent.objects.bulk_update(events, ['status', 'attempts', 'error', 'processed_at'])
+    return len(events)
+
+
+def apply_events_separately(events):
+    """
+    Appliquer les événements un par un, chacun dans son point de sauvegarde,
+    après l'échec du lot: seul l'événement fautif reste en erreur.
+    
+    Retourne `(états, erreurs)` indexés par id d'événement.
+    """
+    outcome, errors = {}, {}
+    for event in events:
+        try:
+            with transaction.atomic():
+                outcome.update(apply_events([event]))
+        except Exception as e:
+            logger.exception(f"Webhook event {event.event_id} failed")
+            errors[event.event_id] = f'{type(e).__name__}: {e}'
+    return outcome, errors
+
+
+def apply_events(events):
+    """
+    Appliquer les transitions de paiement d'un lot d'événements.
+    
+    Les événements d'un même PaymentIntent sont fusionnés: un succès
+    l'emporte sur un échec, quel que soit l'ordre d'arrivée.
+    """
+    succeeded, failed = {}, {}
+    intent_events = {}
+    for event in events:
+        if event.event_type not in HANDLED_EVENTS:
+            continue
+        intent = event.payload['data']['object']
+        intent_events.setdefault(intent['id'], []).append(event.event_id)
+        if event.event_type == 'payment_intent.succeeded':
+            succeeded[intent['id']] = intent
+        else:
+            failed[intent['id']] = intent
+    for intent_id in succeeded:
+        failed.pop(intent_id, None)
+    
+    if not intent_events:
+        return {}
+    
+    payments = settle_succeeded({
+        intent_id: intent.get('latest_charge') or ''
+        for intent_id, intent in succeeded.items()
+    })
+    settle_failed(failed)
+    
+    known = set(
+        Payment.objects.filter(stripe_payment_intent_id__in=intent_events)
+        .values_list('stripe_payment_intent_id', flat=True)
+    )
+    for intent_id in intent_events.keys() - known:
+        logger.warning(f"Payment Intent {intent_id} not found in database")
+    
+    logger.info(f"Webhooks: {len(payments)} payments succeeded, {len(failed)} intents failed")
+    return {
+        event_id: 'PROCESSED' if intent_id in known else 'IGNORED'
+        for intent_id, event_ids in intent_events.items()
+        for event_id in event_ids
+    }
+
+
+def settle_succeeded(charges):
+    """
+    Passer en SUCCESS les paiements des intents réglés, confirmer leurs
+    réservations, créer leurs factures et leurs écritures comptables, par
+    requêtes groupées.
+    
+    `charges` associe l'id du PaymentIntent à l'id de sa charge.
+    """
+    now = timezone.now()
+    sources, target = Payment.TRANSITIONS['succeed']
+    with transaction.atomic():
+        # Lignes verrouillées et état vérifié par la transition: un paiement
+        # remboursé entre-temps n'est jamais réécrit en SUCCESS, et seuls les
+        # paiements passés en SUCCESS ici confirment réservation et écritures
+        payments = list(
+            Payment.objects.select_for_update()
+            .filter(stripe_payment_intent_id__in=charges, status__in=sources)
+            .order_by('pk')
+        )
+        if not payments:
+            return []
+        charge_ids = {intent_id: charge for intent_id, charge in charges.items() if charge}
+        Payment.bulk_transition(
+            'succeed', Payment.objects.filter(pk__in=[payment.pk for payment in payments]),
+            paid_at=now,
+            updated_at=now,
+            transaction_reference=F('stripe_payment_intent_id'),
+            stripe_charge_id=Case(
+                *(When(stripe_payment_intent_id=intent_id, then=Value(charge))
+                  for intent_id, charge in charge_ids.items()),
+                default=F('stripe_charge_id'),
+            ),
+        )
+        for payment in payments:
+            intent_id = payment.stripe_payment_intent_id
+            payment.status = target
+            payment.paid_at = now
+            payment.updated_at = now
+            payment.stripe_charge_id = charge_ids.get(intent_id, payment.stripe_charge_id)
+            payment.transaction_reference = intent_id
+        Reservation.bulk_transition(
+            'confirm',
+            Reservation.objects.filter(id__in=[payment.reservation_id for payment in payments]),
+            updated_at=now
+        )
+        Invoice.create_for_payments(payments)
+        LedgerEntry.record_charges(payments)
+    return payments
+
+
+def settle_failed(intent_ids):
+    """Passer en FAILED les paiements encore en attente de ces intents."""
+    return Payment.bulk_transition(
+        'fail', Payment.objects.filter(stripe_payment_intent_id__in=intent_ids)
+    )
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Reservation
+from .models import Reservation, SlotHold, SharedSession, ReservationSeries
 
 @admin.register(Reservation)
 class ReservationAdmin(admin.ModelAdmin):
@@ -25,3 +25,21 @@ class ReservationAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+
+@admin.register(SlotHold)
+class SlotHoldAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'court', 'start_datetime', 'end_datetime', 'expires_at']
+    list_filter = ['court__site']
+    search_fields = ['user__email', 'court__name']
+
+@admin.register(SharedSession)
+class SharedSessionAdmin(admin.ModelAdmin):
+    list_display = ['id', 'court', 'start_datetime', 'end_datetime', 'spots_taken', 'capacity']
+    list_filter = ['court__site']
+    search_fields = ['court__name']
+    readonly_fields = ['spots_taken', 'created_at']
+
+@admin.register(ReservationSeries)
+class ReservationSeriesAdmin(admin.ModelAdmin):
+    list_display = ['id', 'name', 'created_by', 'created_at']
+    search_fields = ['name', 'created_by__email']
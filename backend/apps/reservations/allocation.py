@@ -0,0 +1,220 @@
+"""
+Attribution automatique d'un terrain.
+
+Pour une demande « n'importe quel terrain de tennis du site », les
+occupations de la journée de tous les terrains candidats sont lues en une
+seule requête (plus une requête pour les blocages récurrents), puis le
+terrain est choisi par « best fit »: parmi les terrains libres, celui dont
+l'intervalle libre qui contient le créneau est le plus court. Les grands
+intervalles restent ainsi disponibles pour les réservations longues et le
+planning se fragmente moins.
+
+Les mêmes occupations servent à proposer des créneaux de remplacement
+quand le créneau demandé est pris (`suggest_alternatives`) et à vérifier
+d'un coup les terrains d'une réservation de groupe (`book_courts`).
+"""
+
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.courts.models import Court, Occupancy
+from apps.courts.recurrence import active_rules, expand
+from apps.reservations.models import Reservation, SlotHold
+from apps.sites.models import OpeningHours
+
+
+def day_bounds(start, end):
+    """Début et fin de la journée locale de `start` (couvrant au moins `end`)."""
+    day_start = timezone.make_aware(datetime.combine(timezone.localtime(start).date(), time.min))
+    return day_start, max(day_start + timedelta(days=1), end)
+
+
+def busy_intervals(courts, window_start, window_end, user=None):
+    """Occupations `(début, fin)` de chaque terrain sur la fenêtre, par id de terrain."""
+    court_ids = [court.id for court in courts]
+    busy = defaultdict(list)
+    occupancies = Occupancy.objects.active().filter(
+        court_id__in=court_ids,
+        start_datetime__lt=window_end,
+        end_datetime__gt=window_start,
+    )
+    if user is not None:
+        # Les créneaux retenus par le client lui restent ouverts
+        occupancies = occupancies.exclude(
+            source_type='HOLD', source_id__in=SlotHold.objects.filter(user=user).values('id')
+        )
+    for court_id, start, end in occupancies.values_list('court_id', 'start_datetime', 'end_datetime'):
+        busy[court_id].append((start, end))
+
+    site_courts = defaultdict(list)
+    for court in courts:
+        site_courts[court.site_id].append(court.id)
+    rules = active_rules(court_ids, list(site_courts), window_start, window_end)
+    for start, end, rule in expand(rules, window_start, window_end):
+        for court_id in ([rule.court_id] if rule.court_id else site_courts[rule.site_id]):
+            busy[court_id].append((start, end))
+    return busy
+
+
+def free_interval(busy, start, end, window_start, window_end):
+    """Intervalle libre qui contient `[start, end[`, ou None s'il est occupé."""
+    before, after = window_start, window_end
+    for busy_start, busy_end in busy:
+        if busy_start < end and busy_end > start:
+            return None
+        if busy_end <= start:
+            before = max(before, busy_end)
+        else:
+            after = min(after, busy_start)
+    return before, after
+
+
+def pick_court(courts, start, end, user=None):
+    """
+    Choisir le terrain libre qui laisse le moins de fragmentation, ou None.
+
+    `courts` doit déjà être verrouillé par l'appelant pour que le choix
+    reste valable jusqu'à la création de la réservation.
+    """
+    if not courts:
+        return None
+    window_start, window_end = day_bounds(start, end)
+    busy = busy_intervals(courts, window_start, window_end, user)
+
+    best, best_key = None, None
+    for court in courts:
+        interval = free_interval(busy[court.id], start, end, window_start, window_end)
+        if interval is None:
+            continue
+        key = (interval[1] - interval[0], court.id)
+        if best_key is None or key < best_key:
+            best, best_key = court, key
+    return best
+
+
+def opening_window(site_id, start):
+    """Horaires d'ouverture `(ouverture, fermeture)` du site le jour de `start`, ou None."""
+    local = timezone.localtime(start)
+    hours = OpeningHours.objects.filter(site_id=site_id, day_of_week=local.weekday()).first()
+    if hours is None:
+        return None
+    day = local.date()
+    return (
+        timezone.make_aware(datetime.combine(day, hours.open_time)),
+        timezone.make_aware(datetime.combine(day, hours.close_time)),
+    )
+
+
+def free_gaps(busy, window_start, window_end):
+    """Intervalles libres de la fenêtre, dans l'ordre chronologique."""
+    gaps, cursor = [], window_start
+    for busy_start, busy_end in sorted(busy):
+        if busy_start > cursor:
+            gaps.append((cursor, min(busy_start, window_end)))
+        cursor = max(cursor, busy_end)
+        if cursor >= window_end:
+            break
+    if cursor < window_end:
+        gaps.append((cursor, window_end))
+    return gaps
+
+
+def suggest_alternatives(court, start, end, limit):
+    """
+    Les `limit` créneaux libres de même durée les plus proches de `start`.
+
+    Candidats: le même terrain à d'autres heures et les autres terrains du
+    même sport sur le site, le même jour, pendant les horaires d'ouverture
+    et pas dans le passé. Dans chaque intervalle libre, seul le créneau le
+    plus proche de l'heure demandée est retenu; le classement se fait par
+    écart à l'heure demandée, puis en préférant le terrain demandé.
+    Retourne une liste de `(écart, terrain, début, fin)`.
+    """
+    window = opening_window(court.site_id, start)
+    if window is None or limit <= 0:
+        return []
+    window_start = max(window[0], timezone.now())
+    window_end = window[1]
+    duration = end - start
+
+    courts = list(
+        Court.objects.filter(site_id=court.site_id, sport_type=court.sport_type, is_active=True)
+        .order_by('id')
+    )
+    busy = busy_intervals(courts, window_start, window_end)
+
+    candidates = []
+    for candidate in courts:
+        for gap_start, gap_end in free_gaps(busy[candidate.id], window_start, window_end):
+            if gap_end - gap_start < duration:
+                continue
+            slot_start = min(max(start, gap_start), gap_end - duration)
+            if candidate.id == court.id and slot_start == start:
+                continue
+            distance = abs(slot_start - start)
+            candidates.append(
+                ((distance, candidate.id != court.id, candidate.id), candidate, slot_start)
+            )
+    return [
+        (key[0], candidate, slot_start, slot_start + duration)
+        for key, candidate, slot_start in heapq.nsmallest(limit, candidates, key=lambda item: item[0])
+    ]
+
+
+def booking_amount(price_per_hour, start, end):
+    """Montant d'une réservation `[start, end[` au tarif horaire donné."""
+    hours = Decimal(str((end - start).total_seconds() / 3600))
+    return (hours * Decimal(str(price_per_hour))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def book_courts(user, court_ids, start, end, notes=''):
+    """
+    Réserver plusieurs terrains sur le même créneau, tout ou rien.
+
+    Les terrains sont verrouillés par id croissant (deux groupes qui se
+    recoupent les prennent dans le même ordre, sans interblocage), leurs
+    conflits lus en une requête, puis toutes les réservations et leurs
+    occupations insérées en deux requêtes. Retourne `(réservations,
+    conflits)`: les réservations créées (liste vide si rien n'a été écrit)
+    et les terrains refusés, `{court_id: motif}`.
+    """
+    court_ids = sorted(set(court_ids))
+    with transaction.atomic():
+        courts = list(
+            Court.objects.select_for_update().filter(id__in=court_ids, is_active=True).order_by('id')
+        )
+        found = {court.id for court in courts}
+        conflicts = {court_id: 'not_found' for court_id in court_ids if court_id not in found}
+        busy = busy_intervals(courts, start, end, user)
+        conflicts.update({court.id: 'unavailable' for court in courts if busy[court.id]})
+        if conflicts:
+            return [], conflicts
+
+        reservations = Reservation.objects.bulk_create([
+            Reservation(
+                user=user,
+                court=court,
+                start_datetime=start,
+                end_datetime=end,
+                price_per_hour=court.price_per_hour,
+                total_amount=booking_amount(court.price_per_hour, start, end),
+                notes=notes,
+            )
+            for court in courts
+        ])
+        Occupancy.objects.bulk_create([
+            Occupancy(
+                court_id=reservation.court_id,
+                start_datetime=start,
+                end_datetime=end,
+                source_type='RESERVATION',
+                source_id=reservation.pk,
+            )
+            for reservation in reservations
+        ])
+    return reservations, {}
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courts', '0004_occupancy'),
+        ('auth_app', '0001_initial'),
+        ('reservations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='courts.court')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_holds', to='auth_app.customuser')),
+            ],
+            options={
+                'verbose_name': 'Créneau retenu',
+                'verbose_name_plural': 'Créneaux retenus',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['expires_at'], name='reservation_expires_c1bffa_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:40
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courts', '0005_alter_occupancy_source_type'),
+        ('auth_app', '0001_initial'),
+        ('reservations', '0002_slothold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SharedSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField()),
+                ('end_datetime', models.DateTimeField()),
+                ('capacity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('spots_taken', models.PositiveIntegerField(default=0)),
+                ('price_per_spot', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shared_sessions', to='courts.court')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='shared_sessions', to='auth_app.customuser')),
+            ],
+            options={
+                'verbose_name': 'Session partagée',
+                'verbose_name_plural': 'Sessions partagées',
+                'ordering': ['start_datetime'],
+            },
+        ),
+        migrations.AddField(
+            model_name='reservation',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='reservations', to='reservations.sharedsession'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedsession',
+            index=models.Index(fields=['court', 'start_datetime'], name='reservation_court_i_8c77f1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='sharedsession',
+            constraint=models.CheckConstraint(check=models.Q(('spots_taken__lte', models.F('capacity'))), name='shared_session_within_capacity'),
+        ),
+    ]
@@ -2,14 +2,21 @@
 Models pour la gestion des réservations.
 """
 
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models, transaction
+from django.db.models import Count, F
 from django.core.validators import MinValueValidator
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from apps.auth_app.models import CustomUser
-from apps.courts.models import Court
+from apps.courts.models import Court, Occupancy
+from apps.core.states import StateMachineMixin, transition_done
 
 
-class Reservation(models.Model):
+class Reservation(StateMachineMixin, models.Model):
     """Modèle représentant une réservation."""
     
     STATUS_CHOICES = (
@@ -19,6 +26,12 @@ class Reservation(models.Model):
         ('COMPLETED', 'Terminée'),
     )
     
+    TRANSITIONS = {
+        'confirm': (('PENDING',), 'CONFIRMED'),
+        'cancel': (('PENDING', 'CONFIRMED'), 'CANCELLED'),
+        'complete': (('CONFIRMED',), 'COMPLETED'),
+    }
+    
     # Informations de base
     user = models.ForeignKey(
         CustomUser,
@@ -27,6 +40,22 @@ class Reservation(models.Model):
         limit_choices_to={'role__name': 'CLIENT'}
     )
     court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='reservations')
+    # Série (tournoi) dont la réservation fait partie
+    series = models.ForeignKey(
+        'ReservationSeries',
+        on_delete=models.SET_NULL,
+        related_name='reservations',
+        null=True,
+        blank=True
+    )
+    # Place dans une session partagée (le créneau est alors celui de la session)
+    session = models.ForeignKey(
+        'SharedSession',
+        on_delete=models.PROTECT,
+        related_name='reservations',
+        null=True,
+        blank=True
+    )
     
     # Plage horaire
     start_datetime = models.DateTimeField()
@@ -71,31 +100,65 @@ class Reservation(models.Model):
         now = timezone.now()
         return (self.start_datetime - now) >= timedelta(hours=24)
     
+    def confirm(self):
+        """Confirme la réservation."""
+        return self.transition('confirm')
+    
     def cancel(self):
         """Annule la réservation."""
-        if self.status == 'CANCELLED':
-            return False
-        self.status = 'CANCELLED'
-        self.cancelled_at = timezone.now()
-        self.save()
-        return True
+        return self.transition('cancel', cancelled_at=timezone.now())
     
     def clean(self):
         from django.core.exceptions import ValidationError
+        from apps.courts.recurrence import court_recurring_blocks
         
         if self.start_datetime >= self.end_datetime:
             raise ValidationError("La date de début doit être antérieure à la date de fin.")
         
-        # Vérifier chevauchement avec d'autres réservations confirmées
-        overlapping = Reservation.objects.filter(
-            court=self.court,
-            status__in=['CONFIRMED', 'PENDING'],
-            start_datetime__lt=self.end_datetime,
-            end_datetime__gt=self.start_datetime
-        ).exclude(pk=self.pk)
+        if self.status == 'CANCELLED':
+            return
         
-        if overlapping.exists():
+        # Une place de session: le créneau est déjà occupé par la session,
+        # qui doit encore être ouverte et hors de toute période bloquée
+        if self.session_id:
+            session = self.session
+            if (self.court_id, self.start_datetime, self.end_datetime) != (
+                session.court_id, session.start_datetime, session.end_datetime
+            ):
+                raise ValidationError("Le créneau doit être celui de la session.")
+            if self.pk is None and session.start_datetime <= timezone.now():
+                raise ValidationError("Cette session a déjà commencé.")
+            sources = set(
+                Occupancy.objects.overlapping(self.court_id, self.start_datetime, self.end_datetime)
+                .filter(source_type__in=['SESSION', 'BLOCKED'])
+                .values_list('source_type', 'source_id')
+            )
+            if ('SESSION', session.pk) not in sources:
+                raise ValidationError("Cette session est fermée.")
+            if any(source_type == 'BLOCKED' for source_type, _ in sources) or court_recurring_blocks(
+                self.court, self.start_datetime, self.end_datetime
+            ):
+                raise ValidationError("Ce créneau n'est pas disponible (période bloquée).")
+            return
+        
+        # Une seule requête de plage: réservations, périodes bloquées et
+        # holds des autres utilisateurs
+        conflicts = Occupancy.objects.overlapping(
+            self.court_id, self.start_datetime, self.end_datetime
+        ).exclude(
+            source_type='HOLD',
+            source_id__in=SlotHold.objects.filter(user_id=self.user_id).values('id')
+        )
+        if self.pk is not None:
+            conflicts = conflicts.exclude(source_type='RESERVATION', source_id=self.pk)
+        source_type = conflicts.values_list('source_type', flat=True).first()
+        
+        if source_type == 'RESERVATION':
             raise ValidationError("Ce créneau ne est pas disponible (chevauchement avec une autre réservation).")
+        if source_type == 'SESSION':
+            raise ValidationError("Ce créneau n'est pas disponible (session partagée).")
+        if source_type is not None or court_recurring_blocks(self.court, self.start_datetime, self.end_datetime):
+            raise ValidationError("Ce créneau n'est pas disponible (période bloquée).")
     
     def save(self, *args, **kwargs):
         if not self.price_per_hour:
@@ -104,4 +167,237 @@ class Reservation(models.Model):
             duration_hours = (self.end_datetime - self.start_datetime).total_seconds() / 3600
             self.total_amount = float(self.price_per_hour) * duration_hours
         self.full_clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if self.status == 'CANCELLED':
+                Occupancy.release('RESERVATION', [self.pk])
+            elif not self.session_id:
+                # Une place de session n'occupe pas le terrain elle-même
+                Occupancy.occupy(
+                    'RESERVATION', self.pk, self.court_id, self.start_datetime, self.end_datetime
+                )
+
+
+class SlotHold(models.Model):
+    """
+    Créneau retenu quelques minutes pendant qu'un client finalise sa
+    réservation; il bloque le créneau pour les autres utilisateurs.
+    """
+    
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='slot_holds')
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='slot_holds')
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Créneau retenu'
+        verbose_name_plural = 'Créneaux retenus'
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Hold {self.court_id} ({self.start_datetime} - {self.end_datetime})"
+    
+    @classmethod
+    def place(cls, user, court, start, end, ttl=None):
+        """
+        Retenir un créneau libre pour `user` pendant `ttl` secondes
+        (`SLOT_HOLD_TTL` par défaut). Retourne le hold, ou None si le
+        créneau est occupé.
+        """
+        from django.conf import settings
+        
+        expires_at = timezone.now() + timedelta(seconds=ttl or settings.SLOT_HOLD_TTL)
+        with transaction.atomic():
+            # Sérialiser avec les autres écritures sur ce terrain
+            list(Court.objects.select_for_update().filter(pk=court.pk).values_list('id'))
+            if Occupancy.objects.overlapping(court, start, end).exclude(
+                source_type='HOLD',
+                source_id__in=cls.objects.filter(user=user).values('id')
+            ).exists():
+                return None
+            hold = cls.objects.create(
+                user=user, court=court, start_datetime=start, end_datetime=end, expires_at=expires_at
+            )
+            Occupancy.objects.create(
+                court=court, start_datetime=start, end_datetime=end,
+                source_type='HOLD', source_id=hold.pk, expires_at=expires_at
+            )
+        return hold
+    
+    def release(self):
+        """Rendre le créneau (réservation faite ou abandonnée)."""
+        with transaction.atomic():
+            Occupancy.release('HOLD', [self.pk])
+            self.delete()
+    
+    @classmethod
+    def purge_expired(cls):
+        """Supprimer les holds expirés et leurs occupations (deux requêtes)."""
+        now = timezone.now()
+        with transaction.atomic():
+            Occupancy.objects.filter(source_type='HOLD', expires_at__lte=now).delete()
+            deleted, _ = cls.objects.filter(expires_at__lte=now).delete()
+        return deleted
+
+
+class ReservationSeries(models.Model):
+    """Réservations créées ensemble par la planification d'un tournoi."""
+    
+    name = models.CharField(max_length=255)
+    created_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        related_name='reservation_series',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Série de réservations'
+        verbose_name_plural = 'Séries de réservations'
+    
+    def __str__(self):
+        return self.name
+
+
+class SharedSessionQuerySet(models.QuerySet):
+    def open_spots(self, court, start, end):
+        """`(id, début, fin, places libres)` des sessions non complètes qui recoupent `[start, end[`."""
+        return self.filter(
+            court=court, start_datetime__lt=end, end_datetime__gt=start, spots_taken__lt=F('capacity')
+        ).annotate(spots_left=F('capacity') - F('spots_taken')).values_list(
+            'id', 'start_datetime', 'end_datetime', 'spots_left'
+        )
+
+
+class SharedSession(models.Model):
+    """
+    Session ouverte d'un terrain: jusqu'à `capacity` joueurs y réservent
+    chacun une place.
+    
+    La session occupe le terrain (table `Occupancy`) comme une réservation.
+    Le nombre de places prises est un compteur tenu par des mises à jour
+    conditionnelles (`UPDATE ... SET spots_taken = spots_taken + 1 WHERE
+    spots_taken < capacity`): pas de `COUNT(*)` sur les réservations, et
+    deux réservations concurrentes ne peuvent pas dépasser la capacité.
+    """
+    
+    court = models.ForeignKey(Court, on_delete=models.CASCADE, related_name='shared_sessions')
+    start_datetime = models.DateTimeField()
+    end_datetime = models.DateTimeField()
+    capacity = models.PositiveIntegerField(validators=[MinValueValidator(1)])
+    spots_taken = models.PositiveIntegerField(default=0)
+    price_per_spot = models.DecimalField(max_digits=10, decimal_places=2)
+    created_by = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        related_name='shared_sessions',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = SharedSessionQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['start_datetime']
+        verbose_name = 'Session partagée'
+        verbose_name_plural = 'Sessions partagées'
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(spots_taken__lte=F('capacity')), name='shared_session_within_capacity'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['court', 'start_datetime']),
+        ]
+    
+    def __str__(self):
+        return f"Session {self.court.name} ({self.start_datetime}) {self.spots_taken}/{self.capacity}"
+    
+    @property
+    def spots_left(self):
+        return self.capacity - self.spots_taken
+    
+    @classmethod
+    def open(cls, court, start, end, capacity=None, price_per_spot=None, user=None):
+        """
+        Ouvrir une session sur un créneau libre. La capacité est par défaut
+        celle du terrain et le prix d'une place la part du tarif horaire.
+        Retourne la session, ou None si le créneau est occupé.
+        """
+        from apps.courts.recurrence import court_recurring_blocks
+        
+        capacity = capacity or court.capacity
+        if price_per_spot is None:
+            hours = Decimal(str((end - start).total_seconds() / 3600))
+            price_per_spot = (hours * Decimal(str(court.price_per_hour)) / capacity).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP
+            )
+        with transaction.atomic():
+            # Sérialiser avec les autres écritures sur ce terrain
+            list(Court.objects.select_for_update().filter(pk=court.pk).values_list('id'))
+            if (Occupancy.objects.overlapping(court, start, end).exists()
+                    or court_recurring_blocks(court, start, end)):
+                return None
+            session = cls.objects.create(
+                court=court, start_datetime=start, end_datetime=end,
+                capacity=capacity, price_per_spot=price_per_spot, created_by=user
+            )
+            Occupancy.occupy('SESSION', session.pk, court.pk, start, end)
+        return session
+    
+    def take_spot(self):
+        """Prendre une place (une requête conditionnelle). Retourne False si complet."""
+        updated = SharedSession.objects.filter(
+            pk=self.pk, spots_taken__lt=F('capacity')
+        ).update(spots_taken=F('spots_taken') + 1)
+        if updated:
+            self.spots_taken += 1
+        return bool(updated)
+    
+    @classmethod
+    def close(cls, session_ids):
+        """
+        Fermer des sessions (fermeture du terrain): plus aucune place n'est
+        proposée (capacité ramenée aux places prises) et le créneau est libéré.
+        """
+        cls.objects.filter(pk__in=session_ids).update(capacity=F('spots_taken'))
+        Occupancy.release('SESSION', session_ids)
+    
+    @classmethod
+    def release_spots(cls, reservation_ids):
+        """Rendre les places des réservations données (une mise à jour par session)."""
+        counts = (
+            Reservation.objects.filter(id__in=reservation_ids, session__isnull=False)
+            .values_list('session_id').annotate(count=Count('id')).order_by()
+        )
+        for session_id, count in counts:
+            cls.objects.filter(pk=session_id, spots_taken__gte=count).update(
+                spots_taken=F('spots_taken') - count
+            )
+
+
+@receiver(transition_done, sender=Reservation)
+def release_cancelled_reservations(sender, name, instance, pks, **kwargs):
+    """Libérer le créneau ou la place des réservations annulées (même transaction)."""
+    if name == 'cancel':
+        Occupancy.release('RESERVATION', pks)
+        if instance is None or instance.session_id:
+            SharedSession.release_spots(pks)
+
+
+@receiver(post_delete, sender=Reservation)
+def release_deleted_reservation(sender, instance, **kwargs):
+    Occupancy.release('RESERVATION', [instance.pk])
+    if instance.session_id and instance.status != 'CANCELLED':
+        SharedSession.objects.filter(pk=instance.session_id, spots_taken__gt=0).update(
+            spots_taken=F('spots_taken') - 1
+        )
@@ -0,0 +1,298 @@
+"""
+Planification de tournois.
+
+Un tournoi est une liste de matchs (durée, participants) à placer sur un
+ensemble de terrains dans une fenêtre de dates. Les données sont lues une
+seule fois: horaires d'ouverture des sites, occupations de tous les
+terrains sur la fenêtre (une requête) et blocages récurrents. Le reste se
+fait en mémoire:
+
+- placement glouton dans l'ordre du temps: l'instant libre le plus tôt
+  d'un terrain (sur la grille de `step`) reçoit le match le plus contraint
+  qui peut s'y jouer (participants ayant le plus de matchs restants, puis
+  match le plus long), sans chevauchement pour ses participants (temps de
+  repos compris), ce qui laisse peu de trous dans les plages libres;
+- réparation: pour chaque match resté sans créneau, un match déjà placé
+  est retiré pour lui laisser la place, puis replacé ailleurs; l'échange
+  est annulé si ce second placement échoue.
+
+Le plan est enregistré d'un bloc (`commit_schedule`): terrains verrouillés,
+occupations relues en une requête pour vérifier que rien n'a été réservé
+depuis le calcul, puis toutes les réservations insérées dans une même
+série.
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.courts.models import Court, Occupancy
+from apps.reservations.allocation import booking_amount, busy_intervals, free_gaps
+from apps.reservations.models import Reservation, ReservationSeries
+from apps.sites.models import OpeningHours
+
+MAX_REPAIR_ATTEMPTS = 2000
+
+
+@dataclass
+class Match:
+    label: str
+    duration: timedelta
+    participants: tuple = ()
+
+
+@dataclass
+class Placement:
+    match: Match
+    court_id: int
+    start: datetime
+    end: datetime
+
+
+def _local_midnight(moment):
+    return timezone.make_aware(datetime.combine(timezone.localtime(moment).date(), time.min))
+
+
+def opening_windows(courts, start, end):
+    """Plages d'ouverture de chaque terrain dans `[start, end[` (une requête)."""
+    hours = defaultdict(dict)
+    for row in OpeningHours.objects.filter(site_id__in={court.site_id for court in courts}):
+        hours[row.site_id][row.day_of_week] = (row.open_time, row.close_time)
+
+    windows = defaultdict(list)
+    day, last = timezone.localtime(start).date(), timezone.localtime(end).date()
+    while day <= last:
+        for court in courts:
+            site_hours = hours[court.site_id].get(day.weekday())
+            if site_hours is None:
+                continue
+            open_at = max(start, timezone.make_aware(datetime.combine(day, site_hours[0])))
+            close_at = min(end, timezone.make_aware(datetime.combine(day, site_hours[1])))
+            if open_at < close_at:
+                windows[court.id].append((open_at, close_at))
+        day += timedelta(days=1)
+    return windows
+
+
+class Scheduler:
+    """Placement des matchs sur les plages libres des terrains, en mémoire."""
+
+    def __init__(self, free, origin, step, rest):
+        # `free`: plages libres triées par terrain, terrains par id croissant
+        self.free = free
+        self.origin = origin
+        self.step = step
+        self.rest = rest
+        self.courts = defaultdict(list)
+        self.participants = defaultdict(list)
+        self.placements = {}
+        self.attempts = 0
+
+    def align(self, moment):
+        """Premier instant de la grille à partir de `moment`."""
+        return self.origin + math.ceil((moment - self.origin) / self.step) * self.step
+
+    def blocked_until(self, match, court_id, start, end):
+        """Fin du dernier engagement qui empêche de jouer `[start, end[`, ou None."""
+        latest = None
+        for busy_start, busy_end in self.courts[court_id]:
+            if busy_start < end and busy_end > start:
+                latest = busy_end if latest is None else max(latest, busy_end)
+        for name in match.participants:
+            for busy_start, busy_end in self.participants[name]:
+                if busy_start < end + self.rest and busy_end + self.rest > start:
+                    free_at = busy_end + self.rest
+                    latest = free_at if latest is None else max(latest, free_at)
+        return latest
+
+    def find_slot(self, match):
+        """Créneau `(début, terrain)` le plus tôt pour le match, ou None."""
+        best = None
+        for court_id, gaps in self.free.items():
+            for gap_start, gap_end in gaps:
+                if best is not None and gap_start >= best[0]:
+                    break
+                start, found = self.align(gap_start), None
+                while start + match.duration <= gap_end and (best is None or start < best[0]):
+                    blocked = self.blocked_until(match, court_id, start, start + match.duration)
+                    if blocked is None:
+                        found = start
+                        break
+                    start = self.align(blocked)
+                if found is not None:
+                    best = (found, court_id)
+                    break
+        return best
+
+    def place(self, index, match, court_id, start):
+        end = start + match.duration
+        self.courts[court_id].append((start, end))
+        for name in match.participants:
+            self.participants[name].append((start, end))
+        self.placements[index] = Placement(match, court_id, start, end)
+
+    def unplace(self, index):
+        placement = self.placements.pop(index)
+        self.courts[placement.court_id].remove((placement.start, placement.end))
+        for name in placement.match.participants:
+            self.participants[name].remove((placement.start, placement.end))
+        return placement
+
+    def repair(self, index, match):
+        """Placer `match` en déplaçant un match déjà placé; retourne True si réussi."""
+        shared = set(match.participants)
+        # Les matchs des mêmes participants sont les plus susceptibles de gêner
+        candidates = sorted(
+            self.placements, key=lambda other: not shared & set(self.placements[other].match.participants)
+        )
+        for other in candidates:
+            if self.attempts >= MAX_REPAIR_ATTEMPTS:
+                return False
+            self.attempts += 1
+            moved = self.unplace(other)
+            slot = self.find_slot(match)
+            if slot is not None:
+                self.place(index, match, slot[1], slot[0])
+                new_slot = self.find_slot(moved.match)
+                if new_slot is not None:
+                    self.place(other, moved.match, new_slot[1], new_slot[0])
+                    return True
+                self.unplace(index)
+            self.place(other, moved.match, moved.court_id, moved.start)
+        return False
+
+    def fill(self, matches):
+        """
+        Placement glouton dans l'ordre du temps: l'instant libre le plus tôt
+        d'un terrain reçoit le match le plus contraint qui peut s'y jouer
+        (participants ayant le plus de matchs restants, puis le plus long).
+        Retourne les index des matchs restés sans créneau.
+        """
+        remaining = Counter(name for match in matches for name in match.participants)
+        pending = set(range(len(matches)))
+        cursors = [
+            (self.align(gaps[0][0]), court_id, 0) for court_id, gaps in self.free.items() if gaps
+        ]
+        heapq.heapify(cursors)
+        while cursors and pending:
+            start, court_id, gap = heapq.heappop(cursors)
+            gap_end = self.free[court_id][gap][1]
+            candidates = sorted(
+                pending,
+                key=lambda index: (
+                    -sum(remaining[name] for name in matches[index].participants),
+                    -matches[index].duration,
+                    index,
+                )
+            )
+            chosen = next((
+                index for index in candidates
+                if start + matches[index].duration <= gap_end
+                and self.blocked_until(matches[index], court_id, start, start + matches[index].duration) is None
+            ), None)
+            if chosen is not None:
+                match = matches[chosen]
+                self.place(chosen, match, court_id, start)
+                pending.discard(chosen)
+                remaining.subtract(match.participants)
+                start = self.align(start + match.duration)
+            else:
+                start += self.step
+            if start >= gap_end:
+                gap += 1
+                if gap == len(self.free[court_id]):
+                    continue
+                start = self.align(self.free[court_id][gap][0])
+            heapq.heappush(cursors, (start, court_id, gap))
+        return sorted(pending)
+
+    def solve(self, matches):
+        """Placer les matchs; retourne les index de ceux qui n'ont pas de créneau."""
+        unplaced = self.fill(matches)
+        return [index for index in unplaced if not self.repair(index, matches[index])]
+
+
+def plan_schedule(courts, matches, start, end, step=timedelta(minutes=15), rest=timedelta(0)):
+    """
+    Placer `matches` sur `courts` dans `[start, end[`, pendant les horaires
+    d'ouverture et hors occupations existantes.
+
+    Retourne `(placements, matchs non placés)`, les placements triés par
+    début puis par terrain. Rien n'est écrit.
+    """
+    start = max(start, timezone.now())
+    courts = sorted(courts, key=lambda court: court.id)
+    busy = busy_intervals(courts, start, end)
+    windows = opening_windows(courts, start, end)
+    free = {
+        court.id: [
+            gap for window_start, window_end in windows[court.id]
+            for gap in free_gaps(busy[court.id], window_start, window_end)
+        ]
+        for court in courts
+    }
+
+    scheduler = Scheduler(free, _local_midnight(start), step, rest)
+    unplaced = scheduler.solve(matches)
+    placements = sorted(scheduler.placements.values(), key=lambda placement: (placement.start, placement.court_id))
+    return placements, [matches[index] for index in unplaced]
+
+
+def commit_schedule(user, name, placements):
+    """
+    Enregistrer le plan comme une série de réservations, tout ou rien.
+
+    Retourne `(série, conflits)`: la série créée, ou None et les placements
+    devenus indisponibles depuis le calcul du plan.
+    """
+    court_ids = sorted({placement.court_id for placement in placements})
+    start = min(placement.start for placement in placements)
+    end = max(placement.end for placement in placements)
+    with transaction.atomic():
+        courts = {
+            court.id: court
+            for court in Court.objects.select_for_update().filter(id__in=court_ids).order_by('id')
+        }
+        busy = busy_intervals(list(courts.values()), start, end)
+        conflicts = [
+            placement for placement in placements
+            if any(
+                busy_start < placement.end and busy_end > placement.start
+                for busy_start, busy_end in busy[placement.court_id]
+            )
+        ]
+        if conflicts:
+            return None, conflicts
+
+        series = ReservationSeries.objects.create(name=name, created_by=user)
+        reservations = Reservation.objects.bulk_create([
+            Reservation(
+                user=user,
+                court=courts[placement.court_id],
+                series=series,
+                start_datetime=placement.start,
+                end_datetime=placement.end,
+                price_per_hour=courts[placement.court_id].price_per_hour,
+                total_amount=booking_amount(
+                    courts[placement.court_id].price_per_hour, placement.start, placement.end
+                ),
+                notes=placement.match.label,
+            )
+            for placement in placements
+        ])
+        Occupancy.objects.bulk_create([
+            Occupancy(
+                court_id=reservation.court_id,
+                start_datetime=reservation.start_datetime,
+                end_datetime=reservation.end_datetime,
+                source_type='RESERVATION',
+                source_id=reservation.pk,
+            )
+            for reservation in reservations
+        ])
+    return series, []
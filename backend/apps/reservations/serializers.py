@@ -2,12 +2,20 @@
 Sérialiseurs pour la gestion des réservations.
 """
 
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from apps.reservations.models import Reservation
+from apps.reservations.models import Reservation, SharedSession
+from apps.reservations.allocation import pick_court
+from apps.courts.models import Court
+from apps.sites.models import Site
 from apps.courts.serializers import CourtListSerializer
+from apps.core.serializers import DynamicFieldsMixin, ValuesSerializer, ChoiceDisplayField, DecimalValueField, DateTimeValueField
 
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     user_email = serializers.CharField(source='user.email', read_only=True)
     court_details = CourtListSerializer(source='court', read_only=True)
     status_name = serializers.CharField(source='get_status_display', read_only=True)
@@ -24,31 +32,86 @@ class ReservationSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id', 'user', 'price_per_hour', 'total_amount', 'created_at'
         ]
+        expandable_fields = ['court_details']
+        field_relations = {
+            'user_email': {'select_related': ['user']},
+            'court_details': {'select_related': ['court__site'], 'prefetch_related': ['court__images']},
+        }
     
     def get_can_cancel(self, obj):
         return obj.can_be_cancelled()
 
 
 class ReservationCreateSerializer(serializers.ModelSerializer):
+    """
+    Création d'une réservation sur un terrain donné (`court`), ou sur
+    n'importe quel terrain libre d'un site pour un sport (`site` +
+    `sport_type`): le terrain est alors attribué automatiquement. Avec
+    `session`, une place est prise dans une session partagée.
+    """
+    
     user_email = serializers.EmailField(write_only=True, required=True)
-    start_datetime = serializers.DateTimeField(required=True)
-    end_datetime = serializers.DateTimeField(required=True)
+    start_datetime = serializers.DateTimeField(required=False)
+    end_datetime = serializers.DateTimeField(required=False)
+    court = serializers.PrimaryKeyRelatedField(queryset=Court.objects.all(), required=False)
+    session = serializers.PrimaryKeyRelatedField(queryset=SharedSession.objects.all(), required=False)
+    site = serializers.PrimaryKeyRelatedField(queryset=Site.objects.all(), required=False, write_only=True)
+    sport_type = serializers.ChoiceField(choices=Court.SPORT_TYPES, required=False, write_only=True)
     
     class Meta:
         model = Reservation
         fields = [
-            'court', 'start_datetime', 'end_datetime', 'notes', 'user_email'
+            'court', 'site', 'sport_type', 'session', 'start_datetime', 'end_datetime', 'notes',
+            'user_email'
         ]
     
     def validate(self, data):
         """Valider les dates et l'utilisateur."""
+        session = data.get('session')
+        if session is not None:
+            # Le créneau et le terrain sont ceux de la session
+            data.update(
+                court=session.court,
+                start_datetime=session.start_datetime,
+                end_datetime=session.end_datetime,
+            )
+            return data
+        if not data.get('start_datetime') or not data.get('end_datetime'):
+            raise serializers.ValidationError("start_datetime et end_datetime requis.")
         if data['start_datetime'] >= data['end_datetime']:
             raise serializers.ValidationError("La date de début doit être avant la date de fin.")
+        if not data.get('court') and not (data.get('site') and data.get('sport_type')):
+            raise serializers.ValidationError(
+                "Indiquer un terrain (court) ou un site et un sport (site, sport_type)."
+            )
         return data
     
+    def lock_court(self, validated_data, user):
+        """Verrouiller le terrain demandé, ou en attribuer un du site (dans la transaction)."""
+        site = validated_data.pop('site', None)
+        sport_type = validated_data.pop('sport_type', None)
+        court = validated_data.get('court')
+        if court is not None:
+            list(Court.objects.select_for_update().filter(pk=court.pk).values_list('id'))
+            return court
+        
+        courts = list(
+            Court.objects.select_for_update()
+            .filter(site=site, sport_type=sport_type, is_active=True)
+            .order_by('id')
+        )
+        court = pick_court(
+            courts, validated_data['start_datetime'], validated_data['end_datetime'], user
+        )
+        if court is None:
+            raise serializers.ValidationError(
+                {'court': 'Aucun terrain disponible sur ce créneau.'}
+            )
+        validated_data['court'] = court
+        return court
+    
     def create(self, validated_data):
         from apps.auth_app.models import CustomUser
-        from decimal import Decimal, ROUND_HALF_UP
         import logging
         
         logger = logging.getLogger(__name__)
@@ -63,34 +126,53 @@ class ReservationCreateSerializer(serializers.ModelSerializer):
             raise
         
         try:
-            # Get court and calculate price
-            court = validated_data.get('court')
-            start_datetime = validated_data.get('start_datetime')
-            end_datetime = validated_data.get('end_datetime')
-            
-            # Calculate duration in hours
-            duration = (end_datetime - start_datetime).total_seconds() / 3600
-            
-            # Get price per hour from court and ensure it's Decimal
-            price_per_hour = Decimal(str(court.price_per_hour))
-            total_amount = Decimal(str(duration)) * price_per_hour
-            
-            # Round to 2 decimal places
-            total_amount = total_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            
-            validated_data['user'] = user
-            validated_data['price_per_hour'] = price_per_hour
-            validated_data['total_amount'] = total_amount
-            
-            return super().create(validated_data)
+            with transaction.atomic():
+                return self.create_locked(validated_data, user)
         except serializers.ValidationError:
             raise
         except Exception as e:
             logger.error(f"Erreur lors de la création de la réservation: {str(e)}", exc_info=True)
             raise serializers.ValidationError(f"Erreur lors de la création: {str(e)}")
+    
+    def create_locked(self, validated_data, user):
+        """Créer la réservation, le terrain étant verrouillé."""
+        from decimal import Decimal, ROUND_HALF_UP
+        
+        session = validated_data.get('session')
+        if session is not None:
+            # Sérialiser avec une fermeture concurrente du terrain, puis une
+            # requête conditionnelle: pas de dépassement de capacité
+            list(Court.objects.select_for_update().filter(pk=session.court_id).values_list('id'))
+            if not session.take_spot():
+                raise serializers.ValidationError({'session': 'Session complète.'})
+            validated_data['user'] = user
+            validated_data['price_per_hour'] = session.court.price_per_hour
+            validated_data['total_amount'] = session.price_per_spot
+            return super().create(validated_data)
+        
+        # Get court and calculate price
+        court = self.lock_court(validated_data, user)
+        start_datetime = validated_data.get('start_datetime')
+        end_datetime = validated_data.get('end_datetime')
+        
+        # Calculate duration in hours
+        duration = (end_datetime - start_datetime).total_seconds() / 3600
+        
+        # Get price per hour from court and ensure it's Decimal
+        price_per_hour = Decimal(str(court.price_per_hour))
+        total_amount = Decimal(str(duration)) * price_per_hour
+        
+        # Round to 2 decimal places
+        total_amount = total_amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        
+        validated_data['user'] = user
+        validated_data['price_per_hour'] = price_per_hour
+        validated_data['total_amount'] = total_amount
+        
+        return super().create(validated_data)
 
 
-class ReservationListSerializer(serializers.ModelSerializer):
+class ReservationListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     court_name = serializers.CharField(source='court.name', read_only=True)
     status_name = serializers.CharField(source='get_status_display', read_only=True)
     
@@ -100,7 +182,131 @@ class ReservationListSerializer(serializers.ModelSerializer):
             'id', 'court_name', 'start_datetime', 'end_datetime',
             'total_amount', 'status', 'status_name'
         ]
+        field_relations = {
+            'court_name': {'select_related': ['court']},
+        }
+
+
+class ReservationListValuesSerializer(ValuesSerializer):
+    """Version `.values()` de `ReservationListSerializer` pour les listes."""
+    
+    model = Reservation
+    fields = (
+        ('id', 'id'),
+        ('court_name', 'court__name'),
+        ('start_datetime', DateTimeValueField()),
+        ('end_datetime', DateTimeValueField()),
+        ('total_amount', DecimalValueField()),
+        ('status', 'status'),
+        ('status_name', ChoiceDisplayField('status', Reservation.STATUS_CHOICES)),
+    )
 
 
 class ReservationCancelSerializer(serializers.Serializer):
     reason = serializers.CharField(required=False, allow_blank=True)
+
+
+class SlotHoldSerializer(serializers.Serializer):
+    court_id = serializers.IntegerField()
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    
+    def validate(self, data):
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("La date de début doit être avant la date de fin.")
+        return data
+
+
+class GroupBookingSerializer(serializers.Serializer):
+    court_ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=20
+    )
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate(self, data):
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("La date de début doit être avant la date de fin.")
+        if data['start'] < timezone.now():
+            raise serializers.ValidationError("Le créneau est déjà passé.")
+        return data
+
+
+class ScheduleMatchSerializer(serializers.Serializer):
+    label = serializers.CharField(max_length=100)
+    duration_minutes = serializers.IntegerField(min_value=5, max_value=24 * 60)
+    participants = serializers.ListField(
+        child=serializers.CharField(max_length=100), required=False, default=list
+    )
+
+
+class ScheduleSerializer(serializers.Serializer):
+    MAX_MATCHES = 500
+    MAX_DAYS = 14
+    
+    name = serializers.CharField(max_length=255)
+    court_ids = serializers.ListField(
+        child=serializers.IntegerField(), min_length=1, max_length=50
+    )
+    start = serializers.DateTimeField()
+    end = serializers.DateTimeField()
+    step_minutes = serializers.IntegerField(min_value=5, max_value=240, default=15)
+    rest_minutes = serializers.IntegerField(min_value=0, max_value=24 * 60, default=0)
+    matches = ScheduleMatchSerializer(many=True)
+    dry_run = serializers.BooleanField(default=False)
+    
+    def validate_matches(self, value):
+        if not value:
+            raise serializers.ValidationError("Au moins un match est requis.")
+        if len(value) > self.MAX_MATCHES:
+            raise serializers.ValidationError(f"{self.MAX_MATCHES} matchs au plus.")
+        return value
+    
+    def validate(self, data):
+        if data['start'] >= data['end']:
+            raise serializers.ValidationError("La date de début doit être avant la date de fin.")
+        if data['end'] - data['start'] > timedelta(days=self.MAX_DAYS):
+            raise serializers.ValidationError(f"La période ne peut dépasser {self.MAX_DAYS} jours.")
+        return data
+
+
+class SharedSessionSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    court_name = serializers.CharField(source='court.name', read_only=True)
+    spots_left = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = SharedSession
+        fields = [
+            'id', 'court', 'court_name', 'start_datetime', 'end_datetime', 'capacity',
+            'spots_taken', 'spots_left', 'price_per_spot', 'created_at'
+        ]
+        read_only_fields = ['spots_taken', 'created_at']
+        extra_kwargs = {
+            'capacity': {'required': False},
+            'price_per_spot': {'required': False},
+        }
+        field_relations = {
+            'court_name': {'select_related': ['court']},
+        }
+    
+    def validate(self, data):
+        if data['start_datetime'] >= data['end_datetime']:
+            raise serializers.ValidationError("La date de début doit être avant la date de fin.")
+        user = self.context['request'].user
+        if user.role.name == 'MANAGER' and data['court'].site.manager_id != user.id:
+            raise serializers.ValidationError({'court': 'Terrain introuvable.'})
+        return data
+    
+    def create(self, validated_data):
+        session = SharedSession.open(
+            validated_data['court'],
+            validated_data['start_datetime'],
+            validated_data['end_datetime'],
+            capacity=validated_data.get('capacity'),
+            price_per_spot=validated_data.get('price_per_spot'),
+            user=self.context['request'].user,
+        )
+        if session is None:
+            raise serializers.ValidationError("Ce créneau n'est pas disponible.")
+        return session
@@ -9,6 +9,7 @@ from apps.auth_app.models import Role, CustomUser
 from apps.sites.models import Site
 from apps.courts.models import Court
 from apps.reservations.models import Reservation
+from apps.reservations.serializers import ReservationListSerializer, ReservationListValuesSerializer
 
 
 class ReservationTestCase(TestCase):
@@ -105,3 +106,421 @@ class ReservationTestCase(TestCase):
         )
         
         self.assertFalse(reservation.can_be_cancelled())
+    
+    def test_status_transitions(self):
+        """Tester les transitions d'état conditionnelles (une requête chacune)."""
+        from apps.core.states import transition_done
+        
+        start = timezone.now() + timedelta(days=2)
+        reservation = Reservation.objects.create(
+            user=self.client,
+            court=self.court,
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+            price_per_hour=25.00,
+            total_amount=25.00,
+            status='PENDING'
+        )
+        events = []
+        
+        def receiver(sender, name, target, **kwargs):
+            events.append((name, target))
+        
+        transition_done.connect(receiver, sender=Reservation)
+        self.addCleanup(transition_done.disconnect, receiver, sender=Reservation)
+        
+        # Une copie périmée ne peut pas rejouer une transition déjà faite
+        stale = Reservation.objects.get(pk=reservation.pk)
+        # UPDATE conditionnel (+ savepoint), sans full_clean
+        with self.assertNumQueries(3):
+            self.assertTrue(reservation.confirm())
+        self.assertFalse(reservation.confirm())
+        # L'annulation libère aussi le créneau dans la même transaction
+        with self.assertNumQueries(4):
+            self.assertTrue(reservation.cancel())
+        self.assertIsNotNone(reservation.cancelled_at)
+        self.assertFalse(stale.confirm())
+        self.assertEqual(events, [('confirm', 'CONFIRMED'), ('cancel', 'CANCELLED')])
+        
+        reservation.refresh_from_db()
+        self.assertEqual(reservation.status, 'CANCELLED')
+    
+    def test_occupancy_conflicts(self):
+        """Tester les conflits via la table d'occupation (blocages et holds compris)."""
+        from django.core.exceptions import ValidationError
+        from apps.courts.models import BlockedPeriod, Occupancy
+        from apps.reservations.models import SlotHold
+        
+        start = timezone.now() + timedelta(days=3)
+        
+        def book(user, hours_from, hours_to):
+            return Reservation.objects.create(
+                user=user,
+                court=self.court,
+                start_datetime=start + timedelta(hours=hours_from),
+                end_datetime=start + timedelta(hours=hours_to),
+                price_per_hour=25.00,
+                total_amount=25.00,
+                status='PENDING'
+            )
+        
+        BlockedPeriod.objects.create(
+            court=self.court, start_datetime=start, end_datetime=start + timedelta(hours=2)
+        )
+        with self.assertRaisesMessage(ValidationError, 'période bloquée'):
+            book(self.client, 1, 3)
+        
+        reservation = book(self.client, 2, 3)
+        with self.assertRaisesMessage(ValidationError, 'autre réservation'):
+            book(self.client, 2, 3)
+        
+        # Un hold bloque les autres clients, pas son titulaire
+        other = CustomUser.objects.create_user(
+            username='other', email='other@example.com', password='password',
+            role=self.client.role
+        )
+        hold = SlotHold.place(self.client, self.court, start + timedelta(hours=4), start + timedelta(hours=5))
+        self.assertIsNotNone(hold)
+        self.assertIsNone(SlotHold.place(other, self.court, start + timedelta(hours=4), start + timedelta(hours=5)))
+        with self.assertRaises(ValidationError):
+            book(other, 4, 5)
+        book(self.client, 4, 5)
+        
+        # Une réservation annulée libère son créneau
+        reservation.cancel()
+        self.assertFalse(
+            Occupancy.objects.filter(source_type='RESERVATION', source_id=reservation.pk).exists()
+        )
+        book(other, 2, 3)
+        hold.release()
+        self.assertEqual(Occupancy.objects.filter(court=self.court).count(), 3)
+    
+    def test_court_auto_assignment(self):
+        """Tester l'attribution d'un terrain du site par « best fit »."""
+        from rest_framework import serializers as drf_serializers
+        from apps.reservations.serializers import ReservationCreateSerializer
+        
+        start = (timezone.now() + timedelta(days=3)).replace(hour=10, minute=0, second=0, microsecond=0)
+        court_2 = Court.objects.create(
+            name='Terrain 2', sport_type='TENNIS', site=self.site, price_per_hour=30.00
+        )
+        Court.objects.create(
+            name='Padel 1', sport_type='PADEL', site=self.site, price_per_hour=40.00
+        )
+        # Le terrain 2 est occupé juste avant: son intervalle libre est le plus court
+        Reservation.objects.create(
+            user=self.client, court=court_2,
+            start_datetime=start - timedelta(hours=1), end_datetime=start,
+            price_per_hour=30.00, total_amount=30.00, status='CONFIRMED'
+        )
+        
+        def book():
+            serializer = ReservationCreateSerializer(data={
+                'site': self.site.id, 'sport_type': 'TENNIS', 'user_email': self.client.email,
+                'start_datetime': start.isoformat(),
+                'end_datetime': (start + timedelta(hours=1)).isoformat(),
+            })
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            return serializer.save()
+        
+        reservation = book()
+        self.assertEqual(reservation.court, court_2)
+        self.assertEqual(reservation.total_amount, 30)
+        self.assertEqual(book().court, self.court)
+        with self.assertRaisesMessage(drf_serializers.ValidationError, 'Aucun terrain disponible'):
+            book()
+        
+        serializer = ReservationCreateSerializer(data={
+            'user_email': self.client.email, 'start_datetime': start.isoformat(),
+            'end_datetime': (start + timedelta(hours=1)).isoformat(),
+        })
+        self.assertFalse(serializer.is_valid())
+    
+    def test_availability_alternatives(self):
+        """Tester les créneaux de remplacement proposés quand le créneau est pris."""
+        from datetime import datetime, time
+        from rest_framework.test import APIClient
+        from apps.sites.models import OpeningHours
+        
+        day = (timezone.now() + timedelta(days=3)).replace(hour=0, minute=0, second=0, microsecond=0)
+        OpeningHours.objects.create(
+            site=self.site, day_of_week=timezone.localtime(day).weekday(),
+            open_time='08:00', close_time='20:00'
+        )
+        court_2 = Court.objects.create(
+            name='Terrain 2', sport_type='TENNIS', site=self.site, price_per_hour=30.00
+        )
+        
+        def at(hour):
+            return timezone.make_aware(datetime.combine(timezone.localtime(day).date(), time(hour)))
+        
+        for court, start, end in ((self.court, 10, 12), (court_2, 9, 11)):
+            Reservation.objects.create(
+                user=self.client, court=court, start_datetime=at(start), end_datetime=at(end),
+                price_per_hour=25.00, total_amount=50.00, status='CONFIRMED'
+            )
+        
+        api = APIClient()
+        api.force_authenticate(self.client)
+        # Terrain, créneau demandé, horaires, terrains du site, occupations
+        # de la journée, blocages récurrents
+        with self.assertNumQueries(6):
+            response = api.post('/api/reservations/check_availability/', {
+                'court_id': self.court.id, 'start': at(10).isoformat(), 'end': at(11).isoformat(),
+                'alternatives': 3,
+            }, format='json')
+        self.assertFalse(response.data['is_available'])
+        self.assertEqual(
+            [(item['court_id'], item['start'], item['offset_minutes']) for item in response.data['alternatives']],
+            [(self.court.id, at(9), 60), (court_2.id, at(11), 60), (self.court.id, at(12), 120)]
+        )
+        
+        # Dates sans décalage: heure locale; date invalide: 400
+        naive = timezone.localtime(at(10)).replace(tzinfo=None)
+        response = api.post('/api/reservations/check_availability/', {
+            'court_id': self.court.id, 'start': naive.isoformat(),
+            'end': (naive + timedelta(hours=1)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['is_available'])
+        response = api.post('/api/reservations/check_availability/', {
+            'court_id': self.court.id, 'start': '2024-13-45T10:00:00', 'end': naive.isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_group_booking(self):
+        """Tester la réservation groupée de plusieurs terrains, tout ou rien."""
+        from rest_framework.test import APIClient
+        from apps.courts.models import Occupancy
+        
+        start = (timezone.now() + timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+        courts = [self.court] + [
+            Court.objects.create(
+                name=f'Terrain {number}', sport_type='TENNIS', site=self.site, price_per_hour=30.00
+            )
+            for number in (2, 3)
+        ]
+        payload = {
+            'court_ids': [court.id for court in reversed(courts)],
+            'start': start.isoformat(),
+            'end': (start + timedelta(hours=2)).isoformat(),
+        }
+        api = APIClient()
+        api.force_authenticate(self.client)
+        
+        # Verrou, conflits, blocages récurrents, deux insertions (+ savepoints)
+        with self.assertNumQueries(7):
+            response = api.post('/api/reservations/group/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['total_amount'] for item in response.data], ['50.00', '60.00', '60.00'])
+        self.assertEqual(Occupancy.objects.filter(source_type='RESERVATION').count(), 3)
+        
+        # Un terrain pris ou inconnu: rien n'est écrit, même pour le terrain libéré
+        Reservation.objects.filter(court=courts[0]).update(status='CANCELLED')
+        Occupancy.release('RESERVATION', Reservation.objects.filter(court=courts[0]).values_list('id', flat=True))
+        payload['court_ids'] = [courts[0].id, courts[1].id, 999]
+        response = api.post('/api/reservations/group/', payload, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['conflicts'], [
+            {'court_id': courts[1].id, 'reason': 'unavailable'},
+            {'court_id': 999, 'reason': 'not_found'},
+        ])
+        self.assertEqual(Reservation.objects.count(), 3)
+    
+    def test_shared_session_spots(self):
+        """Tester les places d'une session partagée (compteur conditionnel)."""
+        from django.core.exceptions import ValidationError
+        from rest_framework import serializers as drf_serializers
+        from rest_framework.test import APIClient
+        from apps.reservations.models import SharedSession
+        from apps.reservations.serializers import ReservationCreateSerializer
+        
+        start = (timezone.now() + timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+        session = SharedSession.open(self.court, start, start + timedelta(hours=2))
+        self.assertEqual((session.capacity, session.price_per_spot), (2, 25))
+        self.assertIsNone(SharedSession.open(self.court, start, start + timedelta(hours=1)))
+        
+        # La session occupe le terrain pour les réservations classiques
+        with self.assertRaisesMessage(ValidationError, 'session partagée'):
+            Reservation.objects.create(
+                user=self.client, court=self.court, start_datetime=start,
+                end_datetime=start + timedelta(hours=1), price_per_hour=25.00, total_amount=25.00
+            )
+        
+        def take_spot():
+            serializer = ReservationCreateSerializer(data={
+                'session': session.id, 'user_email': self.client.email
+            })
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            return serializer.save()
+        
+        first = take_spot()
+        self.assertEqual((first.court, first.start_datetime, first.total_amount), (self.court, start, 25))
+        
+        api = APIClient()
+        api.force_authenticate(self.client)
+        response = api.post('/api/reservations/check_availability/', {
+            'court_id': self.court.id, 'start': start.isoformat(),
+            'end': (start + timedelta(hours=1)).isoformat(),
+        }, format='json')
+        self.assertFalse(response.data['is_available'])
+        self.assertEqual(response.data['sessions'], [
+            {'id': session.id, 'start': start, 'end': start + timedelta(hours=2), 'spots_left': 1}
+        ])
+        
+        # MessagePack: mêmes types pour la plage demandée et pour les sessions
+        from apps.core.renderers import msgpack
+        if msgpack is not None:
+            response = api.post('/api/reservations/check_availability/', {
+                'court_id': self.court.id, 'start': start.isoformat(),
+                'end': (start + timedelta(hours=1)).isoformat(),
+            }, format='json', HTTP_ACCEPT='application/msgpack')
+            self.assertEqual(response['Content-Type'], 'application/msgpack')
+            data = msgpack.unpackb(response.content, raw=False)
+            epoch = int(start.timestamp())
+            self.assertEqual((data['start'], data['end']), (epoch, epoch + 3600))
+            self.assertEqual(data['price_per_hour'], 2500)
+            self.assertEqual(data['sessions'], [
+                {'id': session.id, 'start': epoch, 'end': epoch + 7200, 'spots_left': 1}
+            ])
+        
+        take_spot()
+        with self.assertRaisesMessage(drf_serializers.ValidationError, 'Session complète'):
+            take_spot()
+        
+        # L'annulation rend la place
+        first.cancel()
+        session.refresh_from_db()
+        self.assertEqual(session.spots_taken, 1)
+        take_spot()
+        session.refresh_from_db()
+        self.assertEqual(session.spots_taken, 2)
+    
+    def test_closure_closes_shared_sessions(self):
+        """Tester qu'une fermeture de terrain ferme les sessions partagées."""
+        from rest_framework.test import APIClient
+        from apps.courts.blocking import close_court
+        from apps.courts.models import BlockedPeriod, Occupancy
+        from apps.reservations.models import SharedSession
+        
+        api = APIClient()
+        api.force_authenticate(self.client)
+        start = (timezone.now() + timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+        session = SharedSession.open(self.court, start, start + timedelta(hours=2))
+        payload = {'session': session.id, 'user_email': self.client.email}
+        self.assertEqual(api.post('/api/reservations/', payload, format='json').status_code, 201)
+        spot = Reservation.objects.get(session=session)
+        
+        close_court(self.court, start, start + timedelta(hours=1), reason='Travaux')
+        spot.refresh_from_db()
+        session.refresh_from_db()
+        self.assertEqual(spot.status, 'CANCELLED')
+        self.assertEqual((session.spots_taken, session.capacity), (0, 0))
+        self.assertFalse(Occupancy.objects.filter(source_type='SESSION', source_id=session.id).exists())
+        response = api.post('/api/reservations/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Reservation.objects.filter(session=session, status='PENDING').exists())
+        
+        # Session encore ouverte mais créneau bloqué, ou session commencée
+        other = SharedSession.open(self.court, start + timedelta(days=1), start + timedelta(days=1, hours=1))
+        BlockedPeriod.objects.create(
+            court=self.court, start_datetime=other.start_datetime, end_datetime=other.end_datetime
+        )
+        response = api.post('/api/reservations/', {**payload, 'session': other.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('période bloquée', str(response.data))
+        
+        past = SharedSession.objects.create(
+            court=self.court, start_datetime=timezone.now() - timedelta(hours=1),
+            end_datetime=timezone.now(), capacity=2, price_per_spot=10
+        )
+        Occupancy.occupy('SESSION', past.pk, self.court.pk, past.start_datetime, past.end_datetime)
+        response = api.post('/api/reservations/', {**payload, 'session': past.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('commencé', str(response.data))
+    
+    def test_tournament_schedule(self):
+        """Tester la planification d'un tournoi (simulation puis enregistrement)."""
+        from datetime import datetime, time
+        from itertools import combinations
+        from rest_framework.test import APIClient
+        from apps.sites.models import OpeningHours
+        
+        day = timezone.localtime(timezone.now() + timedelta(days=3)).date()
+        
+        def at(hour):
+            return timezone.make_aware(datetime.combine(day, time(hour)))
+        
+        OpeningHours.objects.create(
+            site=self.site, day_of_week=day.weekday(), open_time='08:00', close_time='12:00'
+        )
+        court_2 = Court.objects.create(
+            name='Terrain 2', sport_type='TENNIS', site=self.site, price_per_hour=30.00
+        )
+        Reservation.objects.create(
+            user=self.client, court=self.court, start_datetime=at(9), end_datetime=at(10),
+            price_per_hour=25.00, total_amount=25.00, status='CONFIRMED'
+        )
+        # Toutes rencontres entre 4 équipes: 6 matchs pour 7 heures libres
+        payload = {
+            'name': 'Tournoi',
+            'court_ids': [self.court.id, court_2.id],
+            'start': at(0).isoformat(),
+            'end': at(23).isoformat(),
+            'matches': [
+                {'label': f'{home}-{away}', 'duration_minutes': 60, 'participants': [home, away]}
+                for home, away in combinations('ABCD', 2)
+            ],
+            'dry_run': True,
+        }
+        api = APIClient()
+        api.force_authenticate(self.client)
+        
+        # Terrains, occupations, blocages récurrents, horaires: rien n'est écrit
+        with self.assertNumQueries(4):
+            response = api.post('/api/reservations/schedule/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['unscheduled'], [])
+        scheduled = response.data['scheduled']
+        self.assertEqual(len(scheduled), 6)
+        for first, second in combinations(scheduled, 2):
+            if first['start'] < second['end'] and second['start'] < first['end']:
+                self.assertNotEqual(first['court_id'], second['court_id'])
+                self.assertFalse(set(first['label'].split('-')) & set(second['label'].split('-')))
+        for item in scheduled:
+            self.assertTrue(at(8) <= item['start'] and item['end'] <= at(12))
+            if item['court_id'] == self.court.id:
+                self.assertFalse(item['start'] < at(10) and item['end'] > at(9))
+        self.assertEqual(Reservation.objects.count(), 1)
+        
+        payload['dry_run'] = False
+        response = api.post('/api/reservations/schedule/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Reservation.objects.filter(series=response.data['series_id']).count(), 6)
+        
+        # Plus de place: rien n'est écrit
+        response = api.post('/api/reservations/schedule/', payload, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.data['unscheduled']), 5)
+        self.assertEqual(Reservation.objects.count(), 7)
+    
+    def test_values_serializer_matches_list_serializer(self):
+        """Tester que le sérialiseur `.values()` produit le même JSON."""
+        start = timezone.now() + timedelta(days=2)
+        for offset, status in enumerate(['PENDING', 'CONFIRMED', 'CANCELLED']):
+            Reservation.objects.create(
+                user=self.client,
+                court=self.court,
+                start_datetime=start + timedelta(hours=offset),
+                end_datetime=start + timedelta(hours=offset + 1),
+                price_per_hour=25.00,
+                total_amount=25.00,
+                status=status
+            )
+        reservations = Reservation.objects.order_by('-start_datetime')
+        
+        expected = ReservationListSerializer(reservations, many=True).data
+        serializer = ReservationListValuesSerializer()
+        data = serializer.serialize(serializer.prepare(reservations))
+        
+        self.assertEqual(data, [dict(item) for item in expected])
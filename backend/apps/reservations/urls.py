@@ -4,9 +4,10 @@ URLs pour la gestion des réservations.
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ReservationViewSet
+from .views import ReservationViewSet, SharedSessionViewSet
 
 router = DefaultRouter()
+router.register(r'sessions', SharedSessionViewSet, basename='shared-session')
 router.register(r'', ReservationViewSet, basename='reservation')
 
 app_name = 'reservations'
@@ -2,29 +2,42 @@
 Vues pour la gestion des réservations.
 """
 
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
 
-from apps.reservations.models import Reservation
+from apps.reservations.models import Reservation, SlotHold, SharedSession
+from apps.reservations.allocation import book_courts, suggest_alternatives
+from apps.reservations.scheduling import Match, plan_schedule, commit_schedule
+from apps.payments.models import SiteBalance
 from apps.reservations.serializers import (
     ReservationSerializer,
     ReservationCreateSerializer,
     ReservationListSerializer,
-    ReservationCancelSerializer
+    ReservationListValuesSerializer,
+    ReservationCancelSerializer,
+    SlotHoldSerializer,
+    GroupBookingSerializer,
+    SharedSessionSerializer,
+    ScheduleSerializer
 )
 from apps.core.permissions import IsClient, IsManager, IsAdmin, IsOwnReservation
+from apps.core.mixins import SparseFieldsMixin, ValuesListMixin
 from apps.auth_app.models import CustomUser
 
+MAX_ALTERNATIVES = 10
 
-class ReservationViewSet(viewsets.ModelViewSet):
+
+class ReservationViewSet(SparseFieldsMixin, ValuesListMixin, viewsets.ModelViewSet):
     """ViewSet pour la gestion des réservations."""
     
+    values_serializer_class = ReservationListValuesSerializer
     permission_classes = [AllowAny]
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['status', 'court__site']
@@ -72,13 +85,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
             user=request.user
         ).order_by('-start_datetime')
         
-        page = self.paginate_queryset(reservations)
-        if page is not None:
-            serializer = ReservationListSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = ReservationListSerializer(reservations, many=True)
-        return Response(serializer.data)
+        return self.values_response(reservations)
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsOwnReservation])
     def cancel(self, request, pk=None):
@@ -125,8 +132,9 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from django.utils.dateparse import parse_datetime
-        from apps.courts.models import Court
+        from apps.core.utils import parse_aware_datetime
+        from apps.courts.recurrence import court_recurring_blocks
+        from apps.courts.models import Court, Occupancy
         
         try:
             court = Court.objects.get(id=court_id)
@@ -136,32 +144,178 @@ class ReservationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        start_dt = parse_datetime(start)
-        end_dt = parse_datetime(end)
+        start_dt = parse_aware_datetime(start)
+        end_dt = parse_aware_datetime(end)
+        if start_dt is None or end_dt is None:
+            return Response(
+                {'error': 'start et end doivent être des dates ISO 8601'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Réservations, périodes bloquées et holds: une seule requête de plage
+        sources = set(
+            Occupancy.objects.overlapping(court, start_dt, end_dt).values_list('source_type', flat=True)
+        )
+        
+        # Blocages récurrents, développés pour cette plage seulement
+        is_available = not (sources or court_recurring_blocks(court, start_dt, end_dt))
+        
+        # Valeurs typées (datetime, Decimal): ISO et nombres en JSON, epoch
+        # et entiers mis à l'échelle en MessagePack, comme les sessions
+        response = {
+            'court_id': court.id,
+            'is_available': is_available,
+            'start': start_dt,
+            'end': end_dt,
+            'price_per_hour': court.price_per_hour
+        }
+        
+        # Sessions partagées du créneau qui ont encore des places (compteurs)
+        if 'SESSION' in sources:
+            response['sessions'] = [
+                {'id': session_id, 'start': session_start, 'end': session_end, 'spots_left': spots_left}
+                for session_id, session_start, session_end, spots_left in SharedSession.objects.open_spots(
+                    court, start_dt, end_dt
+                )
+            ]
+        
+        # Créneaux de remplacement (optionnels), calculés en un passage
+        try:
+            limit = min(int(request.data.get('alternatives') or 0), MAX_ALTERNATIVES)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'alternatives doit être un entier'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if limit > 0 and not is_available:
+            response['alternatives'] = [
+                {
+                    'court_id': candidate.id,
+                    'court_name': candidate.name,
+                    'start': slot_start,
+                    'end': slot_end,
+                    'offset_minutes': int(distance.total_seconds() // 60),
+                    'price_per_hour': candidate.price_per_hour,
+                }
+                for distance, candidate, slot_start, slot_end
+                in suggest_alternatives(court, start_dt, end_dt, limit)
+            ]
+        
+        return Response(response)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsClient])
+    def schedule(self, request):
+        """
+        Planifier les matchs d'un tournoi sur plusieurs terrains; avec
+        `dry_run`, le plan est seulement retourné.
+        """
+        from apps.courts.models import Court
+        
+        serializer = ScheduleSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
         
-        # Vérifier les réservations qui se chevauchent
-        overlapping = Reservation.objects.filter(
-            court=court,
-            status__in=['CONFIRMED', 'PENDING'],
-            start_datetime__lt=end_dt,
-            end_datetime__gt=start_dt
-        ).exists()
+        courts = list(Court.objects.filter(id__in=data['court_ids'], is_active=True).order_by('id'))
+        missing = sorted(set(data['court_ids']) - {court.id for court in courts})
+        if missing:
+            return Response(
+                {'court_ids': f'Terrains introuvables: {missing}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Vérifier les périodes bloquées
-        blocked = court.blocked_periods.filter(
-            start_datetime__lt=end_dt,
-            end_datetime__gt=start_dt
-        ).exists()
+        matches = [
+            Match(item['label'], timedelta(minutes=item['duration_minutes']), tuple(item['participants']))
+            for item in data['matches']
+        ]
+        placements, unplaced = plan_schedule(
+            courts, matches, data['start'], data['end'],
+            step=timedelta(minutes=data['step_minutes']),
+            rest=timedelta(minutes=data['rest_minutes'])
+        )
+        body = {
+            'dry_run': data['dry_run'],
+            'scheduled': [
+                {
+                    'label': placement.match.label,
+                    'court_id': placement.court_id,
+                    'start': placement.start,
+                    'end': placement.end,
+                }
+                for placement in placements
+            ],
+            'unscheduled': [match.label for match in unplaced],
+        }
+        if data['dry_run']:
+            return Response(body)
+        if unplaced:
+            body['error'] = 'Certains matchs n\'ont pas pu être placés'
+            return Response(body, status=status.HTTP_409_CONFLICT)
+        
+        series, conflicts = commit_schedule(request.user, data['name'], placements)
+        if series is None:
+            return Response({
+                'error': 'Des créneaux ont été réservés entre-temps',
+                'conflicts': [
+                    {'label': placement.match.label, 'court_id': placement.court_id, 'start': placement.start}
+                    for placement in conflicts
+                ]
+            }, status=status.HTTP_409_CONFLICT)
+        body['series_id'] = series.id
+        return Response(body, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsClient])
+    def hold(self, request):
+        """Retenir un créneau quelques minutes le temps de finaliser la réservation."""
+        from apps.courts.models import Court
         
-        is_available = not (overlapping or blocked)
+        serializer = SlotHoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            court = Court.objects.get(id=data['court_id'], is_active=True)
+        except Court.DoesNotExist:
+            return Response(
+                {'error': 'Terrain non trouvé'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
+        SlotHold.purge_expired()
+        hold = SlotHold.place(request.user, court, data['start'], data['end'])
+        if hold is None:
+            return Response(
+                {'error': 'Ce créneau n\'est pas disponible'},
+                status=status.HTTP_409_CONFLICT
+            )
         return Response({
+            'id': hold.id,
             'court_id': court.id,
-            'is_available': is_available,
-            'start': start,
-            'end': end,
-            'price_per_hour': float(court.price_per_hour)
-        })
+            'start': hold.start_datetime,
+            'end': hold.end_datetime,
+            'expires_at': hold.expires_at
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsClient])
+    def group(self, request):
+        """Réserver plusieurs terrains sur le même créneau (tout ou rien)."""
+        serializer = GroupBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        reservations, conflicts = book_courts(
+            request.user, data['court_ids'], data['start'], data['end'], data['notes']
+        )
+        if conflicts:
+            return Response({
+                'error': 'Certains terrains ne sont pas disponibles',
+                'conflicts': [
+                    {'court_id': court_id, 'reason': reason}
+                    for court_id, reason in sorted(conflicts.items())
+                ]
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(
+            ReservationListSerializer(reservations, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
     
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManager | IsAdmin])
     def site_stats(self, request):
@@ -177,13 +331,43 @@ class ReservationViewSet(viewsets.ModelViewSet):
         else:
             reservations = Reservation.objects.filter(court__site__id=site_id)
         
-        total_reservations = reservations.count()
-        confirmed_reservations = reservations.filter(status='CONFIRMED').count()
-        total_revenue = sum(r.total_amount for r in reservations.filter(status='CONFIRMED'))
+        counts = reservations.aggregate(
+            total=Count('id'),
+            confirmed=Count('id', filter=Q(status='CONFIRMED')),
+            revenue=Sum('total_amount', filter=Q(status='CONFIRMED')),
+        )
+        total_reservations = counts['total']
+        confirmed_reservations = counts['confirmed']
+        
+        # Montants encaissés, lus sur la ligne de solde du site (grand livre)
+        balances = SiteBalance.objects.filter(site_id=site_id)
+        if user.role.name == 'MANAGER':
+            balances = balances.filter(site__manager=user)
+        balance = balances.first() or SiteBalance()
         
         return Response({
             'total_reservations': total_reservations,
             'confirmed_reservations': confirmed_reservations,
-            'total_revenue': float(total_revenue),
+            'total_revenue': float(counts['revenue'] or 0),
+            'ledger_revenue': float(balance.revenue),
+            'ledger_refunds': float(balance.refunds),
+            'ledger_fees': float(balance.fees),
+            'payout_balance': float(balance.balance),
             'occupancy_rate': (confirmed_reservations / total_reservations * 100) if total_reservations > 0 else 0
         })
+
+
+class SharedSessionViewSet(SparseFieldsMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Sessions partagées à venir; les places se réservent via `/reservations/`."""
+    
+    serializer_class = SharedSessionSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['court', 'court__site', 'court__sport_type']
+    
+    def get_permissions(self):
+        if self.action == 'create':
+            return [IsAuthenticated(), IsManager() | IsAdmin()]
+        return [AllowAny()]
+    
+    def get_queryset(self):
+        return SharedSession.objects.filter(end_datetime__gt=timezone.now(), court__is_active=True)
@@ -4,15 +4,16 @@ Sérialiseurs pour la gestion des sites.
 
 from rest_framework import serializers
 from apps.sites.models import Site, OpeningHours, SiteImage
+from apps.core.serializers import DynamicFieldsMixin
 
 
-class SiteImageSerializer(serializers.ModelSerializer):
+class SiteImageSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SiteImage
         fields = ['id', 'image', 'title', 'description', 'is_primary', 'uploaded_at']
 
 
-class OpeningHoursSerializer(serializers.ModelSerializer):
+class OpeningHoursSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     day_name = serializers.CharField(source='get_day_of_week_display', read_only=True)
     
     class Meta:
@@ -20,7 +21,7 @@ class OpeningHoursSerializer(serializers.ModelSerializer):
         fields = ['id', 'site', 'day_of_week', 'day_name', 'open_time', 'close_time']
 
 
-class SiteSerializer(serializers.ModelSerializer):
+class SiteSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     manager_name = serializers.CharField(source='manager.get_full_name', read_only=True)
     opening_hours = OpeningHoursSerializer(many=True, read_only=True)
     images = SiteImageSerializer(many=True, read_only=True)
@@ -35,12 +36,19 @@ class SiteSerializer(serializers.ModelSerializer):
             'created_at', 'opening_hours', 'images', 'primary_image', 'courts_count'
         ]
         read_only_fields = ['id', 'created_at']
+        field_relations = {
+            'manager_name': {'select_related': ['manager']},
+            'opening_hours': {'prefetch_related': ['opening_hours']},
+            'images': {'prefetch_related': ['images']},
+            'primary_image': {'prefetch_related': ['images']},
+        }
     
     def get_courts_count(self, obj):
         return obj.courts.filter(is_active=True).count()
     
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
+        # Parcours de `images.all()` pour profiter du prefetch éventuel
+        primary = next((image for image in obj.images.all() if image.is_primary), None)
         return SiteImageSerializer(primary).data if primary else None
 
 
@@ -53,7 +61,7 @@ class SiteCreateUpdateSerializer(serializers.ModelSerializer):
         ]
 
 
-class SiteListSerializer(serializers.ModelSerializer):
+class SiteListSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     manager_name = serializers.CharField(source='manager.get_full_name', read_only=True)
     primary_image = serializers.SerializerMethodField()
     courts_count = serializers.SerializerMethodField()
@@ -63,10 +71,15 @@ class SiteListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'city', 'manager_name', 'is_active', 'courts_count', 'primary_image'
         ]
+        field_relations = {
+            'manager_name': {'select_related': ['manager']},
+            'primary_image': {'prefetch_related': ['images']},
+        }
     
     def get_courts_count(self, obj):
         return obj.courts.filter(is_active=True).count()
     
     def get_primary_image(self, obj):
-        primary = obj.images.filter(is_primary=True).first()
+        # Parcours de `images.all()` pour profiter du prefetch éventuel
+        primary = next((image for image in obj.images.all() if image.is_primary), None)
         return SiteImageSerializer(primary).data if primary else None
@@ -17,9 +17,10 @@ from apps.sites.serializers import (
     OpeningHoursSerializer
 )
 from apps.core.permissions import IsManager, IsAdmin, IsSiteManager
+from apps.core.mixins import SparseFieldsMixin
 
 
-class SiteViewSet(viewsets.ModelViewSet):
+class SiteViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet pour la gestion des sites."""
     
     permission_classes = [IsAuthenticated]
@@ -80,7 +81,7 @@ class SiteViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
-class OpeningHoursViewSet(viewsets.ModelViewSet):
+class OpeningHoursViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """ViewSet pour les horaires d'ouverture."""
     queryset = OpeningHours.objects.all()
     serializer_class = OpeningHoursSerializer
@@ -18,6 +18,7 @@ if __name__ == "__main__":
     
     # Tests pour l'app authentication
     failures = test_runner.run_tests([
+        "apps.core.tests",
         "apps.auth_app.tests",
         "apps.sites.tests",
         "apps.courts.tests",
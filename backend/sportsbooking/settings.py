@@ -3,6 +3,8 @@ Django settings for sportsbooking project.
 """
 
 import os
+from decimal import Decimal
+from importlib.util import find_spec
 from pathlib import Path
 from datetime import timedelta
 from decouple import config
@@ -81,6 +83,24 @@ DATABASES = {
     }
 }
 
+# Cache: partagé entre workers en production (ex. DatabaseCache avec
+# `python manage.py createcachetable`, ou Redis), mémoire locale sinon
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    },
+    # État du disjoncteur de paiement: doit être partagé par tous les workers,
+    # avec un `incr` atomique (Redis, Memcached); vérifié par `check --deploy`
+    'payments': {
+        'BACKEND': config(
+            'PAYMENT_CACHE_BACKEND',
+            default=config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+        ),
+        'LOCATION': config('PAYMENT_CACHE_LOCATION', default=config('CACHE_LOCATION', default='')),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -106,8 +126,20 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Encodeur JSON de l'API: 'orjson' (si installé) ou 'stdlib' (comportement DRF)
+API_JSON_BACKEND = config('API_JSON_BACKEND', default='orjson')
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'apps.core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'apps.core.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
@@ -124,6 +156,12 @@ REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# MessagePack (Accept: application/msgpack) si le paquet msgpack est installé
+MSGPACK_DECIMAL_PLACES = 2
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'apps.core.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'apps.core.parsers.MessagePackParser')
+
 # JWT Configuration
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=24),
@@ -172,6 +210,52 @@ STRIPE_PUBLIC_KEY = config('STRIPE_PUBLIC_KEY', default='pk_test_...')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='sk_test_...')
 STRIPE_WEBHOOK_SECRET = config('STRIPE_WEBHOOK_SECRET', default='whsec_...')
 
+# Passerelle de paiement: Stripe, ou l'émulateur local pour les tests de charge
+# ('apps.payments.emulator.EmulatedStripeGateway')
+PAYMENT_GATEWAY = config('PAYMENT_GATEWAY', default='apps.payments.gateway.StripeGateway')
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = config('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=2.0, cast=float)
+PAYMENT_GATEWAY_READ_TIMEOUT = config('PAYMENT_GATEWAY_READ_TIMEOUT', default=5.0, cast=float)
+PAYMENT_GATEWAY_MAX_RETRIES = config('PAYMENT_GATEWAY_MAX_RETRIES', default=1, cast=int)
+PAYMENT_GATEWAY_POOL_SIZE = config('PAYMENT_GATEWAY_POOL_SIZE', default=10, cast=int)
+# Débit maximal des traitements de masse (rapprochement), en appels par seconde
+PAYMENT_GATEWAY_RATE_LIMIT = config('PAYMENT_GATEWAY_RATE_LIMIT', default=20, cast=float)
+# Bail d'un lot de remboursements réclamé par un worker (secondes): passé ce
+# délai, un autre worker peut reprendre les tâches non terminées
+REFUND_TASK_LEASE = config('REFUND_TASK_LEASE', default=900, cast=int)
+# Bail d'un lot de factures réclamé par un worker de rendu (secondes)
+INVOICE_RENDER_LEASE = config('INVOICE_RENDER_LEASE', default=600, cast=int)
+# Durée de conservation locale du client secret d'un PaymentIntent ouvert (secondes)
+PAYMENT_INTENT_CACHE_TTL = config('PAYMENT_INTENT_CACHE_TTL', default=900, cast=int)
+
+# Disjoncteur autour de la passerelle: ouvert après N échecs de
+# disponibilité avant l'expiration du compteur (fenêtre fixe, en secondes,
+# ouverte au premier échec), sonde après le délai de récupération
+PAYMENT_BREAKER_FAILURE_THRESHOLD = config('PAYMENT_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+PAYMENT_BREAKER_FAILURE_WINDOW = config('PAYMENT_BREAKER_FAILURE_WINDOW', default=30, cast=int)
+PAYMENT_BREAKER_RECOVERY_TIMEOUT = config('PAYMENT_BREAKER_RECOVERY_TIMEOUT', default=30, cast=int)
+PAYMENT_BREAKER_PROBE_TIMEOUT = config('PAYMENT_BREAKER_PROBE_TIMEOUT', default=10, cast=int)
+PAYMENT_BREAKER_CACHE = config('PAYMENT_BREAKER_CACHE', default='payments')
+
+# Émulateur Stripe
+STRIPE_EMULATOR_LATENCY_MS = config('STRIPE_EMULATOR_LATENCY_MS', default=0, cast=int)
+STRIPE_EMULATOR_JITTER_MS = config('STRIPE_EMULATOR_JITTER_MS', default=0, cast=int)
+STRIPE_EMULATOR_FAILURE_RATE = config('STRIPE_EMULATOR_FAILURE_RATE', default=0.0, cast=float)
+STRIPE_EMULATOR_TIMEOUT_RATE = config('STRIPE_EMULATOR_TIMEOUT_RATE', default=0.0, cast=float)
+STRIPE_EMULATOR_AUTO_CONFIRM = config('STRIPE_EMULATOR_AUTO_CONFIRM', default=False, cast=bool)
+
+# Frais du prestataire de paiement (relevés, grand livre)
+PAYMENT_FEE_PERCENT = config('PAYMENT_FEE_PERCENT', default='1.5', cast=Decimal)
+PAYMENT_FEE_FIXED = config('PAYMENT_FEE_FIXED', default='0.25', cast=Decimal)
+
+# Factures PDF: logo JPEG optionnel affiché en en-tête
+INVOICE_LOGO = config('INVOICE_LOGO', default='')
+
+# Occurrences des blocages récurrents conservées en cache (secondes)
+RECURRING_BLOCK_CACHE_TTL = config('RECURRING_BLOCK_CACHE_TTL', default=86400, cast=int)
+
+# Durée pendant laquelle un créneau retenu bloque les autres clients (secondes)
+SLOT_HOLD_TTL = config('SLOT_HOLD_TTL', default=600, cast=int)
+
 # Email Configuration (Optional)
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')